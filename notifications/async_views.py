@@ -0,0 +1,72 @@
+"""
+Native async read endpoints for notifications.
+"""
+from asgiref.sync import sync_to_async
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from tasks import versions
+from tasks.async_views import (
+    aconditional_response, apply_projection, aserialize, async_read_view, json_response,
+    page_number_urls,
+)
+from .filters import NotificationFilterBackend
+from .models import Notification
+from .serializers import NotificationSerializer
+from .views import NotificationViewSet
+
+# Запись (POST) в список уведомлений по-прежнему обрабатывает ViewSet
+notification_create = NotificationViewSet.as_view({'post': 'create'})
+
+
+@async_read_view
+async def unread_count(request, user):
+    """Получить количество непрочитанных уведомлений"""
+    async def produce():
+        count = await Notification.objects.filter(user=user, is_read=False).acount()
+        return {'unread_count': count}
+    return await aconditional_response(request, user, versions.NOTIFICATIONS, produce)
+
+
+async def _anotification_page(request, user):
+    queryset = NotificationFilterBackend().filter_queryset(
+        Request(request), Notification.objects.filter(user=user), None
+    )
+    page_size = api_settings.PAGE_SIZE
+    try:
+        page = int(request.GET.get('page', 1))
+    except ValueError:
+        page = 0
+    count = await queryset.acount()
+    if page < 1 or (page > 1 and (page - 1) * page_size >= count):
+        raise NotFound('Неправильная страница.')
+    queryset = apply_projection(NotificationSerializer, request, queryset)
+    offset = (page - 1) * page_size
+    notifications = [obj async for obj in queryset.order_by('-created_at', '-id')[offset:offset + page_size]]
+    next_url, previous_url = page_number_urls(request, page, page_size, count)
+    return {
+        'count': count,
+        'next': next_url,
+        'previous': previous_url,
+        'results': await aserialize(NotificationSerializer, request, notifications),
+    }
+
+
+@async_read_view
+async def _notification_list(request, user):
+    """Список уведомлений пользователя (постранично, ?page=)"""
+    return await aconditional_response(
+        request, user, versions.NOTIFICATIONS, lambda: _anotification_page(request, user)
+    )
+
+
+async def notification_list(request):
+    """GET — асинхронный список уведомлений, остальные методы — ViewSet"""
+    if request.method in ('GET', 'HEAD'):
+        return await _notification_list(request)
+    return await sync_to_async(notification_create)(request)
+
+
+# Как и представления DRF: CSRF проверяет SessionAuthentication
+notification_list.csrf_exempt = True
@@ -0,0 +1,22 @@
+"""
+Filter backends for notifications.
+"""
+from rest_framework.filters import BaseFilterBackend
+
+from tasks.filters import parse_choice
+from .models import Notification
+
+
+class NotificationFilterBackend(BaseFilterBackend):
+    """
+    Фильтры уведомлений: ?is_read=true|false, ?notification_type=
+    """
+    
+    def filter_queryset(self, request, queryset, view):
+        is_read = parse_choice(request, 'is_read', [('true', ''), ('false', '')])
+        if is_read:
+            queryset = queryset.filter(is_read=is_read == 'true')
+        notification_type = parse_choice(request, 'notification_type', Notification.NOTIFICATION_TYPES)
+        if notification_type:
+            queryset = queryset.filter(notification_type=notification_type)
+        return queryset
@@ -22,6 +22,7 @@ class Notification(models.Model):
     message = models.TextField(verbose_name="Сообщение")
     is_read = models.BooleanField(default=False, verbose_name="Прочитано")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
     read_at = models.DateTimeField(null=True, blank=True, verbose_name="Дата прочтения")
     
     # Связь с задачей (опционально)
@@ -31,6 +32,11 @@ class Notification(models.Model):
         verbose_name = "Уведомление"
         verbose_name_plural = "Уведомления"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='notif_user_created_idx'),
+            models.Index(fields=['user', 'is_read', '-created_at'], name='notif_user_read_created_idx'),
+            models.Index(fields=['user', 'updated_at', 'id'], name='notif_user_updated_idx'),
+        ]
     
     def __str__(self):
         return f"{self.title} - {self.user.username}"
@@ -40,3 +46,28 @@ class Notification(models.Model):
         self.is_read = True
         self.read_at = timezone.now()
         self.save()
+
+
+class ArchivedNotification(models.Model):
+    """Уведомление архивной задачи (см. tasks.archive)"""
+    id = models.BigIntegerField(primary_key=True, verbose_name="ID")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_notifications', verbose_name="Пользователь")
+    notification_type = models.CharField(max_length=20, choices=Notification.NOTIFICATION_TYPES, verbose_name="Тип уведомления")
+    title = models.CharField(max_length=200, verbose_name="Заголовок")
+    message = models.TextField(verbose_name="Сообщение")
+    is_read = models.BooleanField(default=False, verbose_name="Прочитано")
+    created_at = models.DateTimeField(verbose_name="Дата создания")
+    updated_at = models.DateTimeField(verbose_name="Дата обновления")
+    read_at = models.DateTimeField(null=True, blank=True, verbose_name="Дата прочтения")
+    task = models.ForeignKey('tasks.ArchivedTask', on_delete=models.CASCADE, related_name='notifications', verbose_name="Задача")
+    
+    class Meta:
+        verbose_name = "Архивное уведомление"
+        verbose_name_plural = "Архивные уведомления"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='archived_notif_user_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.title} - {self.user.username}"
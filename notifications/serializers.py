@@ -2,10 +2,11 @@
 Serializers for notifications.
 """
 from rest_framework import serializers
+from tasks.serializers import SparseFieldsetSerializerMixin, TaskCompactSerializer
 from .models import Notification
 
 
-class NotificationSerializer(serializers.ModelSerializer):
+class NotificationSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     """Сериализатор для уведомлений"""
     
     class Meta:
@@ -15,6 +16,13 @@ class NotificationSerializer(serializers.ModelSerializer):
             'is_read', 'created_at', 'read_at', 'task'
         ]
         read_only_fields = ['id', 'created_at', 'read_at']
+        expandable_fields = {
+            'task': (
+                lambda: TaskCompactSerializer(read_only=True),
+                ['task__task_list', 'task__assigned_to', 'task__created_by'],
+                [],
+            ),
+        }
 
 
 class NotificationCreateSerializer(serializers.ModelSerializer):
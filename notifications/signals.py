@@ -0,0 +1,19 @@
+"""
+Signal handlers for notifications.
+"""
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from tasks import versions
+from tasks.models import Tombstone
+from .models import Notification
+
+
+@receiver(post_save, sender=Notification)
+@receiver(post_delete, sender=Notification)
+def bump_notification_version(sender, instance, **kwargs):
+    versions.bump_version(versions.NOTIFICATIONS, [instance.user_id])
+
+
+@receiver(post_delete, sender=Notification)
+def record_notification_tombstone(sender, instance, **kwargs):
+    Tombstone.record('notification', instance.pk, [instance.user_id])
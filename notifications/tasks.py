@@ -5,7 +5,8 @@ from celery import shared_task
 from django.contrib.auth.models import User
 from django.utils import timezone
 from .models import Notification
-from tasks.models import Task
+from tasks.models import Task, UserTaskStats
+from task_manager.db_router import replica_reads
 import logging
 
 logger = logging.getLogger(__name__)
@@ -54,16 +55,21 @@ def check_overdue_tasks():
     )
     
     notifications_sent = 0
-    for task in overdue_tasks:
-        # Отправляем уведомление исполнителю
-        send_notification.delay(
-            user_id=task.assigned_to.id,
-            notification_type='task_overdue',
-            title='Просроченная задача',
-            message=f'Задача "{task.title}" просрочена. Срок выполнения: {task.due_date.strftime("%d.%m.%Y %H:%M")}',
-            task_id=task.id
-        )
-        notifications_sent += 1
+    # Сканирование выполняется на реплике
+    with replica_reads():
+        for task in overdue_tasks:
+            # Отправляем уведомление исполнителю
+            send_notification.delay(
+                user_id=task.assigned_to.id,
+                notification_type='task_overdue',
+                title='Просроченная задача',
+                message=f'Задача "{task.title}" просрочена. Срок выполнения: {task.due_date.strftime("%d.%m.%Y %H:%M")}',
+                task_id=task.id
+            )
+            notifications_sent += 1
+    
+    # Счётчики просроченных задач и задач на сегодня зависят от времени
+    UserTaskStats.recalculate_due_counters()
     
     logger.info(f"Sent {notifications_sent} overdue task notifications")
     return f"Sent {notifications_sent} overdue task notifications"
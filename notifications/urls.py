@@ -3,11 +3,14 @@ URL configuration for notifications app.
 """
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import views, async_views
 
 router = DefaultRouter()
-router.register(r'notifications', views.NotificationViewSet)
+router.register(r'notifications', views.NotificationViewSet, basename='notification')
 
 urlpatterns = [
+    # Асинхронные эндпоинты чтения (см. async_views); маршруты роутера ниже
+    path('notifications/', async_views.notification_list, name='notification-list'),
+    path('notifications/unread_count/', async_views.unread_count, name='notification-unread-count'),
     path('', include(router.urls)),
 ]
@@ -6,19 +6,42 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django.db.models import Q
+from django.utils import timezone
+from tasks import versions, sync
+from tasks.mixins import SparseFieldsetMixin, ConditionalGetMixin, ReplicaReadMixin
+from tasks.export import export_response, get_export_format
+from .filters import NotificationFilterBackend
 from .models import Notification
 from .serializers import NotificationSerializer, NotificationCreateSerializer
 
 
-class NotificationViewSet(viewsets.ModelViewSet):
+class NotificationViewSet(ReplicaReadMixin, ConditionalGetMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
     """ViewSet для управления уведомлениями"""
     serializer_class = NotificationSerializer
     permission_classes = [IsAuthenticated]
+    filter_backends = [NotificationFilterBackend]
+    etag_scopes = {
+        'list': versions.NOTIFICATIONS,
+        'retrieve': versions.NOTIFICATIONS,
+        'unread': versions.NOTIFICATIONS,
+        'sync': versions.NOTIFICATIONS,
+    }
+    # Колонки потоковой выгрузки
+    export_fields = (
+        'id', 'notification_type', 'title', 'message', 'is_read', 'task_id',
+        'created_at', 'updated_at', 'read_at',
+    )
     
-    def get_queryset(self):
+    def get_base_queryset(self):
         # Пользователь видит только свои уведомления
         return Notification.objects.filter(user=self.request.user)
     
+    def get_queryset(self):
+        return self.apply_projection(self.get_base_queryset())
+    
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+    
     @action(detail=True, methods=['post'])
     def mark_read(self, request, pk=None):
         """Отметить уведомление как прочитанное"""
@@ -32,21 +55,33 @@ class NotificationViewSet(viewsets.ModelViewSet):
         Notification.objects.filter(
             user=request.user, 
             is_read=False
-        ).update(is_read=True)
+        ).update(is_read=True, updated_at=timezone.now())
+        # update() не отправляет сигналы, поэтому версию меняем явно
+        versions.bump_version(versions.NOTIFICATIONS, [request.user.id])
         return Response({'status': 'All notifications marked as read'})
     
-    @action(detail=False, methods=['get'])
-    def unread_count(self, request):
-        """Получить количество непрочитанных уведомлений"""
-        count = Notification.objects.filter(
-            user=request.user, 
-            is_read=False
-        ).count()
-        return Response({'unread_count': count})
-    
     @action(detail=False, methods=['get'])
     def unread(self, request):
         """Получить только непрочитанные уведомления"""
         notifications = self.get_queryset().filter(is_read=False)
         serializer = self.get_serializer(notifications, many=True)
         return Response(serializer.data)
+
+    
+    @action(detail=False, methods=['get'])
+    def sync(self, request):
+        """Изменения уведомлений после курсора ?since="""
+        return Response(sync.get_changes(
+            self.get_queryset(),
+            request.user,
+            'notification',
+            request.query_params.get('since'),
+            lambda rows: self.get_serializer(rows, many=True).data,
+        ))
+    
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Потоковая выгрузка уведомлений: ?export_format=ndjson|csv и фильтры списка"""
+        export_format = get_export_format(request)
+        queryset = self.filter_queryset(self.get_base_queryset())
+        return export_response(request, queryset, self.export_fields, export_format, 'notifications')
@@ -22,20 +22,7 @@ def run_telegram_bot():
 
 def run_periodic_tasks():
     """Запуск периодических задач"""
-    import django
-    from django.conf import settings
-    from celery.schedules import crontab
-    from task_manager.celery import app
-    
-    # Настраиваем периодические задачи
-    app.conf.beat_schedule = {
-        'check-overdue-tasks': {
-            'task': 'notifications.tasks.check_overdue_tasks',
-            'schedule': crontab(minute=0, hour='*/1'),  # Каждый час
-        },
-    }
-    
-    # Запускаем Celery beat
+    # Расписание задаётся в CELERY_BEAT_SCHEDULE: процесс beat читает его из настроек
     subprocess.run([sys.executable, "-m", "celery", "-A", "task_manager", "beat", "--loglevel=info"])
 
 if __name__ == "__main__":
@@ -7,7 +7,17 @@ class TaskManager {
         this.socket = null;
         this.reconnectAttempts = 0;
         this.maxReconnectAttempts = 5;
+        // Интервал ping, мс: должен быть меньше половины WEBSOCKET_PRESENCE_TTL на сервере (запись продлевается не на каждом ping)
+        this.heartbeatInterval = 30000;
+        this.heartbeatTimer = null;
         this.tasks = [];
+        // Курсор синхронизации задач из WebSocket: после переподключения запрашиваются только изменения
+        this.tasksCursor = null;
+        // Списки задач, на изменения которых подписано соединение
+        this.subscribedTaskLists = new Set();
+        this.nextTasksUrl = null;
+        this.loadingTasks = false;
+        this.tasksObserver = null;
         this.taskLists = [];
         this.users = [];
         
@@ -34,6 +44,16 @@ class TaskManager {
             console.log('WebSocket connected');
             this.reconnectAttempts = 0;
             this.socket.send(JSON.stringify({type: 'ping'}));
+            this.requestTaskChanges();
+            this.subscribedTaskLists.forEach(taskListId => {
+                this.socket.send(JSON.stringify({type: 'subscribe', task_list_id: taskListId}));
+            });
+            clearInterval(this.heartbeatTimer);
+            this.heartbeatTimer = setInterval(() => {
+                if (this.socket.readyState === WebSocket.OPEN) {
+                    this.socket.send(JSON.stringify({type: 'ping'}));
+                }
+            }, this.heartbeatInterval);
         };
         
         this.socket.onmessage = (event) => {
@@ -43,6 +63,7 @@ class TaskManager {
         
         this.socket.onclose = () => {
             console.log('WebSocket disconnected');
+            clearInterval(this.heartbeatTimer);
             if (this.reconnectAttempts < this.maxReconnectAttempts) {
                 setTimeout(() => {
                     this.reconnectAttempts++;
@@ -62,9 +83,28 @@ class TaskManager {
                 this.showNotification(data.message);
                 this.updateNotificationCount();
                 break;
-            case 'tasks_data':
-                this.tasks = data.tasks;
-                this.renderTasks(data.tasks);
+            case 'tasks_cursor':
+                // Задачи загружаются страницами через REST, сокет присылает только изменения
+                this.tasksCursor = data.cursor;
+                if (data.reload) {
+                    this.loadTasks();
+                }
+                break;
+            case 'tasks_diff':
+                this.applyTasksDiff(data);
+                break;
+            case 'task_list_update':
+                this.applyTaskListUpdate(data);
+                break;
+            case 'throttled':
+                // Сервер ограничил частоту сообщений: повторяем запрос задач позже
+                if (data.request === 'get_tasks') {
+                    setTimeout(() => {
+                        if (this.socket.readyState === WebSocket.OPEN) {
+                            this.requestTaskChanges();
+                        }
+                    }, data.retry_after * 1000);
+                }
                 break;
             case 'pong':
                 // Соединение активно
@@ -72,6 +112,59 @@ class TaskManager {
         }
     }
     
+    requestTaskChanges() {
+        // Без снимка: первую загрузку делают страницы REST, после переподключения приходят изменения после курсора
+        this.socket.send(JSON.stringify({type: 'get_tasks', since: this.tasksCursor, snapshot: false}));
+    }
+    
+    applyTasksDiff(diff) {
+        // Сначала удаления, затем добавленные и изменённые задачи
+        const deleted = new Set(diff.deleted);
+        const tasks = this.tasks.filter(task => !deleted.has(task.id));
+        const positions = new Map(tasks.map((task, index) => [task.id, index]));
+        const created = [];
+        // Задачи старше последней загруженной придут с одной из следующих страниц
+        const oldest = this.nextTasksUrl && tasks.length ? tasks[tasks.length - 1].created_at : null;
+        diff.upserted.forEach(task => {
+            if (positions.has(task.id)) {
+                tasks[positions.get(task.id)] = task;
+            } else if (!oldest || new Date(task.created_at) > new Date(oldest)) {
+                created.push(task);
+            }
+        });
+        // Новые задачи — в начало списка, как в порядке по дате создания
+        this.tasks = created.reverse().concat(tasks);
+        this.tasksCursor = diff.cursor;
+        this.filterTasks();
+    }
+    
+    subscribeTaskList(taskListId) {
+        this.subscribedTaskLists.add(taskListId);
+        if (this.socket && this.socket.readyState === WebSocket.OPEN) {
+            this.socket.send(JSON.stringify({type: 'subscribe', task_list_id: taskListId}));
+        }
+    }
+    
+    unsubscribeTaskList(taskListId) {
+        this.subscribedTaskLists.delete(taskListId);
+        if (this.socket && this.socket.readyState === WebSocket.OPEN) {
+            this.socket.send(JSON.stringify({type: 'unsubscribe', task_list_id: taskListId}));
+        }
+    }
+    
+    applyTaskListUpdate(update) {
+        // Задачи из собственного списка пользователя обновляются на месте;
+        // представления списка получают событие целиком (reload — перезагрузить список)
+        if (update.upserted) {
+            const upserted = new Map(update.upserted.map(task => [task.id, task]));
+            if (this.tasks.some(task => upserted.has(task.id))) {
+                this.tasks = this.tasks.map(task => upserted.get(task.id) || task);
+                this.filterTasks();
+            }
+        }
+        document.dispatchEvent(new CustomEvent('task-list-update', {detail: update}));
+    }
+    
     showNotification(message) {
         // Показываем уведомление в браузере
         if ('Notification' in window) {
@@ -151,22 +244,48 @@ class TaskManager {
     
     loadInitialData() {
         this.loadTasks();
+        this.loadStats();
         this.loadTaskLists();
         this.loadUsers();
-        this.loadStats();
         this.loadNotifications();
     }
     
+    // Ответы API могут быть постраничными ({results, next}) или простыми массивами
+    unwrapResults(data) {
+        return Array.isArray(data) ? data : (data.results || []);
+    }
+    
     loadTasks() {
-        return fetch('/api/tasks/my_tasks/')
+        // Загружаем первую страницу, остальные подгружаются по мере прокрутки
+        this.tasks = [];
+        this.nextTasksUrl = null;
+        return this.fetchTasksPage('/api/tasks/my_tasks/');
+    }
+    
+    loadMoreTasks() {
+        if (!this.nextTasksUrl || this.loadingTasks) {
+            return Promise.resolve();
+        }
+        return this.fetchTasksPage(this.nextTasksUrl);
+    }
+    
+    fetchTasksPage(url) {
+        this.loadingTasks = true;
+        return fetch(url)
             .then(response => response.json())
             .then(data => {
-                this.tasks = data;
-                this.renderTasks(data);
+                // Задачи, уже добавленные из tasks_diff, не дублируются
+                const loaded = new Set(this.tasks.map(task => task.id));
+                this.tasks = this.tasks.concat(this.unwrapResults(data).filter(task => !loaded.has(task.id)));
+                this.nextTasksUrl = data.next || null;
+                this.filterTasks();
             })
             .catch(error => {
                 console.error('Error loading tasks:', error);
                 this.showToast('Ошибка загрузки задач', 'danger');
+            })
+            .finally(() => {
+                this.loadingTasks = false;
             });
     }
     
@@ -174,8 +293,8 @@ class TaskManager {
         return fetch('/api/task-lists/')
             .then(response => response.json())
             .then(data => {
-                this.taskLists = data;
-                this.renderTaskLists(data);
+                this.taskLists = this.unwrapResults(data);
+                this.renderTaskLists(this.taskLists);
             })
             .catch(error => {
                 console.error('Error loading task lists:', error);
@@ -186,7 +305,7 @@ class TaskManager {
         return fetch('/api/users/')
             .then(response => response.json())
             .then(data => {
-                this.users = data;
+                this.users = this.unwrapResults(data);
             })
             .catch(error => {
                 console.error('Error loading users:', error);
@@ -194,38 +313,40 @@ class TaskManager {
     }
     
     loadStats() {
-        return fetch('/api/tasks/my_tasks/')
+        // Счётчики считаются на сервере по всем задачам, а не по загруженным страницам
+        return fetch('/api/tasks/facets/')
             .then(response => response.json())
-            .then(data => {
-                const stats = this.calculateStats(data);
+            .then(facets => {
+                const stats = this.statsFromFacets(facets);
                 this.renderStats(stats);
+                return stats;
             })
             .catch(error => {
                 console.error('Error loading stats:', error);
             });
     }
     
+    statsFromFacets(facets) {
+        return {
+            total: facets.total,
+            completed: facets.status.completed,
+            inProgress: facets.status.in_progress,
+            pending: facets.status.pending,
+            overdue: facets.overdue
+        };
+    }
+    
     loadNotifications() {
         return fetch('/api/notifications/')
             .then(response => response.json())
             .then(data => {
-                this.renderNotifications(data);
+                this.renderNotifications(this.unwrapResults(data));
             })
             .catch(error => {
                 console.error('Error loading notifications:', error);
             });
     }
     
-    calculateStats(tasks) {
-        const total = tasks.length;
-        const completed = tasks.filter(t => t.status === 'completed').length;
-        const inProgress = tasks.filter(t => t.status === 'in_progress').length;
-        const pending = tasks.filter(t => t.status === 'pending').length;
-        const overdue = tasks.filter(t => t.is_overdue).length;
-        
-        return { total, completed, inProgress, pending, overdue };
-    }
-    
     renderStats(stats) {
         const container = document.getElementById('stats-container');
         if (!container) return;
@@ -289,7 +410,7 @@ class TaskManager {
         const container = document.getElementById('tasks-container');
         if (!container) return;
         
-        if (tasksToRender.length === 0) {
+        if (tasksToRender.length === 0 && !this.nextTasksUrl) {
             container.innerHTML = '<div class="text-center text-muted"><i class="fas fa-inbox fa-3x mb-3"></i><p>Нет задач</p></div>';
             return;
         }
@@ -356,7 +477,34 @@ class TaskManager {
             `;
         });
         
+        if (this.nextTasksUrl) {
+            html += `
+                <div id="tasks-sentinel" class="text-center my-3">
+                    <button class="btn btn-sm btn-outline-secondary" onclick="taskManager.loadMoreTasks()">
+                        Загрузить ещё
+                    </button>
+                </div>
+            `;
+        }
+        
         container.innerHTML = html;
+        this.observeTasksSentinel();
+    }
+    
+    observeTasksSentinel() {
+        // Подгружаем следующую страницу, когда пользователь докрутил до конца списка
+        if (this.tasksObserver) {
+            this.tasksObserver.disconnect();
+        }
+        const sentinel = document.getElementById('tasks-sentinel');
+        if (!sentinel || !('IntersectionObserver' in window)) return;
+        
+        this.tasksObserver = new IntersectionObserver(entries => {
+            if (entries.some(entry => entry.isIntersecting)) {
+                this.loadMoreTasks();
+            }
+        });
+        this.tasksObserver.observe(sentinel);
     }
     
     renderNotifications(notifications) {
@@ -408,7 +556,10 @@ class TaskManager {
         const statusFilter = document.getElementById('status-filter');
         const priorityFilter = document.getElementById('priority-filter');
         
-        if (!statusFilter || !priorityFilter) return;
+        if (!statusFilter || !priorityFilter) {
+            this.renderTasks(this.tasks);
+            return;
+        }
         
         const statusValue = statusFilter.value;
         const priorityValue = priorityFilter.value;
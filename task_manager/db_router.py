@@ -0,0 +1,91 @@
+"""
+Database router that sends safe reads to read replicas.
+
+По умолчанию все запросы идут в основную базу. Чтения переключаются на
+реплику только внутри явно отмеченных участков кода (replica_reads или
+start_replica_reads): безопасные запросы API, WebSocket, бот, сканирующие
+задачи Celery. Пользователь, недавно выполнивший запись, на
+DATABASE_READ_STICKINESS секунд закрепляется за основной базой, чтобы
+видеть свои изменения несмотря на отставание реплик.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+_read_alias = ContextVar('db_read_alias', default=None)
+
+
+def get_replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def _pin_key(user_id):
+    return f'db:pinned:{user_id}'
+
+
+def pin_to_primary(user_ids):
+    """Закрепляет пользователей, чьи данные изменились, за основной базой"""
+    if not get_replicas():
+        return
+    timeout = getattr(settings, 'DATABASE_READ_STICKINESS', 10)
+    cache.set_many({_pin_key(user_id): 1 for user_id in user_ids if user_id}, timeout)
+
+
+def is_pinned(user_id):
+    return bool(user_id) and cache.get(_pin_key(user_id)) is not None
+
+
+async def ais_pinned(user_id):
+    return bool(user_id) and await cache.aget(_pin_key(user_id)) is not None
+
+
+def start_replica_reads(pinned=False):
+    """
+    Переключает чтения текущего контекста на случайную реплику.
+    Возвращает токен для stop_replica_reads или None, если реплик нет или
+    пользователь закреплён за основной базой.
+    """
+    replicas = get_replicas()
+    if pinned or not replicas:
+        return None
+    return _read_alias.set(random.choice(replicas))
+
+
+def stop_replica_reads(token):
+    if token is not None:
+        _read_alias.reset(token)
+
+
+@contextmanager
+def replica_reads(pinned=False):
+    """Чтения внутри блока идут на реплику (см. start_replica_reads)"""
+    token = start_replica_reads(pinned)
+    try:
+        yield
+    finally:
+        stop_replica_reads(token)
+
+
+class ReplicaRouter:
+    """Чтения — в реплику текущего контекста, запись и миграции — в основную базу"""
+
+    def db_for_read(self, model, **hints):
+        alias = _read_alias.get()
+        # Внутри транзакции читаем то, что в неё записали
+        if alias is None or transaction.get_connection().in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и основная база
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
@@ -4,6 +4,7 @@ Django settings for task_manager project.
 
 import os
 from pathlib import Path
+from urllib.parse import urlsplit
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -29,6 +30,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'corsheaders',
     'channels',
@@ -46,6 +48,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'tasks.middleware.RealtimeEventsMiddleware',
 ]
 
 ROOT_URLCONF = 'task_manager.urls'
@@ -81,6 +84,25 @@ DATABASES = {
     }
 }
 
+# Реплики для чтения: DB_REPLICAS=host[:port][/name],... (учётные данные — как у основной базы)
+DATABASE_REPLICAS = []
+for index, replica in enumerate(filter(None, os.getenv('DB_REPLICAS', '').split(',')), start=1):
+    replica_url = urlsplit(f'//{replica.strip()}')
+    alias = f'replica_{index}'
+    DATABASES[alias] = dict(
+        DATABASES['default'],
+        HOST=replica_url.hostname,
+        PORT=str(replica_url.port or DATABASES['default']['PORT']),
+        NAME=replica_url.path.lstrip('/') or DATABASES['default']['NAME'],
+        # В тестовом окружении реплика указывает на тестовую основную базу
+        TEST={'MIRROR': 'default'},
+    )
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['task_manager.db_router.ReplicaRouter']
+# Сколько секунд после записи пользователь читает из основной базы
+DATABASE_READ_STICKINESS = int(os.getenv('DB_READ_STICKINESS', '10'))
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -126,6 +148,16 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # orjson, если установлен; иначе стандартный json
+    'DEFAULT_RENDERER_CLASSES': [
+        'tasks.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'tasks.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
 }
@@ -150,6 +182,34 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Cache configuration (маркеры версий, кэш ответов)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('CACHE_URL', os.getenv('REDIS_URL', 'redis://localhost:6379/0')),
+    }
+}
+
+# Время жизни закэшированных ответов со списками задач (секунды)
+TASKS_RESPONSE_CACHE_TIMEOUT = int(os.getenv('TASKS_RESPONSE_CACHE_TIMEOUT', '300'))
+
+# Конфигурация полнотекстового поиска PostgreSQL
+TASKS_SEARCH_CONFIG = os.getenv('TASKS_SEARCH_CONFIG', 'russian')
+
+# Срок хранения записей об удалении для инкрементальной синхронизации (дни)
+SYNC_TOMBSTONE_RETENTION_DAYS = int(os.getenv('SYNC_TOMBSTONE_RETENTION_DAYS', '30'))
+
+# Через сколько дней после завершения задачи переносятся в архив
+TASKS_ARCHIVE_AFTER_DAYS = int(os.getenv('TASKS_ARCHIVE_AFTER_DAYS', '90'))
+
+# Время жизни записи WebSocket-соединения в реестре присутствия без ping (секунды)
+WEBSOCKET_PRESENCE_TTL = int(os.getenv('WEBSOCKET_PRESENCE_TTL', '90'))
+# Ограничение входящих WebSocket-сообщений соединения: жетонов в секунду и размер ведра
+WEBSOCKET_RATE_LIMIT = float(os.getenv('WEBSOCKET_RATE_LIMIT', '5'))
+WEBSOCKET_RATE_BURST = int(os.getenv('WEBSOCKET_RATE_BURST', '20'))
+# Уведомления о задачах для пользователей без соединений отправлять в Telegram
+REALTIME_OFFLINE_TELEGRAM = os.getenv('REALTIME_OFFLINE_TELEGRAM', 'False').lower() == 'true'
+
 # Celery Configuration
 CELERY_BROKER_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
 CELERY_RESULT_BACKEND = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
@@ -157,6 +217,25 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+CELERY_BEAT_SCHEDULE = {
+    # Уведомления о просроченных задачах и пересчёт счётчиков, зависящих от времени
+    'check-overdue-tasks': {
+        'task': 'notifications.tasks.check_overdue_tasks',
+        'schedule': 60 * 60,
+    },
+    'prune-sync-tombstones': {
+        'task': 'tasks.tasks.prune_sync_tombstones',
+        'schedule': 60 * 60 * 24,
+    },
+    'archive-finished-tasks': {
+        'task': 'tasks.tasks.archive_finished_tasks',
+        'schedule': 60 * 60 * 24,
+    },
+    'reconcile-task-stats': {
+        'task': 'tasks.tasks.reconcile_task_stats',
+        'schedule': 60 * 60 * 24,
+    },
+}
 
 # Telegram Bot Configuration
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
@@ -0,0 +1,162 @@
+"""
+Archive tier for finished tasks.
+
+Задачи, завершённые или отменённые больше TASKS_ARCHIVE_AFTER_DAYS дней
+назад, вместе с комментариями и уведомлениями переносятся пакетами в
+архивные таблицы с сохранением идентификаторов. Горячие запросы работают
+только с таблицей Task; архив доступен через ?archived= у эндпоинтов задач.
+"""
+import heapq
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from notifications.models import Notification, ArchivedNotification
+from .models import (
+    Task, TaskList, TaskComment, TaskSearchDocument, Tombstone, UserTaskStats, ArchivedTask, ArchivedTaskComment
+)
+from . import versions, search, events
+
+ARCHIVE_BATCH_SIZE = 1000
+ARCHIVE_MODES = [
+    ('include', 'Вместе с архивом'),
+    ('only', 'Только архив'),
+]
+
+TASK_FIELDS = (
+    'id', 'title', 'description', 'task_list_id', 'assigned_to_id', 'created_by_id',
+    'priority', 'status', 'due_date', 'created_at', 'updated_at', 'completed_at',
+)
+COMMENT_FIELDS = ('id', 'task_id', 'author_id', 'content', 'created_at')
+NOTIFICATION_FIELDS = (
+    'id', 'user_id', 'notification_type', 'title', 'message', 'is_read',
+    'created_at', 'updated_at', 'read_at', 'task_id',
+)
+
+
+def get_archive_cutoff(days=None):
+    if days is None:
+        days = getattr(settings, 'TASKS_ARCHIVE_AFTER_DAYS', 90)
+    return timezone.now() - timedelta(days=days)
+
+
+def get_archivable_tasks(cutoff):
+    """Задачи, завершённые до cutoff; у отменённых без даты завершения — по дате изменения"""
+    return Task.objects.alias(
+        finished_at=Coalesce('completed_at', 'updated_at'),
+    ).filter(status__in=Task.FINISHED_STATUSES, finished_at__lt=cutoff)
+
+
+def _raw_delete(queryset):
+    # Удаление одним DELETE без загрузки объектов и сигналов: производные
+    # данные (счётчики, версии, записи об удалении) обновляются по пакету
+    return queryset._raw_delete(queryset.db)
+
+
+def archive_batch(task_ids, cutoff):
+    """
+    Переносит задачи из task_ids, всё ещё подходящие под условие архивации,
+    в одной транзакции. Возвращает количество перенесённых задач.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        # Блокировка и повторная проверка: задачу могли открыть заново
+        tasks = list(
+            get_archivable_tasks(cutoff).filter(pk__in=task_ids).select_for_update().values(*TASK_FIELDS)
+        )
+        if not tasks:
+            return 0
+        task_ids = [task['id'] for task in tasks]
+        notifications = list(Notification.objects.filter(task_id__in=task_ids).values(*NOTIFICATION_FIELDS))
+
+        ArchivedTask.objects.bulk_create([ArchivedTask(archived_at=now, **task) for task in tasks])
+        ArchivedTaskComment.objects.bulk_create([
+            ArchivedTaskComment(**comment)
+            for comment in TaskComment.objects.filter(task_id__in=task_ids).values(*COMMENT_FIELDS).iterator()
+        ])
+        ArchivedNotification.objects.bulk_create([
+            ArchivedNotification(**notification) for notification in notifications
+        ])
+
+        _raw_delete(Notification.objects.filter(task_id__in=task_ids))
+        _raw_delete(TaskComment.objects.filter(task_id__in=task_ids))
+        if search.is_full_text_supported():
+            _raw_delete(TaskSearchDocument.objects.filter(task_id__in=task_ids))
+        _raw_delete(Task.objects.filter(pk__in=task_ids))
+
+        TaskList.recalculate_counters({task['task_list_id'] for task in tasks})
+        UserTaskStats.recalculate({task['assigned_to_id'] for task in tasks})
+        # Синхронизируемые клиенты удаляют архивные объекты из своих выборок
+        tombstones = {
+            ('task', task['id'], user_id)
+            for task in tasks for user_id in (task['assigned_to_id'], task['created_by_id'])
+        }
+        tombstones.update(
+            ('notification', notification['id'], notification['user_id']) for notification in notifications
+        )
+        Tombstone.objects.bulk_create([
+            Tombstone(user_id=user_id, object_type=object_type, object_id=object_id, deleted_at=now)
+            for object_type, object_id, user_id in tombstones
+        ])
+
+    task_users = {user_id for task in tasks for user_id in (task['assigned_to_id'], task['created_by_id'])}
+    versions.bump_version(versions.TASKS, task_users)
+    events.publish_list_changes((task['task_list_id'], task['id']) for task in tasks)
+    if notifications:
+        versions.bump_version(versions.NOTIFICATIONS, {notification['user_id'] for notification in notifications})
+    return len(tasks)
+
+
+def archive_tasks(days=None, batch_size=ARCHIVE_BATCH_SIZE, progress=None):
+    """
+    Переносит в архив все подходящие задачи пакетами по batch_size.
+    progress(archived) вызывается после каждого пакета.
+    """
+    cutoff = get_archive_cutoff(days)
+    archived = 0
+    last_id = 0
+    while True:
+        # Пакеты по возрастанию id: задачи, оставшиеся после повторной проверки, не выбираются снова
+        task_ids = list(
+            get_archivable_tasks(cutoff).filter(pk__gt=last_id).order_by('pk')
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        if not task_ids:
+            return archived
+        last_id = task_ids[-1]
+        archived += archive_batch(task_ids, cutoff)
+        if progress:
+            progress(archived)
+
+
+class MergedQuerySet:
+    """
+    Объединение нескольких queryset с одинаковым порядком для курсорной
+    пагинации: каждый queryset выбирает не больше строк, чем нужно странице,
+    результаты сливаются в общем порядке. Поддерживает только операции,
+    которые выполняет CursorPagination: order_by, filter и срез.
+    """
+
+    def __init__(self, querysets, ordering=()):
+        self.querysets = querysets
+        self.ordering = ordering
+
+    def order_by(self, *ordering):
+        return MergedQuerySet([queryset.order_by(*ordering) for queryset in self.querysets], ordering)
+
+    def filter(self, *args, **kwargs):
+        return MergedQuerySet([queryset.filter(*args, **kwargs) for queryset in self.querysets], self.ordering)
+
+    def __getitem__(self, item):
+        assert isinstance(item, slice) and item.stop is not None, 'Поддерживается только срез с границей'
+        fields = [name.lstrip('-') for name in self.ordering]
+        descending = bool(self.ordering) and self.ordering[0].startswith('-')
+        merged = heapq.merge(
+            *[list(queryset[:item.stop]) for queryset in self.querysets],
+            key=lambda obj: tuple(getattr(obj, name) for name in fields),
+            reverse=descending,
+        )
+        return list(merged)[item]
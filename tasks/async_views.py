@@ -0,0 +1,225 @@
+"""
+Native async read endpoints for ASGI.
+
+Горячие эндпоинты чтения реализованы асинхронными представлениями Django
+без DRF: аутентификация, проверка ETag, кэш ответов и запросы к базе
+выполняются через асинхронные API Django, поэтому запрос не занимает поток
+на всё время обработки. Формат ответов совпадает с действиями ViewSet.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.apps import apps
+from django.contrib.auth import get_user
+from django.db.models import Q, prefetch_related_objects
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils import timezone
+from rest_framework.exceptions import APIException, MethodNotAllowed, NotAuthenticated
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from task_manager import db_router
+
+from .filters import TaskFilterBackend
+from .mixins import make_etag, etag_matches
+from .models import Task
+from .pagination import TaskCursorPagination
+from .serializers import TaskCompactSerializer
+from . import versions, response_cache, sync, fastjson
+
+MEDIA_TYPE = 'application/json'
+# is_overdue и overdue_tasks зависят от текущего времени
+TASKS_TIME_BUCKET = 60
+
+
+def json_response(data, status=200):
+    return HttpResponse(fastjson.dumps(data), content_type=MEDIA_TYPE, status=status)
+
+
+async def aget_user(request):
+    """Пользователь запроса по токену или сессии; None — не аутентифицирован"""
+    auth = request.headers.get('Authorization', '').split()
+    if len(auth) == 2 and auth[0].lower() == 'token' and apps.is_installed('rest_framework.authtoken'):
+        from rest_framework.authtoken.models import Token
+        token = await Token.objects.select_related('user').filter(key=auth[1]).afirst()
+        return token.user if token and token.user.is_active else None
+    user = await sync_to_async(get_user)(request)
+    return user if user.is_authenticated else None
+
+
+def get_list_param(request, name):
+    value = request.GET.get(name)
+    if not value:
+        return None
+    return {item.strip() for item in value.split(',') if item.strip()}
+
+
+def get_page_size(request):
+    try:
+        page_size = int(request.GET[TaskCursorPagination.page_size_query_param])
+    except (KeyError, ValueError):
+        return api_settings.PAGE_SIZE
+    if page_size <= 0:
+        return api_settings.PAGE_SIZE
+    return min(page_size, TaskCursorPagination.max_page_size)
+
+
+async def aserialize(serializer_class, request, objects):
+    """Сериализует объекты с учётом ?fields= и ?expand=, подгружая связи заранее"""
+    fields = get_list_param(request, 'fields')
+    expand = get_list_param(request, 'expand') or set()
+    _, prefetch_related = serializer_class.get_related_lookups(fields=fields, expand=expand)
+    if prefetch_related and objects:
+        await sync_to_async(prefetch_related_objects)(objects, *prefetch_related)
+    return serializer_class(objects, many=True, fields=fields, expand=expand).data
+
+
+def apply_projection(serializer_class, request, queryset):
+    """Аннотации и select_related проекции; prefetch выполняет aserialize"""
+    fields = get_list_param(request, 'fields')
+    select_related, _ = serializer_class.get_related_lookups(
+        fields=fields,
+        expand=get_list_param(request, 'expand') or set(),
+    )
+    annotations = serializer_class.get_annotations(fields=fields)
+    if annotations:
+        queryset = queryset.annotate(**annotations)
+    return queryset.select_related(*select_related) if select_related else queryset
+
+
+async def akeyset_page(request, queryset, ordering):
+    """
+    Страница с keyset-пагинацией по (поле даты, id): ?cursor= из next
+    предыдущей страницы или ?before= из previous следующей, ?page_size=.
+    Возвращает объекты страницы и ссылки next и previous.
+    """
+    field, descending = ordering[0].lstrip('-'), ordering[0].startswith('-')
+    cursor = request.GET.get('cursor')
+    before = None if cursor else request.GET.get('before')
+    if cursor or before:
+        position, last_id = sync.decode_cursor(cursor or before, 'cursor' if cursor else 'before')
+        # Вперёд — объекты после позиции в порядке ordering, назад — до неё
+        lookup = 'lt' if descending != bool(before) else 'gt'
+        queryset = queryset.filter(
+            Q(**{f'{field}__{lookup}': position}) | Q(**{field: position, f'id__{lookup}': last_id})
+        )
+    if before:
+        ordering = [key[1:] if key.startswith('-') else f'-{key}' for key in ordering]
+    page_size = get_page_size(request)
+    rows = [obj async for obj in queryset.order_by(*ordering)[:page_size + 1]]
+    more = len(rows) > page_size
+    page = rows[:page_size]
+    if before:
+        page.reverse()
+
+    url = remove_query_param(remove_query_param(request.build_absolute_uri(), 'cursor'), 'before')
+    next_url = previous_url = None
+    # Назад переходят со следующей страницы, поэтому после этой страницы объекты есть
+    if page and (more or before):
+        last = page[-1]
+        next_url = replace_query_param(url, 'cursor', sync.encode_cursor(getattr(last, field), last.id))
+    if (more and before) or cursor:
+        first = page[0] if page else None
+        anchor = sync.encode_cursor(getattr(first, field), first.id) if first else cursor
+        previous_url = replace_query_param(url, 'before', anchor)
+    return page, next_url, previous_url
+
+
+async def aconditional_response(request, user, scope, producer, time_bucket=None, cached=False):
+    """
+    Ответ с проверкой If-None-Match по маркеру версии пользователя.
+    При cached=True данные берутся из кэша ответов (см. tasks.response_cache).
+    """
+    version = await versions.aget_version(scope, user.id)
+    etag = make_etag(scope, user.id, version, f'{request.get_full_path()}|{MEDIA_TYPE}', time_bucket)
+    if etag_matches(etag, request.headers.get('If-None-Match')):
+        response = HttpResponseNotModified()
+    else:
+        try:
+            if cached:
+                data = await response_cache.aget_or_set(
+                    scope, user.id, request.build_absolute_uri(), producer, time_bucket, version=version
+                )
+            else:
+                data = await producer()
+        except APIException as exc:
+            detail = exc.detail if isinstance(exc.detail, (dict, list)) else {'detail': exc.detail}
+            return json_response(detail, status=exc.status_code)
+        response = json_response(data)
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def async_read_view(view):
+    """
+    Асинхронное представление только для чтения: разрешает GET/HEAD,
+    передаёт во view аутентифицированного пользователя и читает из реплики,
+    если пользователь не закреплён за основной базой; ошибки — как в DRF.
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            detail = MethodNotAllowed(request.method).detail
+            return json_response({'detail': detail}, status=405)
+        user = await aget_user(request)
+        if user is None:
+            return json_response({'detail': NotAuthenticated.default_detail}, status=403)
+        token = db_router.start_replica_reads(pinned=await db_router.ais_pinned(user.id))
+        try:
+            return await view(request, user, *args, **kwargs)
+        finally:
+            db_router.stop_replica_reads(token)
+    return wrapper
+
+
+async def _atask_page(request, queryset, ordering):
+    queryset = TaskFilterBackend().filter_queryset(Request(request), queryset, None)
+    queryset = apply_projection(TaskCompactSerializer, request, queryset)
+    tasks, next_url, previous_url = await akeyset_page(request, queryset, ordering)
+    # Формат ответа CursorPagination DRF
+    return {
+        'next': next_url,
+        'previous': previous_url,
+        'results': await aserialize(TaskCompactSerializer, request, tasks),
+    }
+
+
+@async_read_view
+async def my_tasks(request, user):
+    """Получить задачи, назначенные текущему пользователю"""
+    return await aconditional_response(
+        request, user, versions.TASKS,
+        lambda: _atask_page(request, Task.objects.filter(assigned_to=user), ('-created_at', '-id')),
+        time_bucket=TASKS_TIME_BUCKET,
+        cached=True,
+    )
+
+
+@async_read_view
+async def overdue_tasks(request, user):
+    """Получить просроченные задачи"""
+    queryset = Task.objects.filter(
+        Q(assigned_to=user) | Q(created_by=user),
+        due_date__lt=timezone.now(),
+        status__in=Task.OPEN_STATUSES,
+    )
+    return await aconditional_response(
+        request, user, versions.TASKS,
+        lambda: _atask_page(request, queryset, ('due_date', 'id')),
+        time_bucket=TASKS_TIME_BUCKET,
+        cached=True,
+    )
+
+
+def page_number_urls(request, page, page_size, count):
+    """Ссылки next/previous в формате PageNumberPagination DRF"""
+    url = request.build_absolute_uri()
+    next_url = replace_query_param(url, 'page', page + 1) if page * page_size < count else None
+    if page <= 1:
+        previous_url = None
+    elif page == 2:
+        previous_url = remove_query_param(url, 'page')
+    else:
+        previous_url = replace_query_param(url, 'page', page - 1)
+    return next_url, previous_url
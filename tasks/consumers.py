@@ -1,11 +1,47 @@
 """
 WebSocket consumers for real-time updates.
+
+После get_tasks соединение хранит курсор своего снимка и при событиях о
+задачах досылает только изменения (tasks_diff: upserted и deleted), а не
+весь список. get_tasks с since продолжает синхронизацию после
+переподключения; устаревший или некорректный курсор приводит к полной
+загрузке. Клиент, загружающий задачи постранично через REST, передаёт
+snapshot: false: вместо снимка он получает tasks_cursor с курсором, от
+которого дальше приходят tasks_diff (reload: true — курсор клиента устарел,
+страницы нужно перезагрузить). Сообщения subscribe/unsubscribe с
+task_list_id подключают соединение к группе списка задач; право просмотра
+списка проверяется при подписке и кэшируется в соединении на
+LIST_PERMISSION_TTL секунд.
+Формат кадров (JSON или MessagePack) выбирается подпротоколом, см. wire.
+Соединение регистрируется в реестре присутствия (presence) и продлевает
+запись при ping (не на каждом, см. presence.heartbeat_due). Входящие
+сообщения ограничены ведром жетонов соединения: при превышении клиент
+получает throttled с retry_after.
 """
-import json
+import asyncio
+import time
+
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
+from django.conf import settings
 from django.contrib.auth.models import User
-from .models import Task
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from task_manager import db_router
+from .models import Task, TaskList
+from . import versions, response_cache, events, sync, wire, presence, throttling
+
+# Окно (в секундах), в котором события о задачах объединяются в одну отправку изменений
+DIFF_PUSH_DELAY = 0.05
+# Сколько секунд соединение доверяет результату проверки права на просмотр списка
+LIST_PERMISSION_TTL = 60
+# Стоимость входящих сообщений в жетонах; остальные сообщения стоят один жетон
+MESSAGE_COSTS = {'get_tasks': 5}
+# Сколько секунд готовый снимок задач переиспользуется другими соединениями пользователя
+SNAPSHOT_REUSE_SECONDS = 2
+
+_snapshots = throttling.SharedResults(SNAPSHOT_REUSE_SECONDS)
 
 
 class TaskConsumer(AsyncWebsocketConsumer):
@@ -27,74 +63,282 @@ class TaskConsumer(AsyncWebsocketConsumer):
             self.channel_name
         )
         
-        await self.accept()
+        # Курсор снимка задач, отправленного клиенту; None — клиент задач не запрашивал
+        self.cursor = None
+        # Нужен ли клиенту полный снимок задач (False — клиент загружает их через REST)
+        self.snapshot = True
+        # Версии (updated_at) задач, уже отправленных в пределах окна перекрытия курсора
+        self.sent_versions = {}
+        self.push_task = None
+        self.sync_lock = asyncio.Lock()
+        # Подписки на списки задач и кэш проверок права: список -> (разрешено, время проверки)
+        self.task_lists = set()
+        self.list_permissions = {}
+        self.codec = wire.get_codec(self.scope.get('subprotocols', []))
+        self.rate_limiter = throttling.TokenBucket(
+            getattr(settings, 'WEBSOCKET_RATE_LIMIT', 5),
+            getattr(settings, 'WEBSOCKET_RATE_BURST', 20),
+        )
+        await self.accept(self.codec.subprotocol)
+        await presence.aheartbeat(self.user.id, self.channel_name)
+        self.heartbeat_at = time.monotonic()
     
     async def disconnect(self, close_code):
         """Отключение от WebSocket"""
+        if getattr(self, 'push_task', None):
+            self.push_task.cancel()
         if hasattr(self, 'room_group_name'):
             await self.channel_layer.group_discard(
                 self.room_group_name,
                 self.channel_name
             )
+            await presence.adisconnect(self.user.id, self.channel_name)
+        for task_list_id in getattr(self, 'task_lists', ()):
+            await self.channel_layer.group_discard(events.get_task_list_group_name(task_list_id), self.channel_name)
     
-    async def receive(self, text_data):
+    async def send_message(self, message):
+        """Отправляет сообщение в формате, согласованном при подключении"""
+        frame = self.codec.encode(message)
+        if self.codec.binary:
+            await self.send(bytes_data=frame)
+        else:
+            await self.send(text_data=frame)
+    
+    async def consume_tokens(self, cost, message_type):
+        """Расходует жетоны соединения; при нехватке отправляет throttled и возвращает False"""
+        retry_after = self.rate_limiter.consume(cost) if cost else 0
+        if retry_after:
+            await self.send_message({
+                'type': 'throttled',
+                'request': message_type,
+                'retry_after': round(retry_after, 2),
+            })
+        return not retry_after
+    
+    async def receive(self, text_data=None, bytes_data=None):
         """Получение сообщения от клиента"""
+        # Жетон расходуется до разбора: разбор кадра тоже стоит ресурсов
+        if not await self.consume_tokens(1, None):
+            return
         try:
-            text_data_json = json.loads(text_data)
-            message_type = text_data_json.get('type')
-            
-            if message_type == 'ping':
-                await self.send(text_data=json.dumps({
-                    'type': 'pong'
-                }))
-            elif message_type == 'get_tasks':
-                tasks = await self.get_user_tasks()
-                await self.send(text_data=json.dumps({
-                    'type': 'tasks_data',
-                    'tasks': tasks
-                }))
-                
-        except json.JSONDecodeError:
-            await self.send(text_data=json.dumps({
+            text_data_json = self.codec.decode(bytes_data if self.codec.binary else text_data)
+        except wire.DecodeError:
+            text_data_json = None
+        message_type = text_data_json.get('type') if isinstance(text_data_json, dict) else None
+        # Дорогие сообщения доплачивают разницу после разбора
+        if not await self.consume_tokens(MESSAGE_COSTS.get(message_type, 1) - 1, message_type):
+            return
+        
+        if text_data_json is None:
+            await self.send_message({
                 'type': 'error',
-                'message': 'Invalid JSON'
-            }))
+                'message': f'Invalid {self.codec.name}'
+            })
+        elif message_type == 'ping':
+            # ping клиента продлевает запись соединения в реестре присутствия
+            if presence.heartbeat_due(self.heartbeat_at):
+                await presence.aheartbeat(self.user.id, self.channel_name)
+                self.heartbeat_at = time.monotonic()
+            await self.send_message({
+                'type': 'pong'
+            })
+        elif message_type == 'get_tasks':
+            async with self.sync_lock:
+                self.snapshot = text_data_json.get('snapshot', True) is not False
+                await self.send_tasks(text_data_json.get('since'), self.snapshot)
+        elif message_type in ('subscribe', 'unsubscribe'):
+            task_list_id = text_data_json.get('task_list_id')
+            if not isinstance(task_list_id, int) or isinstance(task_list_id, bool):
+                await self.send_message({
+                    'type': 'error',
+                    'message': 'task_list_id must be an integer'
+                })
+            elif message_type == 'subscribe':
+                await self.subscribe(task_list_id)
+            else:
+                await self.unsubscribe(task_list_id)
     
     async def task_notification(self, event):
         """Отправка уведомления о задаче"""
-        await self.send(text_data=json.dumps({
+        message = {
             'type': 'notification',
             'event': event['event'],
-            'task_id': event['task_id'],
-            'task_title': event['task_title'],
+            'task_id': event.get('task_id'),
+            'task_title': event.get('task_title'),
             'message': event['message']
-        }))
+        }
+        # Сводные уведомления о массовых операциях содержат список задач
+        if 'task_ids' in event:
+            message['task_ids'] = event['task_ids']
+        await self.send_message(message)
+        if 'enqueued_at' in event:
+            await events.arecord_latency('delivery', [time.time() - event['enqueued_at']])
+        self.schedule_push()
+    
+    async def tasks_changed(self, event):
+        """Задачи пользователя изменились без уведомления"""
+        self.schedule_push()
+    
+    async def task_list_update(self, event):
+        """Изменения задач списка, на который подписано соединение"""
+        task_list_id = event['task_list_id']
+        if task_list_id not in self.task_lists:
+            return
+        if not await self.can_view_task_list(task_list_id):
+            # Доступ к списку отозван после подписки
+            await self.unsubscribe(task_list_id)
+            return
+        message = {key: value for key, value in event.items() if key != 'enqueued_at'}
+        await self.send_message(message)
+        await events.arecord_latency('delivery', [time.time() - event['enqueued_at']])
+    
+    async def subscribe(self, task_list_id):
+        if not await self.can_view_task_list(task_list_id):
+            await self.send_message({
+                'type': 'error',
+                'message': 'Task list not found',
+                'task_list_id': task_list_id,
+            })
+            return
+        if task_list_id not in self.task_lists:
+            await self.channel_layer.group_add(events.get_task_list_group_name(task_list_id), self.channel_name)
+            self.task_lists.add(task_list_id)
+        await self.send_message({'type': 'subscribed', 'task_list_id': task_list_id})
+    
+    async def unsubscribe(self, task_list_id):
+        if task_list_id in self.task_lists:
+            await self.channel_layer.group_discard(events.get_task_list_group_name(task_list_id), self.channel_name)
+            self.task_lists.discard(task_list_id)
+        await self.send_message({'type': 'unsubscribed', 'task_list_id': task_list_id})
+    
+    async def can_view_task_list(self, task_list_id):
+        """Право на просмотр списка с кэшем на LIST_PERMISSION_TTL секунд"""
+        cached = self.list_permissions.get(task_list_id)
+        if cached is not None and time.monotonic() - cached[1] < LIST_PERMISSION_TTL:
+            return cached[0]
+        allowed = await self.check_task_list_permission(task_list_id)
+        self.list_permissions[task_list_id] = (allowed, time.monotonic())
+        return allowed
     
     @database_sync_to_async
-    def get_user_tasks(self):
-        """Получение задач пользователя"""
+    def check_task_list_permission(self, task_list_id):
+        with db_router.replica_reads(pinned=db_router.is_pinned(self.user.id)):
+            return TaskList.can_view(task_list_id, self.user.id)
+    
+    async def send_tasks(self, since=None, snapshot=True):
+        """
+        Полный снимок задач (tasks_data) или изменения после курсора since
+        (tasks_diff); при snapshot=False вместо снимка — только новый курсор.
+        """
+        if since:
+            try:
+                await self.send_changes(since)
+                return
+            except (ValidationError, sync.SyncCursorExpired):
+                # Клиент получит полный снимок (или новый курсор) и перезагрузит задачи
+                pass
+        if not snapshot:
+            # Курсор клиента заменяется: загруженные им страницы могли устареть
+            reload = bool(since) or self.cursor is not None
+            self.cursor = sync.encode_cursor(timezone.now() - sync.SYNC_OVERLAP)
+            self.sent_versions = {}
+            await self.send_message({'type': 'tasks_cursor', 'cursor': self.cursor, 'reload': reload})
+            return
+        data = await self.get_user_tasks()
+        self.cursor = data['cursor']
+        self.sent_versions = {}
+        await self.send_message({
+            'type': 'tasks_data',
+            'tasks': data['tasks'],
+            'cursor': data['cursor'],
+        })
+    
+    async def send_changes(self, since, skip_empty=False):
+        """Отправляет изменения после курсора since пакетами по SYNC_BATCH_SIZE"""
+        cursor = since
+        while True:
+            changes = await self.get_task_changes(cursor)
+            cursor = changes['cursor']
+            if not (skip_empty and not changes['upserted'] and not changes['deleted']):
+                await self.send_message(dict(changes, type='tasks_diff'))
+            if not changes['has_more']:
+                break
+        self.cursor = cursor
+    
+    def schedule_push(self):
+        """Планирует отправку изменений; события внутри DIFF_PUSH_DELAY объединяются"""
+        if self.cursor is None or self.push_task is not None:
+            return
+        self.push_task = asyncio.ensure_future(self.push_changes())
+    
+    async def push_changes(self):
+        await asyncio.sleep(DIFF_PUSH_DELAY)
+        # События, пришедшие во время отправки, запланируют следующую
+        self.push_task = None
+        async with self.sync_lock:
+            try:
+                await self.send_changes(self.cursor, skip_empty=True)
+            except (ValidationError, sync.SyncCursorExpired):
+                await self.send_tasks(snapshot=self.snapshot)
+    
+    async def get_user_tasks(self):
+        """
+        Снимок задач пользователя. Одновременные запросы из нескольких
+        соединений пользователя выполняются одним запросом (в пределах процесса).
+        """
+        version = await versions.aget_version(versions.TASKS, self.user.id)
+        return await _snapshots.get((self.user.id, version), self.load_user_tasks)
+    
+    @database_sync_to_async
+    def load_user_tasks(self):
+        """Получение задач пользователя (через кэш ответов, с реплики)"""
+        with db_router.replica_reads(pinned=db_router.is_pinned(self.user.id)):
+            return response_cache.get_or_set(
+                versions.TASKS,
+                self.user.id,
+                'consumer:get_user_tasks',
+                self._load_user_tasks,
+                time_bucket=60,
+            )
+    
+    def _load_user_tasks(self):
+        # Курсор берётся до чтения: изменения во время выборки придут в следующем tasks_diff
+        cursor = sync.encode_cursor(timezone.now() - sync.SYNC_OVERLAP)
         tasks = Task.objects.filter(
             assigned_to=self.user
         ).select_related('assigned_to', 'created_by', 'task_list')
         
-        return [
-            {
-                'id': task.id,
-                'title': task.title,
-                'description': task.description,
-                'status': task.status,
-                'priority': task.priority,
-                'due_date': task.due_date.isoformat() if task.due_date else None,
-                'created_at': task.created_at.isoformat(),
-                'is_overdue': task.is_overdue(),
-                'task_list': {
-                    'id': task.task_list.id,
-                    'name': task.task_list.name
-                },
-                'created_by': {
-                    'id': task.created_by.id,
-                    'username': task.created_by.username
-                }
-            }
-            for task in tasks
-        ]
+        return {
+            'tasks': [events.serialize_task(task) for task in tasks],
+            'cursor': cursor,
+        }
+    
+    @database_sync_to_async
+    def get_task_changes(self, since):
+        """Изменения задач пользователя после курсора since (с реплики)"""
+        with db_router.replica_reads(pinned=db_router.is_pinned(self.user.id)):
+            # Записи об удалении ведутся для выборки «исполнитель или создатель»,
+            # поэтому изменения выбираются по ней же
+            queryset = Task.objects.filter(
+                Q(assigned_to=self.user) | Q(created_by=self.user)
+            ).select_related('assigned_to', 'created_by', 'task_list')
+            changes = sync.get_changes(queryset, self.user, 'task', since, lambda rows: rows)
+        
+        upserted = []
+        deleted = set(changes['deleted'])
+        for task in changes['upserted']:
+            # Задачи, которые пользователь создал, но которые назначены другому, в списке не показываются
+            if task.assigned_to_id != self.user.id:
+                deleted.add(task.id)
+                self.sent_versions.pop(task.id, None)
+            elif self.sent_versions.get(task.id) != task.updated_at:
+                # Курсор с перекрытием снова выбирает недавние изменения; отправленные не повторяются
+                upserted.append(events.serialize_task(task))
+                self.sent_versions[task.id] = task.updated_at
+                deleted.discard(task.id)
+        
+        floor, _ = sync.decode_cursor(changes['cursor'])
+        self.sent_versions = {
+            task_id: updated_at for task_id, updated_at in self.sent_versions.items() if updated_at >= floor
+        }
+        return dict(changes, upserted=upserted, deleted=sorted(deleted))
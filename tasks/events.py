@@ -0,0 +1,414 @@
+"""
+Transaction-aware, coalesced WebSocket fan-out.
+
+События о задачах не отправляются в слой каналов сразу: publish_task и
+publish_tasks ставят их в очередь до фиксации транзакции (при откате они
+отбрасываются). В пределах запроса события собираются в пакет
+(RealtimeEventsMiddleware) и объединяются по получателю: несколько задач с
+одним событием превращаются в одно сводное уведомление. Пакет отправляется
+одним переходом в асинхронный код после того, как ответ отдан клиенту.
+Любое изменение задач пользователя (publish_changes) без уведомления
+отправляется как tasks_changed, по которому соединение досылает изменения.
+Изменения задач списка (publish_list_changes) отправляются один раз в группу
+списка с уже сериализованными задачами, а не каждому участнику отдельно.
+Пользователям без живых соединений (см. presence) события не отправляются.
+Задержки от постановки в очередь до отправки и до доставки в WebSocket
+собираются в гистограммы (get_stats): они копятся в памяти процесса и
+сбрасываются в кэш не чаще раза в LATENCY_FLUSH_INTERVAL секунд, а не на
+каждом доставленном сообщении.
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from . import presence
+
+logger = logging.getLogger(__name__)
+
+_batch = ContextVar('realtime_events_batch', default=None)
+
+# Границы корзин гистограммы задержек, мс
+LATENCY_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+LATENCY_STAGES = ('dispatch', 'delivery')
+LATENCY_FLUSH_INTERVAL = 10
+STATS_TIMEOUT = None
+# Больше изменённых задач списка за пакет не сериализуется: подписчики перезагружают список
+LIST_EVENT_MAX_TASKS = 200
+
+
+def get_group_name(user_id):
+    return f'user_{user_id}'
+
+
+def get_task_list_group_name(task_list_id):
+    return f'task_list_{task_list_id}'
+
+
+def serialize_task(task):
+    """Данные задачи для WebSocket (нужны select_related task_list и created_by)"""
+    return {
+        'id': task.id,
+        'title': task.title,
+        'description': task.description,
+        'status': task.status,
+        'priority': task.priority,
+        'due_date': task.due_date.isoformat() if task.due_date else None,
+        'created_at': task.created_at.isoformat(),
+        'is_overdue': task.is_overdue(),
+        'task_list': {
+            'id': task.task_list.id,
+            'name': task.task_list.name
+        },
+        'created_by': {
+            'id': task.created_by.id,
+            'username': task.created_by.username
+        }
+    }
+
+
+def get_notification_message(title, event_type):
+    """Текст уведомления о задаче"""
+    messages = {
+        'task_created': f'Вам назначена новая задача: {title}',
+        'task_updated': f'Задача обновлена: {title}',
+        'task_completed': f'Задача выполнена: {title}',
+        'comment_added': f'Добавлен комментарий к задаче: {title}',
+    }
+    return messages.get(event_type, f'Обновление задачи: {title}')
+
+
+def get_bulk_notification_message(count, event_type):
+    """Текст сводного уведомления"""
+    messages = {
+        'task_created': f'Создано задач: {count}',
+        'task_updated': f'Обновлено задач: {count}',
+        'task_completed': f'Выполнено задач: {count}',
+    }
+    return messages.get(event_type, f'Изменено задач: {count}')
+
+
+class EventBatch:
+    """События, накопленные за запрос: (получатель, событие) -> задачи"""
+
+    def __init__(self):
+        self.events = {}
+        # Пользователи с изменёнными задачами -> время первого изменения
+        self.changed = {}
+        # Списки задач -> изменённые задачи
+        self.list_changes = {}
+
+    def __bool__(self):
+        return bool(self.events or self.changed or self.list_changes)
+
+    def add(self, entries, enqueued_at):
+        for user_id, event_type, task_id, title in entries:
+            event = self.events.setdefault((user_id, event_type), {'tasks': {}, 'enqueued_at': enqueued_at})
+            # Название, известное хотя бы из одного события, не теряется
+            event['tasks'][task_id] = title or event['tasks'].get(task_id)
+
+    def add_changed(self, user_ids, enqueued_at):
+        for user_id in user_ids:
+            self.changed.setdefault(user_id, enqueued_at)
+
+    def add_list_changes(self, pairs, enqueued_at):
+        for task_list_id, task_id in pairs:
+            self.list_changes.setdefault(task_list_id, {'task_ids': set(), 'enqueued_at': enqueued_at})
+            self.list_changes[task_list_id]['task_ids'].add(task_id)
+
+    def get_user_ids(self):
+        return {user_id for user_id, _ in self.events} | set(self.changed)
+
+    def get_messages(self, offline=frozenset()):
+        """Пары (группа, сообщение) для подключённых пользователей"""
+        return [
+            (get_group_name(user_id), message)
+            for user_id, message in self.get_user_messages() if user_id not in offline
+        ]
+
+    def get_user_messages(self):
+        """Пары (пользователь, сообщение); сообщение для одной задачи собирается один раз"""
+        messages = []
+        single_messages = {}
+        for (user_id, event_type), event in self.events.items():
+            tasks = event['tasks']
+            task_id, title = next(iter(tasks.items()))
+            if len(tasks) == 1 and title is not None:
+                key = (event_type, task_id)
+                if key not in single_messages:
+                    single_messages[key] = {
+                        'type': 'task_notification',
+                        'event': event_type,
+                        'task_id': task_id,
+                        'task_title': title,
+                        'message': get_notification_message(title, event_type),
+                    }
+                message = dict(single_messages[key], enqueued_at=event['enqueued_at'])
+            else:
+                message = {
+                    'type': 'task_notification',
+                    'event': event_type,
+                    'task_ids': sorted(tasks),
+                    'message': get_bulk_notification_message(len(tasks), event_type),
+                    'enqueued_at': event['enqueued_at'],
+                }
+            messages.append((user_id, message))
+        # Уведомление о задаче и так запускает отправку изменений
+        notified = {user_id for user_id, _ in self.events}
+        for user_id, enqueued_at in self.changed.items():
+            if user_id not in notified:
+                messages.append((user_id, {'type': 'tasks_changed', 'enqueued_at': enqueued_at}))
+        return messages
+
+    def get_list_messages(self):
+        """
+        Пары (группа списка, сообщение). Задачи читаются одним запросом из
+        основной базы и сериализуются один раз для всех подписчиков списка.
+        """
+        from .models import Task
+
+        if not self.list_changes:
+            return []
+        task_ids = {
+            task_id for change in self.list_changes.values()
+            if len(change['task_ids']) <= LIST_EVENT_MAX_TASKS for task_id in change['task_ids']
+        }
+        tasks = Task.objects.filter(pk__in=task_ids).select_related('task_list', 'created_by').in_bulk()
+        messages = []
+        for task_list_id, change in self.list_changes.items():
+            message = {
+                'type': 'task_list_update',
+                'task_list_id': task_list_id,
+                'enqueued_at': change['enqueued_at'],
+            }
+            if len(change['task_ids']) > LIST_EVENT_MAX_TASKS:
+                message['reload'] = True
+            else:
+                # Удалённые, архивированные и перенесённые в другой список задачи
+                current = [
+                    tasks[task_id] for task_id in sorted(change['task_ids'])
+                    if task_id in tasks and tasks[task_id].task_list_id == task_list_id
+                ]
+                message['upserted'] = [serialize_task(task) for task in current]
+                message['deleted'] = sorted(change['task_ids'] - {task.id for task in current})
+            messages.append((get_task_list_group_name(task_list_id), message))
+        return messages
+
+
+def start_batch():
+    """Начинает накопление событий текущего контекста (запроса)"""
+    return _batch.set(EventBatch())
+
+
+def end_batch(token):
+    """Заканчивает накопление и возвращает пакет для dispatch"""
+    batch = _batch.get()
+    _batch.reset(token)
+    return batch
+
+
+def _publish(entries=(), changed=(), list_changes=()):
+    enqueued_at = time.time()
+
+    def enqueue():
+        batch = _batch.get()
+        # Вне запроса (Celery, команды) пакет отправляется сразу после фиксации
+        immediate = batch is None
+        if immediate:
+            batch = EventBatch()
+        batch.add(entries, enqueued_at)
+        batch.add_changed(changed, enqueued_at)
+        batch.add_list_changes(list_changes, enqueued_at)
+        if immediate:
+            dispatch(batch)
+
+    # При откате транзакции событие не отправляется
+    transaction.on_commit(enqueue)
+
+
+def publish_task(task, event_type):
+    """Событие о задаче для её исполнителя и создателя"""
+    _publish([
+        (user_id, event_type, task.id, task.title)
+        for user_id in {task.assigned_to_id, task.created_by_id}
+    ])
+
+
+def publish_tasks(recipients, event_type):
+    """Сводное событие: recipients — словарь пользователь -> идентификаторы задач"""
+    _publish([
+        (user_id, event_type, task_id, None)
+        for user_id, task_ids in recipients.items() for task_id in task_ids
+    ])
+
+
+def publish_changes(user_ids):
+    """Сообщает соединениям пользователей, что их задачи изменились"""
+    _publish(changed=[user_id for user_id in user_ids if user_id])
+
+
+def publish_list_changes(pairs):
+    """Изменения задач для подписчиков списков: pairs — пары (список, задача)"""
+    _publish(list_changes=[(task_list_id, task_id) for task_list_id, task_id in pairs if task_list_id])
+
+
+async def _asend(messages):
+    channel_layer = get_channel_layer()
+    results = await asyncio.gather(
+        *[channel_layer.group_send(group, message) for group, message in messages],
+        return_exceptions=True,
+    )
+    for (group, _), result in zip(messages, results):
+        if isinstance(result, Exception):
+            logger.error(f"Error sending event to {group}: {result}")
+    sent_at = time.time()
+    await arecord_latency('dispatch', [sent_at - message['enqueued_at'] for _, message in messages])
+
+
+def get_offline_users(batch):
+    """Получатели пакета без живых WebSocket-соединений (пусто, если реестр выключен)"""
+    user_ids = batch.get_user_ids()
+    online = presence.get_online_users(user_ids) if user_ids else None
+    return set() if online is None else user_ids - online
+
+
+def divert_offline(batch, offline):
+    """
+    Уведомления отключённых пользователей отправляются в Telegram, если это
+    включено (REALTIME_OFFLINE_TELEGRAM) и чат привязан; остальные пропускаются.
+    """
+    from notifications.tasks import send_telegram_notification
+    from .models import UserProfile
+
+    texts = {}
+    for user_id, message in batch.get_user_messages():
+        if user_id in offline and message['type'] == 'task_notification':
+            texts.setdefault(user_id, []).append(message['message'])
+    diverted = 0
+    if texts and getattr(settings, 'REALTIME_OFFLINE_TELEGRAM', False):
+        chat_ids = UserProfile.objects.filter(
+            user_id__in=texts, telegram_chat_id__isnull=False
+        ).values_list('user_id', 'telegram_chat_id')
+        for user_id, chat_id in chat_ids:
+            send_telegram_notification.delay(chat_id, '\n'.join(texts[user_id]))
+            diverted += 1
+    _incr('realtime_events:offline:skipped', len(offline) - diverted)
+    _incr('realtime_events:offline:diverted', diverted)
+
+
+def dispatch(batch):
+    """Отправляет пакет в слой каналов одним переходом в асинхронный код"""
+    try:
+        offline = get_offline_users(batch)
+        if offline:
+            divert_offline(batch, offline)
+        messages = batch.get_messages(offline) + batch.get_list_messages()
+        if not messages:
+            return
+        async_to_sync(_asend)(messages)
+    except Exception:
+        logger.exception('Error dispatching realtime events')
+
+
+def _bucket(seconds):
+    milliseconds = max(seconds, 0) * 1000
+    for bound in LATENCY_BUCKETS:
+        if milliseconds <= bound:
+            return str(bound)
+    return 'inf'
+
+
+def _incr(key, delta=1):
+    if delta and not cache.add(key, delta, STATS_TIMEOUT):
+        try:
+            cache.incr(key, delta)
+        except ValueError:
+            cache.set(key, delta, STATS_TIMEOUT)
+
+
+async def _aincr(key, delta=1):
+    if not await cache.aadd(key, delta, STATS_TIMEOUT):
+        try:
+            await cache.aincr(key, delta)
+        except ValueError:
+            await cache.aset(key, delta, STATS_TIMEOUT)
+
+
+class _LatencyCounters:
+    """Счётчики гистограмм задержек процесса, ещё не сброшенные в кэш"""
+
+    def __init__(self):
+        self.counts = Counter()
+        self.lock = threading.Lock()
+        self.flushed_at = time.monotonic()
+
+    def add(self, stage, latencies):
+        with self.lock:
+            for seconds in latencies:
+                self.counts[f'realtime_events:latency:{stage}:{_bucket(seconds)}'] += 1
+            self.counts[f'realtime_events:latency:{stage}:sum_ms'] += int(
+                sum(max(seconds, 0) for seconds in latencies) * 1000
+            )
+
+    def take(self, force=False):
+        """Накопленные счётчики, если пора сбросить их в кэш (или force), иначе пусто"""
+        with self.lock:
+            now = time.monotonic()
+            if not force and now - self.flushed_at < LATENCY_FLUSH_INTERVAL:
+                return {}
+            self.flushed_at = now
+            counts = {key: count for key, count in self.counts.items() if count}
+            self.counts.clear()
+            return counts
+
+
+_latency = _LatencyCounters()
+
+
+async def arecord_latency(stage, latencies):
+    """Учитывает задержки событий (в секундах) на этапе stage: dispatch или delivery"""
+    _latency.add(stage, latencies)
+    for key, count in _latency.take().items():
+        await _aincr(key, count)
+
+
+def flush_latency():
+    """Сбрасывает в кэш задержки, накопленные процессом"""
+    for key, count in _latency.take(force=True).items():
+        _incr(key, count)
+
+
+def get_stats():
+    """
+    Гистограммы задержек по этапам (количество, среднее и корзины в мс) и
+    число получателей без соединений: пропущенных и переведённых в Telegram.
+    Задержки других процессов видны с опозданием до LATENCY_FLUSH_INTERVAL.
+    """
+    flush_latency()
+    bounds = [str(bound) for bound in LATENCY_BUCKETS] + ['inf']
+    offline_keys = ['realtime_events:offline:skipped', 'realtime_events:offline:diverted']
+    keys = [
+        f'realtime_events:latency:{stage}:{name}'
+        for stage in LATENCY_STAGES for name in bounds + ['sum_ms']
+    ] + offline_keys
+    values = cache.get_many(keys)
+    stats = {}
+    for stage in LATENCY_STAGES:
+        buckets = {bound: values.get(f'realtime_events:latency:{stage}:{bound}', 0) for bound in bounds}
+        count = sum(buckets.values())
+        total = values.get(f'realtime_events:latency:{stage}:sum_ms', 0)
+        stats[stage] = {
+            'count': count,
+            'mean_ms': round(total / count, 2) if count else None,
+            'buckets_ms': buckets,
+        }
+    stats['offline'] = {key.rsplit(':', 1)[1]: values.get(key, 0) for key in offline_keys}
+    return stats
@@ -0,0 +1,42 @@
+"""
+Fast JSON encoding and decoding.
+
+Использует orjson, если он установлен, иначе — стандартный json. В обоих
+случаях datetime, date, Decimal, UUID и ленивые строки сериализуются так же,
+как в DRF (через rest_framework.utils.encoders.JSONEncoder).
+"""
+import json
+
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Ошибки разбора обеих реализаций наследуются от ValueError
+JSONDecodeError = ValueError
+
+_encoder = JSONEncoder()
+
+if orjson is not None:
+    OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+    def dumps(data):
+        """Сериализует data в байты UTF-8"""
+        return orjson.dumps(data, default=_encoder.default, option=OPTIONS)
+
+    def loads(data):
+        return orjson.loads(data)
+else:
+    def dumps(data):
+        """Сериализует data в байты UTF-8"""
+        return json.dumps(data, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':')).encode()
+
+    def loads(data):
+        return json.loads(data)
+
+
+def dumps_str(data):
+    """Сериализует data в строку — для текстовых кадров WebSocket"""
+    return dumps(data).decode()
@@ -0,0 +1,59 @@
+"""
+Filter backends for task management API.
+"""
+from datetime import datetime
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from .models import Task
+
+
+def parse_choice(request, name, choices):
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    allowed = [choice for choice, _ in choices]
+    if value not in allowed:
+        raise ValidationError({name: [f"Допустимые значения: {', '.join(allowed)}"]})
+    return value
+
+
+def parse_moment(request, name):
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    try:
+        moment = parse_date(value) or parse_datetime(value)
+    except ValueError:
+        moment = None
+    if moment is None:
+        raise ValidationError({name: ['Ожидается дата или дата и время в формате ISO 8601']})
+    if isinstance(moment, datetime) and timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+class TaskFilterBackend(BaseFilterBackend):
+    """
+    Фильтры задач: ?status=, ?priority=, ?due_before=, ?due_after=
+    """
+    
+    def filter_queryset(self, request, queryset, view):
+        filters = {}
+        status = parse_choice(request, 'status', Task.STATUS_CHOICES)
+        if status:
+            filters['status'] = status
+        priority = parse_choice(request, 'priority', Task.PRIORITY_CHOICES)
+        if priority:
+            filters['priority'] = priority
+        for name, lookup in (('due_before', 'lte'), ('due_after', 'gte')):
+            moment = parse_moment(request, name)
+            if moment is None:
+                continue
+            # Для даты без времени сравниваем только дату срока
+            field = 'due_date' if isinstance(moment, datetime) else 'due_date__date'
+            filters[f'{field}__{lookup}'] = moment
+        return queryset.filter(**filters) if filters else queryset
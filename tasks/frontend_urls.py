@@ -2,7 +2,7 @@
 Frontend URLs for tasks app.
 """
 from django.urls import path
-from . import views
+from . import frontend_views as views
 
 urlpatterns = [
     path('', views.index, name='index'),
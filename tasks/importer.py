@@ -0,0 +1,249 @@
+"""
+Bulk import of tasks from CSV or NDJSON.
+
+Строки обрабатываются пакетами: имена пользователей и списков задач всего
+пакета разрешаются двумя запросами, проверка строк выполняется без обращений
+к базе, а задачи вставляются одним bulk_create. Каждый пакет фиксируется в
+отдельной транзакции, ошибочные строки пропускаются и попадают в отчёт.
+"""
+import codecs
+import csv
+from collections import defaultdict
+from datetime import datetime, time
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Task, TaskList, UserTaskStats
+from . import search, versions, fastjson
+
+IMPORT_BATCH_SIZE = 5000
+IMPORT_FORMATS = ('csv', 'ndjson')
+# Сколько ошибок строк хранить в итоговом отчёте
+MAX_REPORTED_ERRORS = 1000
+
+TITLE_MAX_LENGTH = Task._meta.get_field('title').max_length
+STATUSES = {value for value, _ in Task.STATUS_CHOICES}
+PRIORITIES = {value for value, _ in Task.PRIORITY_CHOICES}
+
+
+def read_rows(lines, import_format):
+    """
+    Итератор строк-словарей из итерируемого набора байтовых строк.
+    Для CSV первая строка — заголовок с именами колонок.
+    """
+    text = codecs.iterdecode(lines, 'utf-8-sig')
+    if import_format == 'csv':
+        yield from csv.DictReader(text)
+        return
+    for line in text:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = fastjson.loads(line)
+        except fastjson.JSONDecodeError:
+            row = None
+        yield row if isinstance(row, dict) else {'__invalid__': line}
+
+
+def _parse_due_date(value):
+    if isinstance(value, str):
+        value = value.strip()
+    if not value:
+        return None
+    try:
+        moment = parse_datetime(value)
+        if moment is None:
+            day = parse_date(value)
+            moment = datetime.combine(day, time.max) if day else None
+    except (TypeError, ValueError):
+        moment = None
+    if moment is None:
+        raise ValueError('Ожидается дата или дата и время в формате ISO 8601')
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+class TaskImporter:
+    """
+    Импорт задач от имени пользователя.
+
+    Колонки: title, description, task_list (название списка пользователя),
+    assigned_to (имя пользователя, по умолчанию — импортирующий), priority,
+    status, due_date. progress(processed, created, errors) вызывается после
+    каждого пакета.
+    """
+
+    def __init__(self, user, batch_size=IMPORT_BATCH_SIZE, create_missing_lists=False, progress=None):
+        self.user = user
+        self.batch_size = batch_size
+        self.create_missing_lists = create_missing_lists
+        self.progress = progress
+        self.processed = 0
+        self.created = 0
+        self.error_count = 0
+        self.errors = []
+
+    def run(self, rows):
+        """Импортирует все строки и возвращает итоговый отчёт"""
+        for _ in self.iter_batches(rows):
+            pass
+        return self.get_report()
+
+    def iter_batches(self, rows):
+        """Импортирует строки пакетами, возвращая после каждого ошибки этого пакета"""
+        batch = []
+        for row in rows:
+            batch.append((self.processed + len(batch) + 1, row))
+            if len(batch) >= self.batch_size:
+                yield self._import_batch(batch)
+                batch = []
+        if batch:
+            yield self._import_batch(batch)
+
+    def iter_progress(self, rows):
+        """NDJSON-строки хода импорта: по строке на пакет и итоговая"""
+        for errors in self.iter_batches(rows):
+            yield fastjson.dumps({
+                'processed': self.processed,
+                'created': self.created,
+                'failed': self.error_count,
+                'errors': errors,
+            }) + b'\n'
+        report = self.get_report()
+        del report['errors']
+        yield fastjson.dumps(dict(report, done=True)) + b'\n'
+
+    async def aiter_progress(self, rows):
+        """
+        Асинхронный вариант iter_progress для потокового ответа под ASGI:
+        каждый пакет импортируется в потоке, а строка хода отдаётся сразу.
+        """
+        lines = self.iter_progress(rows)
+        next_line = sync_to_async(next, thread_sensitive=True)
+        while True:
+            line = await next_line(lines, None)
+            if line is None:
+                return
+            yield line
+
+    def get_report(self):
+        return {
+            'processed': self.processed,
+            'created': self.created,
+            'failed': self.error_count,
+            'errors': self.errors,
+        }
+
+    def _import_batch(self, batch):
+        users, task_lists = self._resolve(batch)
+        tasks, errors = [], []
+        for line, row in batch:
+            task, row_errors = self._build_task(row, users, task_lists)
+            if row_errors:
+                errors.append({'row': line, 'errors': row_errors})
+            else:
+                tasks.append(task)
+
+        if tasks:
+            with transaction.atomic():
+                Task.objects.bulk_create(tasks, batch_size=self.batch_size)
+                # bulk_create не вызывает Task.save и сигналы: счётчики списков и
+                # пользователей, поисковые документы и версии обновляем сами, по разу на пакет
+                TaskList.recalculate_counters({task.task_list_id for task in tasks})
+                search.update_search_documents([task.id for task in tasks])
+                UserTaskStats.recalculate({task.assigned_to_id for task in tasks})
+                recipients = {task.assigned_to_id for task in tasks}
+                recipients.add(self.user.id)
+                versions.bump_version(versions.TASKS, recipients)
+
+        self.processed += len(batch)
+        self.created += len(tasks)
+        self.error_count += len(errors)
+        self.errors.extend(errors[:MAX_REPORTED_ERRORS - len(self.errors)])
+        if self.progress:
+            self.progress(self.processed, self.created, self.error_count)
+        return errors
+
+    def _resolve(self, batch):
+        """Загружает пользователей и списки задач, упомянутые в пакете"""
+        usernames, list_names = set(), set()
+        for _, row in batch:
+            if isinstance(row.get('assigned_to'), str) and row['assigned_to'].strip():
+                usernames.add(row['assigned_to'].strip())
+            if isinstance(row.get('task_list'), str) and row['task_list'].strip():
+                list_names.add(row['task_list'].strip())
+
+        users = dict(User.objects.filter(username__in=usernames).values_list('username', 'id'))
+        task_lists = {}
+        # При одинаковых названиях берём самый ранний список
+        for task_list_id, name in TaskList.objects.filter(
+            created_by=self.user, name__in=list_names
+        ).order_by('-id').values_list('id', 'name'):
+            task_lists[name] = task_list_id
+
+        missing = list_names - task_lists.keys()
+        if missing and self.create_missing_lists:
+            max_length = TaskList._meta.get_field('name').max_length
+            created = TaskList.objects.bulk_create([
+                TaskList(name=name, created_by=self.user)
+                for name in sorted(missing) if len(name) <= max_length
+            ])
+            task_lists.update({task_list.name: task_list.id for task_list in created})
+            versions.bump_version(versions.TASK_LISTS, [self.user.id])
+        return users, task_lists
+
+    def _build_task(self, row, users, task_lists):
+        """Проверяет строку и возвращает (задача, ошибки)"""
+        if '__invalid__' in row:
+            return None, {'non_field_errors': ['Строка не является JSON-объектом']}
+
+        errors = defaultdict(list)
+        title = str(row.get('title') or '').strip()
+        if not title:
+            errors['title'].append('Обязательное поле.')
+        elif len(title) > TITLE_MAX_LENGTH:
+            errors['title'].append(f'Не более {TITLE_MAX_LENGTH} символов.')
+
+        list_name = str(row.get('task_list') or '').strip()
+        task_list_id = task_lists.get(list_name)
+        if not list_name:
+            errors['task_list'].append('Обязательное поле.')
+        elif task_list_id is None:
+            errors['task_list'].append(f'Список задач «{list_name}» не найден.')
+
+        username = str(row.get('assigned_to') or '').strip()
+        assigned_to_id = users.get(username) if username else self.user.id
+        if assigned_to_id is None:
+            errors['assigned_to'].append(f'Пользователь «{username}» не найден.')
+
+        priority = str(row.get('priority') or 'medium').strip()
+        if priority not in PRIORITIES:
+            errors['priority'].append(f"Допустимые значения: {', '.join(sorted(PRIORITIES))}")
+        task_status = str(row.get('status') or 'pending').strip()
+        if task_status not in STATUSES:
+            errors['status'].append(f"Допустимые значения: {', '.join(sorted(STATUSES))}")
+
+        try:
+            due_date = _parse_due_date(row.get('due_date'))
+        except ValueError as exc:
+            errors['due_date'].append(str(exc))
+
+        if errors:
+            return None, dict(errors)
+        return Task(
+            title=title,
+            description=str(row.get('description') or ''),
+            task_list_id=task_list_id,
+            assigned_to_id=assigned_to_id,
+            created_by=self.user,
+            priority=priority,
+            status=task_status,
+            due_date=due_date,
+            completed_at=timezone.now() if task_status == 'completed' else None,
+        ), None
@@ -0,0 +1,25 @@
+"""
+Management command that moves long-finished tasks to the archive tables.
+"""
+from django.core.management.base import BaseCommand
+
+from tasks import archive
+
+
+class Command(BaseCommand):
+    help = 'Переносит в архив задачи, завершённые или отменённые больше N дней назад'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=None,
+            help='Сколько дней назад завершены задачи (по умолчанию TASKS_ARCHIVE_AFTER_DAYS)'
+        )
+        parser.add_argument('--batch-size', type=int, default=archive.ARCHIVE_BATCH_SIZE, help='Размер пакета задач')
+
+    def handle(self, *args, **options):
+        total = archive.archive_tasks(
+            days=options['days'],
+            batch_size=options['batch_size'],
+            progress=lambda archived: self.stdout.write(f'Перенесено задач: {archived}'),
+        )
+        self.stdout.write(self.style.SUCCESS(f'Архивация завершена, задач: {total}'))
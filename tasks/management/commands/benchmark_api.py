@@ -0,0 +1,445 @@
+"""
+Management command that benchmarks REST API actions and enforces query budgets.
+"""
+import gc
+import json
+import math
+import random
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings, setup_test_environment
+from django.utils import timezone
+
+from notifications.models import Notification
+from notifications.urls import router as notifications_router
+from tasks.models import Task, TaskList, TaskComment
+from tasks.urls import router as tasks_router
+
+# Максимально допустимое количество SQL-запросов на действие, включая
+# загрузку сессии и пользователя
+QUERY_BUDGETS = {
+    'tasks.list': 4,
+    'tasks.list?expand=latest_comments': 5,
+    'tasks.retrieve': 4,
+    'tasks.create': 13,
+    'tasks.update': 12,
+    'tasks.partial_update': 14,
+    'tasks.destroy': 16,
+    'tasks.mark_completed': 12,
+    'tasks.add_comment': 10,
+    'tasks.comments': 5,
+    'tasks.my_tasks': 4,
+    'tasks.overdue_tasks': 4,
+    'tasks.bulk_create': 13,
+    'tasks.bulk_update': 12,
+    'tasks.bulk_complete': 13,
+    'tasks.sync': 5,
+    'tasks.search': 5,
+    'tasks.facets': 3,
+    'tasks.stats': 3,
+    'tasks.export': 3,
+    'tasks.export?export_format=csv': 3,
+    'tasks.import_tasks': 13,
+    'tasks.cache_stats': 2,
+    'tasks.realtime_stats': 2,
+    'tasks.presence_stats': 2,
+    'task_lists.list': 4,
+    'task_lists.retrieve': 3,
+    'task_lists.create': 6,
+    'task_lists.update': 6,
+    'task_lists.partial_update': 6,
+    'task_lists.destroy': 10,
+    'notifications.list': 4,
+    'notifications.retrieve': 3,
+    'notifications.create': 5,
+    'notifications.update': 6,
+    'notifications.partial_update': 5,
+    'notifications.destroy': 8,
+    'notifications.mark_read': 6,
+    'notifications.mark_all_read': 3,
+    'notifications.unread_count': 3,
+    'notifications.unread': 4,
+    'notifications.sync': 5,
+    'notifications.export': 3,
+    'users.list': 4,
+    'users.retrieve': 3,
+}
+
+# Абсолютный предел p95 времени ответа любого действия, мс
+P95_BUDGET_MS = 500
+# Допустимый рост p95 относительно базового уровня: доля и запас в мс на
+# шум коротких замеров
+P95_TOLERANCE = 1.0
+P95_TOLERANCE_MS = 10
+
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / 'benchmarks' / 'api_baseline.json'
+
+# Префикс имён действий для basename маршрутов роутеров API
+ROUTE_PREFIXES = {
+    'task': 'tasks',
+    'tasklist': 'task_lists',
+    'notification': 'notifications',
+    'user': 'users',
+}
+# Маршруты роутеров, не входящие в бенчмарк: basename -> причина
+UNBENCHMARKED_ROUTES = {
+    'userprofile': 'профиль читается и меняется только со страницы настроек',
+}
+
+
+class Multipart(dict):
+    """Тело запроса, отправляемое как multipart/form-data"""
+
+
+class Command(BaseCommand):
+    """
+    Создаёт тестовую базу с реалистичными данными и прогоняет через тестовый
+    клиент все действия, зарегистрированные в роутерах API (кроме
+    UNBENCHMARKED_ROUTES): действие без замера или без бюджета запросов
+    считается ошибкой. Для каждого действия фиксирует количество запросов,
+    p50/p95/p99 времени ответа и размер ответа, сравнивает их с сохранённым
+    базовым уровнем и завершается с ошибкой при превышении бюджета запросов,
+    при p95 больше P95_BUDGET_MS или больше базового уровня с допуском.
+    Медленные по p95 действия перед ошибкой замеряются повторно: кратковременная
+    нагрузка на машину не должна считаться регрессией.
+    """
+    help = 'Бенчмарк REST API с контролем бюджета SQL-запросов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=40, help='Повторов каждого действия')
+        parser.add_argument('--tasks', type=int, default=2000, help='Количество задач')
+        parser.add_argument('--baseline', default=str(DEFAULT_BASELINE), help='Файл базового уровня')
+        parser.add_argument('--update-baseline', action='store_true', help='Сохранить результаты как базовый уровень')
+        parser.add_argument(
+            '--tolerance', type=float, default=P95_TOLERANCE,
+            help='Допустимый рост p95 относительно базового уровня (доля)',
+        )
+        parser.add_argument('--warm', action='store_true', help='Не очищать кэш между запросами')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        local_settings = override_settings(
+            CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+            CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+            # Запросы считаются по соединению основной базы
+            DATABASE_REPLICAS=[],
+        )
+        baseline_path = Path(options['baseline'])
+        baseline = json.loads(baseline_path.read_text()) if baseline_path.exists() else {}
+        if not baseline:
+            self.stdout.write(self.style.WARNING(f'Базовый уровень {baseline_path} не найден'))
+        # Новый базовый уровень принимает текущие времена
+        baseline_checked = {} if options['update_baseline'] else baseline
+
+        local_settings.enable()
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            user = self.seed(options['tasks'])
+            self.check_coverage(user)
+            client = Client()
+            client.force_login(user)
+            results = self.run_benchmarks(client, user, options['iterations'], options['warm'])
+            slow = [
+                name for name, result in results.items()
+                if self.is_slow(result, baseline_checked.get(name), options['tolerance'])
+            ]
+            if slow:
+                self.stdout.write(f"Повторный замер: {', '.join(slow)}")
+                retry = self.run_benchmarks(client, user, options['iterations'], options['warm'], slow)
+                for name, result in retry.items():
+                    if result['p95_ms'] < results[name]['p95_ms']:
+                        results[name] = result
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            local_settings.disable()
+
+        self.report(results, baseline, options['tolerance'])
+
+        if options['update_baseline']:
+            baseline_path.parent.mkdir(parents=True, exist_ok=True)
+            baseline_path.write_text(json.dumps(results, indent=2, sort_keys=True) + '\n')
+            self.stdout.write(f'Базовый уровень сохранён в {baseline_path}')
+
+        errors = []
+        over_budget = [
+            name for name, result in results.items()
+            if result['queries'] > QUERY_BUDGETS.get(name, 0)
+        ]
+        if over_budget:
+            errors.append(f"превышен бюджет запросов: {', '.join(over_budget)}")
+        too_slow = [name for name, result in results.items() if result['p95_ms'] > P95_BUDGET_MS]
+        if too_slow:
+            errors.append(f"p95 больше {P95_BUDGET_MS} мс: {', '.join(too_slow)}")
+        regressions = [
+            name for name, result in results.items()
+            if self.is_regression(result, baseline_checked.get(name), options['tolerance'])
+        ]
+        if regressions:
+            errors.append(f"p95 вырос относительно базового уровня: {', '.join(regressions)}")
+        if errors:
+            raise CommandError('; '.join(errors))
+
+    def get_router_actions(self):
+        """Имена всех действий, зарегистрированных в роутерах API"""
+        names = set()
+        for router in (tasks_router, notifications_router):
+            for _, viewset, basename in router.registry:
+                if basename in UNBENCHMARKED_ROUTES:
+                    continue
+                if basename not in ROUTE_PREFIXES:
+                    raise CommandError(f'Маршрут {basename} не описан в ROUTE_PREFIXES')
+                for route in router.get_routes(viewset):
+                    names.update(
+                        f'{ROUTE_PREFIXES[basename]}.{action}'
+                        for action in route.mapping.values() if hasattr(viewset, action)
+                    )
+        return names
+
+    def check_coverage(self, user):
+        """Каждое действие роутеров замеряется и имеет бюджет запросов"""
+        endpoints = self.get_endpoints(user)
+        errors = []
+        missing = self.get_router_actions() - {name.split('?')[0] for name in endpoints}
+        if missing:
+            errors.append(f"нет замера действий: {', '.join(sorted(missing))}")
+        unbudgeted = [name for name in endpoints if name not in QUERY_BUDGETS]
+        if unbudgeted:
+            errors.append(f"нет бюджета запросов: {', '.join(unbudgeted)}")
+        if errors:
+            raise CommandError('; '.join(errors))
+
+    def is_regression(self, result, previous, tolerance):
+        """p95 действия больше базового уровня с допуском (без уровня — не регрессия)"""
+        if not previous or 'p95_ms' not in previous:
+            return False
+        return result['p95_ms'] > previous['p95_ms'] * (1 + tolerance) + P95_TOLERANCE_MS
+
+    def is_slow(self, result, previous, tolerance):
+        return result['p95_ms'] > P95_BUDGET_MS or self.is_regression(result, previous, tolerance)
+
+    def seed(self, tasks_count):
+        """Заполняет базу данными, похожими на рабочие"""
+        rng = random.Random(42)
+        now = timezone.now()
+        User.objects.bulk_create([User(username=f'user{i}') for i in range(20)])
+        users = list(User.objects.order_by('id'))
+        user = users[0]
+        # Действия со статистикой сервиса доступны только персоналу
+        User.objects.filter(pk=user.pk).update(is_staff=True)
+        TaskList.objects.bulk_create([
+            TaskList(name=f'list{i}', created_by=user if i % 2 else rng.choice(users)) for i in range(40)
+        ])
+        task_lists = list(TaskList.objects.order_by('id'))
+        statuses = [choice for choice, _ in Task.STATUS_CHOICES]
+        priorities = [choice for choice, _ in Task.PRIORITY_CHOICES]
+        Task.objects.bulk_create([
+            Task(
+                title=f'Задача {i}',
+                description=f'Описание задачи {i} ' * rng.randint(1, 20),
+                task_list=rng.choice(task_lists),
+                assigned_to=user if rng.random() < 0.3 else rng.choice(users),
+                created_by=user if rng.random() < 0.2 else rng.choice(users),
+                status=rng.choice(statuses),
+                priority=rng.choice(priorities),
+                due_date=now + timedelta(days=rng.randint(-30, 30)) if rng.random() < 0.7 else None,
+            )
+            for i in range(tasks_count)
+        ], batch_size=1000)
+        TaskList.recalculate_counters()
+        tasks = list(Task.objects.values_list('id', flat=True))
+        TaskComment.objects.bulk_create([
+            TaskComment(task_id=rng.choice(tasks), author=rng.choice(users), content=f'Комментарий {i}')
+            for i in range(tasks_count * 3)
+        ], batch_size=1000)
+        Notification.objects.bulk_create([
+            Notification(
+                user=user if rng.random() < 0.3 else rng.choice(users),
+                notification_type='task_updated',
+                title=f'Уведомление {i}',
+                message='Задача обновлена',
+                is_read=rng.random() < 0.7,
+                task_id=rng.choice(tasks),
+            )
+            for i in range(tasks_count)
+        ], batch_size=1000)
+        return user
+
+    def get_endpoints(self, user):
+        """
+        Описание действий: имя -> функция, возвращающая (метод, путь, тело).
+        Функция вызывается перед каждым замером и может подготовить данные.
+        """
+        task_list = TaskList.objects.filter(created_by=user).first()
+        own_task = Task.objects.filter(assigned_to=user).order_by('-id').first()
+        notification = Notification.objects.filter(user=user).first()
+        other_user = User.objects.exclude(pk=user.pk).first()
+
+        def new_task():
+            return Task.objects.create(title='Тест', task_list=task_list, assigned_to=user, created_by=user)
+
+        def new_task_list():
+            return TaskList.objects.create(name='Тест', created_by=user)
+
+        def new_notification():
+            return Notification.objects.create(
+                user=user, notification_type='task_updated', title='Тест', message='Тест', task=own_task
+            )
+
+        def import_file():
+            rows = ''.join(
+                f'Импорт {i},{task_list.name},{other_user.username},high,pending\n' for i in range(50)
+            )
+            content = f'title,task_list,assigned_to,priority,status\n{rows}'.encode()
+            return Multipart(file=SimpleUploadedFile('tasks.csv', content, content_type='text/csv'))
+
+        def task_ids():
+            return list(Task.objects.filter(assigned_to=user).values_list('id', flat=True)[:50])
+
+        task_payload = {'title': 'Новая', 'task_list': task_list.id, 'assigned_to': other_user.id}
+        task_update_payload = {
+            'title': 'Изменена', 'description': '', 'assigned_to': other_user.id,
+            'priority': 'high', 'status': 'in_progress', 'due_date': None,
+        }
+        notification_payload = {
+            'notification_type': 'task_updated', 'title': 'Изменено', 'message': 'Тест',
+            'is_read': True, 'task': own_task.id,
+        }
+        return {
+            'tasks.list': lambda: ('get', '/api/tasks/', None),
+            'tasks.list?expand=latest_comments': lambda: ('get', '/api/tasks/?expand=latest_comments', None),
+            'tasks.retrieve': lambda: ('get', f'/api/tasks/{own_task.id}/', None),
+            'tasks.create': lambda: ('post', '/api/tasks/', task_payload),
+            'tasks.update': lambda: ('put', f'/api/tasks/{new_task().id}/', task_update_payload),
+            'tasks.partial_update': lambda: (
+                'patch', f'/api/tasks/{new_task().id}/', {'status': 'in_progress', 'assigned_to': other_user.id}
+            ),
+            'tasks.destroy': lambda: ('delete', f'/api/tasks/{new_task().id}/', None),
+            'tasks.mark_completed': lambda: ('post', f'/api/tasks/{new_task().id}/mark_completed/', None),
+            'tasks.add_comment': lambda: ('post', f'/api/tasks/{own_task.id}/add_comment/', {'content': 'Тест'}),
+            'tasks.comments': lambda: ('get', f'/api/tasks/{own_task.id}/comments/', None),
+            'tasks.my_tasks': lambda: ('get', '/api/tasks/my_tasks/', None),
+            'tasks.overdue_tasks': lambda: ('get', '/api/tasks/overdue_tasks/', None),
+            'tasks.bulk_create': lambda: ('post', '/api/tasks/bulk_create/', [task_payload] * 50),
+            'tasks.bulk_update': lambda: (
+                'post', '/api/tasks/bulk_update/', {'ids': task_ids(), 'changes': {'priority': 'high'}}
+            ),
+            'tasks.bulk_complete': lambda: ('post', '/api/tasks/bulk_complete/', {'ids': task_ids()}),
+            'tasks.sync': lambda: ('get', '/api/tasks/sync/', None),
+            'tasks.search': lambda: ('get', '/api/tasks/search/?q=задачи', None),
+            'tasks.facets': lambda: ('get', '/api/tasks/facets/', None),
+            'tasks.stats': lambda: ('get', '/api/tasks/stats/', None),
+            'tasks.export': lambda: ('get', '/api/tasks/export/', None),
+            'tasks.export?export_format=csv': lambda: ('get', '/api/tasks/export/?export_format=csv', None),
+            'tasks.import_tasks': lambda: ('post', '/api/tasks/import/', import_file()),
+            'tasks.cache_stats': lambda: ('get', '/api/tasks/cache_stats/', None),
+            'tasks.realtime_stats': lambda: ('get', '/api/tasks/realtime_stats/', None),
+            'tasks.presence_stats': lambda: ('get', '/api/tasks/presence_stats/', None),
+            'task_lists.list': lambda: ('get', '/api/task-lists/', None),
+            'task_lists.retrieve': lambda: ('get', f'/api/task-lists/{task_list.id}/', None),
+            'task_lists.create': lambda: ('post', '/api/task-lists/', {'name': 'Новый'}),
+            'task_lists.update': lambda: (
+                'put', f'/api/task-lists/{task_list.id}/', {'name': 'Изменён', 'description': ''}
+            ),
+            'task_lists.partial_update': lambda: ('patch', f'/api/task-lists/{task_list.id}/', {'name': 'Изменён'}),
+            'task_lists.destroy': lambda: ('delete', f'/api/task-lists/{new_task_list().id}/', None),
+            'notifications.list': lambda: ('get', '/api/notifications/', None),
+            'notifications.retrieve': lambda: ('get', f'/api/notifications/{notification.id}/', None),
+            'notifications.create': lambda: ('post', '/api/notifications/', notification_payload),
+            'notifications.update': lambda: (
+                'put', f'/api/notifications/{notification.id}/', notification_payload
+            ),
+            'notifications.partial_update': lambda: (
+                'patch', f'/api/notifications/{notification.id}/', {'is_read': True}
+            ),
+            'notifications.destroy': lambda: ('delete', f'/api/notifications/{new_notification().id}/', None),
+            'notifications.mark_read': lambda: ('post', f'/api/notifications/{notification.id}/mark_read/', None),
+            'notifications.mark_all_read': lambda: ('post', '/api/notifications/mark_all_read/', None),
+            'notifications.unread_count': lambda: ('get', '/api/notifications/unread_count/', None),
+            'notifications.unread': lambda: ('get', '/api/notifications/unread/', None),
+            'notifications.sync': lambda: ('get', '/api/notifications/sync/', None),
+            'notifications.export': lambda: ('get', '/api/notifications/export/', None),
+            'users.list': lambda: ('get', '/api/users/', None),
+            'users.retrieve': lambda: ('get', f'/api/users/{other_user.id}/', None),
+        }
+
+    def run_benchmarks(self, client, user, iterations, warm, names=None):
+        results = {}
+        for name, prepare in self.get_endpoints(user).items():
+            if names is not None and name not in names:
+                continue
+            queries, timings, sizes = [], [], []
+            for _ in range(iterations):
+                if not warm:
+                    cache.clear()
+                method, path, data = prepare()
+                if isinstance(data, Multipart):
+                    kwargs = {'data': data}
+                elif data is not None:
+                    kwargs = {'data': json.dumps(data), 'content_type': 'application/json'}
+                else:
+                    kwargs = {}
+                # Журнал запросов ограничен 9000 записями: заполненный журнал
+                # не растёт, и CaptureQueriesContext насчитал бы 0 запросов
+                connection.queries_log.clear()
+                # Как в timeit: сборка мусора выполняется между замерами, а не внутри них
+                gc.disable()
+                try:
+                    with CaptureQueriesContext(connection) as captured:
+                        started = time.perf_counter()
+                        response = getattr(client, method)(path, **kwargs)
+                        # Потоковый ответ вычитываем целиком внутри замера
+                        if response.streaming:
+                            content = b''.join(response.streaming_content)
+                        else:
+                            content = response.content
+                        timings.append((time.perf_counter() - started) * 1000)
+                finally:
+                    gc.enable()
+                if response.status_code >= 400:
+                    raise CommandError(f'{name}: {method.upper()} {path} вернул {response.status_code}')
+                queries.append(len(captured))
+                sizes.append(len(content))
+            timings.sort()
+            results[name] = {
+                'queries': max(queries),
+                'p50_ms': self.percentile(timings, 0.5),
+                'p95_ms': self.percentile(timings, 0.95),
+                'p99_ms': self.percentile(timings, 0.99),
+                'bytes': max(sizes),
+            }
+        return results
+
+    def percentile(self, timings, fraction):
+        """Перцентиль отсортированных замеров (метод ближайшего ранга), мс"""
+        return round(timings[max(0, math.ceil(len(timings) * fraction) - 1)], 2)
+
+    def report(self, results, baseline, tolerance):
+        self.stdout.write(
+            f"{'действие':<32}{'запросы':>9}{'бюджет':>8}{'p50, мс':>10}{'p95, мс':>10}{'p99, мс':>10}{'байт':>10}"
+        )
+        for name, result in results.items():
+            budget = QUERY_BUDGETS.get(name, 0)
+            line = (
+                f"{name:<32}{result['queries']:>9}{budget:>8}"
+                f"{result['p50_ms']:>10}{result['p95_ms']:>10}{result['p99_ms']:>10}{result['bytes']:>10}"
+            )
+            previous = baseline.get(name)
+            if previous:
+                line += (
+                    f"  Δ запросы {result['queries'] - previous['queries']:+d},"
+                    f" p95 {result['p95_ms'] - previous.get('p95_ms', 0):+.2f} мс,"
+                    f" байт {result['bytes'] - previous['bytes']:+d}"
+                )
+            failed = result['queries'] > budget or self.is_slow(result, previous, tolerance)
+            style = self.style.ERROR if failed else (lambda text: text)
+            self.stdout.write(style(line))
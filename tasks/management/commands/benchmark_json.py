@@ -0,0 +1,92 @@
+"""
+Management command that compares JSON rendering and parsing throughput.
+"""
+import io
+import json
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from tasks import fastjson
+from tasks.parsers import FastJSONParser
+from tasks.renderers import FastJSONRenderer
+
+
+class Command(BaseCommand):
+    """
+    Генерирует списки задач в представлении TaskCompactSerializer и для
+    каждого размера сравнивает пропускную способность (МБ/с) стандартных
+    JSONRenderer/JSONParser DRF, FastJSONRenderer/FastJSONParser и
+    json.dumps/fastjson.dumps_str из WebSocket-консьюмера.
+    """
+    help = 'Бенчмарк JSON-рендеринга и разбора на больших списках задач'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='100,1000,10000', help='Размеры списков через запятую')
+        parser.add_argument('--iterations', type=int, default=20, help='Повторов каждого замера')
+
+    def handle(self, *args, **options):
+        backend = 'orjson' if fastjson.orjson is not None else 'json (orjson не установлен)'
+        self.stdout.write(f'Быстрый путь: {backend}')
+        self.stdout.write(f"{'операция':<28}{'задач':>8}{'байт':>12}{'stdlib, МБ/с':>15}{'fast, МБ/с':>13}{'ускорение':>11}")
+
+        for size in [int(value) for value in options['sizes'].split(',')]:
+            data = self.make_tasks(size)
+            body = JSONRenderer().render(data)
+            cases = [
+                ('render', lambda: JSONRenderer().render(data), lambda: FastJSONRenderer().render(data)),
+                (
+                    'parse',
+                    lambda: JSONParser().parse(io.BytesIO(body)),
+                    lambda: FastJSONParser().parse(io.BytesIO(body)),
+                ),
+                (
+                    'websocket dumps',
+                    lambda: json.dumps({'type': 'tasks_data', 'tasks': data}, default=str),
+                    lambda: fastjson.dumps_str({'type': 'tasks_data', 'tasks': data}),
+                ),
+            ]
+            for name, slow, fast in cases:
+                slow_rate = self.throughput(slow, len(body), options['iterations'])
+                fast_rate = self.throughput(fast, len(body), options['iterations'])
+                self.stdout.write(
+                    f'{name:<28}{size:>8}{len(body):>12}{slow_rate:>15.1f}{fast_rate:>13.1f}'
+                    f'{fast_rate / slow_rate:>10.1f}x'
+                )
+
+    def throughput(self, func, size, iterations):
+        """МБ/с по лучшему из iterations замеров"""
+        best = None
+        for _ in range(iterations):
+            started = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return size / best / 1024 / 1024
+
+    def make_tasks(self, count):
+        now = timezone.now()
+        return [
+            {
+                'id': i,
+                'title': f'Задача {i}',
+                'description': f'Описание задачи {i} ' * 5,
+                'task_list': {'id': i % 40, 'name': f'Список {i % 40}'},
+                'assigned_to': {'id': i % 20, 'username': f'user{i % 20}'},
+                'created_by': {'id': i % 7, 'username': f'user{i % 7}'},
+                'priority': 'medium',
+                'status': 'pending',
+                'due_date': now + timedelta(days=i % 30),
+                'created_at': now,
+                'updated_at': now,
+                'completed_at': None,
+                'is_overdue': i % 3 == 0,
+                'estimate': Decimal('1.50'),
+            }
+            for i in range(count)
+        ]
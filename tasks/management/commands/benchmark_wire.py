@@ -0,0 +1,112 @@
+"""
+Management command that compares WebSocket frame sizes and encode time.
+"""
+import time
+import zlib
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from tasks import wire
+
+
+class Command(BaseCommand):
+    """
+    Кодирует типичные сообщения TaskConsumer (уведомления, изменения,
+    снимки задач) протоколом JSON по умолчанию и подпротоколом MessagePack
+    и сравнивает размер кадра и время кодирования. Для MessagePack отдельно
+    показан размер без сжатия, чтобы был виден вклад коротких ключей и zlib.
+    """
+    help = 'Бенчмарк размеров и времени кодирования кадров WebSocket: JSON против MessagePack'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200, help='Повторов каждого замера')
+
+    def handle(self, *args, **options):
+        if wire.msgpack is None:
+            raise CommandError('msgpack не установлен')
+        json_codec, msgpack_codec = wire.JSONCodec(), wire.MsgpackCodec()
+        self.stdout.write(
+            f"{'сообщение':<26}{'JSON, байт':>12}{'msgpack':>10}{'+zlib':>10}{'экономия':>10}"
+            f"{'JSON, мкс':>11}{'msgpack, мкс':>14}"
+        )
+        for name, message in self.make_messages():
+            json_frame = json_codec.encode(message).encode()
+            msgpack_frame = msgpack_codec.encode(message)
+            uncompressed = len(msgpack_frame)
+            if msgpack_frame[0] == wire.FRAME_ZLIB:
+                uncompressed = len(zlib.decompress(msgpack_frame[1:])) + 1
+            json_time = self.best_time(lambda: json_codec.encode(message), options['iterations'])
+            msgpack_time = self.best_time(lambda: msgpack_codec.encode(message), options['iterations'])
+            self.stdout.write(
+                f'{name:<26}{len(json_frame):>12}{uncompressed:>10}{len(msgpack_frame):>10}'
+                f'{1 - len(msgpack_frame) / len(json_frame):>10.0%}'
+                f'{json_time * 1_000_000:>11.1f}{msgpack_time * 1_000_000:>14.1f}'
+            )
+            if msgpack_codec.decode(msgpack_frame) != json_codec.decode(json_frame.decode()):
+                raise CommandError(f'Сообщение {name} после MessagePack отличается от исходного')
+
+    def best_time(self, func, iterations):
+        """Лучшее время из iterations замеров, с"""
+        best = None
+        for _ in range(iterations):
+            started = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+
+    def make_tasks(self, count):
+        """Задачи в представлении events.serialize_task"""
+        now = timezone.now()
+        return [
+            {
+                'id': i,
+                'title': f'Задача {i}',
+                'description': f'Описание задачи {i} ' * 5,
+                'status': 'pending',
+                'priority': 'medium',
+                'due_date': (now + timedelta(days=i % 30)).isoformat(),
+                'created_at': now.isoformat(),
+                'is_overdue': i % 3 == 0,
+                'task_list': {'id': i % 40, 'name': f'Список {i % 40}'},
+                'created_by': {'id': i % 7, 'username': f'user{i % 7}'},
+            }
+            for i in range(count)
+        ]
+
+    def make_messages(self):
+        cursor = 'MTcwMDAwMDAwMDAwMDAwMDow'
+        return [
+            ('notification', {
+                'type': 'notification',
+                'event': 'task_updated',
+                'task_id': 42,
+                'task_title': 'Задача 42',
+                'message': 'Задача обновлена: Задача 42',
+            }),
+            ('bulk notification', {
+                'type': 'notification',
+                'event': 'task_completed',
+                'task_id': None,
+                'task_title': None,
+                'message': 'Выполнено задач: 50',
+                'task_ids': list(range(1000, 1050)),
+            }),
+            ('tasks_diff, 3 задачи', {
+                'type': 'tasks_diff',
+                'upserted': self.make_tasks(3),
+                'deleted': [7],
+                'cursor': cursor,
+                'has_more': False,
+            }),
+            ('task_list_update, 20', {
+                'type': 'task_list_update',
+                'task_list_id': 1,
+                'upserted': self.make_tasks(20),
+                'deleted': [],
+            }),
+            ('tasks_data, 50 задач', {'type': 'tasks_data', 'tasks': self.make_tasks(50), 'cursor': cursor}),
+            ('tasks_data, 500 задач', {'type': 'tasks_data', 'tasks': self.make_tasks(500), 'cursor': cursor}),
+        ]
@@ -0,0 +1,189 @@
+"""
+Management command that checks query plans of the hot Task/Notification queries.
+"""
+import random
+import re
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from notifications.models import Notification
+from tasks.models import Task, TaskList
+
+
+class Command(BaseCommand):
+    """
+    Создаёт тестовую базу, заполняет её данными, собирает статистику
+    (ANALYZE) и выполняет EXPLAIN для горячих запросов. Завершается с
+    ошибкой, если запрос использует последовательное сканирование таблицы
+    или в его плане нет ожидаемого индекса (EXPECTED_INDEXES).
+    """
+    help = 'Проверяет планы горячих запросов (EXPLAIN) на тестовых данных'
+
+    checked_tables = ['tasks_task', 'notifications_notification']
+
+    # Индексы, которые должны быть в плане запроса. Кортеж — допустимые
+    # варианты: ветки OR читаются через bitmap/multi-index, и планировщик
+    # вправе взять меньший индекс внешнего ключа (таблица, столбец)
+    EXPECTED_INDEXES = {
+        'TaskViewSet.list': [
+            ('task_assignee_created_idx', ('tasks_task', 'assigned_to_id')),
+            ('task_creator_created_idx', ('tasks_task', 'created_by_id')),
+        ],
+        'async_views.my_tasks': ['task_assignee_created_idx'],
+        'async_views.overdue_tasks': ['task_assignee_status_due_idx', 'task_creator_status_due_idx'],
+        'TaskConsumer.get_user_tasks': ['task_assignee_created_idx'],
+        'bot /tasks': ['task_assignee_created_idx'],
+        'bot /overdue': ['task_assignee_status_due_idx'],
+        'check_overdue_tasks': ['task_open_due_idx'],
+        'TaskViewSet.sync': ['task_assignee_updated_idx', 'task_creator_updated_idx'],
+        'NotificationViewSet.sync': ['notif_user_updated_idx'],
+        'async_views.notification_list': ['notif_user_created_idx'],
+        'NotificationViewSet.unread': ['notif_user_read_created_idx'],
+    }
+    # Запросы, план которых на SQLite не показателен (рабочая база — PostgreSQL,
+    # где они проверяются): SQLite не применяет частичный индекс, если условие
+    # совпадает лишь через параметры (status IN (?, ?)), а Django передаёт
+    # значения параметрами; фильтр is_read=False Django записывает как
+    # NOT is_read, что SQLite не использует для поиска по индексу
+    SQLITE_UNCHECKED = {
+        'check_overdue_tasks': 'частичный индекс с параметрами',
+        'NotificationViewSet.unread': 'условие NOT is_read',
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50, help='Количество пользователей')
+        parser.add_argument('--tasks', type=int, default=20000, help='Количество задач')
+        parser.add_argument('--notifications', type=int, default=20000, help='Количество уведомлений')
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            user = self.seed(options['users'], options['tasks'], options['notifications'])
+            failures = self.check_plans(user)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        if failures:
+            raise CommandError(f"Запросы без ожидаемых индексов: {', '.join(failures)}")
+        self.stdout.write(self.style.SUCCESS('Все горячие запросы используют ожидаемые индексы'))
+
+    def seed(self, users_count, tasks_count, notifications_count):
+        """Заполняет базу данными, похожими на рабочие"""
+        rng = random.Random(42)
+        now = timezone.now()
+        users = User.objects.bulk_create([User(username=f'user{i}') for i in range(users_count)])
+        users = list(User.objects.order_by('id'))
+        task_lists = TaskList.objects.bulk_create([
+            TaskList(name=f'list{i}', created_by=rng.choice(users)) for i in range(users_count * 2)
+        ])
+        task_lists = list(TaskList.objects.order_by('id'))
+        statuses = [choice for choice, _ in Task.STATUS_CHOICES]
+        Task.objects.bulk_create([
+            Task(
+                title=f'task{i}',
+                task_list=rng.choice(task_lists),
+                assigned_to=rng.choice(users),
+                created_by=rng.choice(users),
+                status=rng.choice(statuses),
+                due_date=now + timedelta(days=rng.randint(-30, 30)) if rng.random() < 0.7 else None,
+            )
+            for i in range(tasks_count)
+        ], batch_size=2000)
+        Notification.objects.bulk_create([
+            Notification(
+                user=rng.choice(users),
+                notification_type='task_updated',
+                title=f'notification{i}',
+                message='',
+                is_read=rng.random() < 0.8,
+            )
+            for i in range(notifications_count)
+        ], batch_size=2000)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        return users[0]
+
+    def get_hot_queries(self, user):
+        """Запросы, которые выполняются на каждом обращении к API, боту и WebSocket"""
+        now = timezone.now()
+        own_tasks = Task.objects.filter(Q(assigned_to=user) | Q(created_by=user))
+        return {
+            'TaskViewSet.list': own_tasks.order_by('-created_at', '-id')[:21],
+            'async_views.my_tasks': Task.objects.filter(assigned_to=user).order_by('-created_at', '-id')[:21],
+            'async_views.overdue_tasks': own_tasks.filter(
+                due_date__lt=now, status__in=Task.OPEN_STATUSES
+            ).order_by('due_date', 'id')[:21],
+            'TaskConsumer.get_user_tasks': Task.objects.filter(assigned_to=user).order_by('-created_at'),
+            'bot /tasks': Task.objects.filter(assigned_to=user).order_by('-created_at')[:10],
+            'bot /overdue': Task.objects.filter(
+                assigned_to=user, due_date__lt=now, status__in=Task.OPEN_STATUSES
+            ).order_by('due_date'),
+            'check_overdue_tasks': Task.objects.filter(due_date__lt=now, status__in=Task.OPEN_STATUSES),
+            'TaskViewSet.sync': own_tasks.filter(
+                Q(updated_at__gt=now - timedelta(hours=1)) | Q(updated_at=now - timedelta(hours=1), id__gt=0)
+            ).order_by('updated_at', 'id')[:501],
+            'NotificationViewSet.sync': Notification.objects.filter(
+                user=user, updated_at__gt=now - timedelta(hours=1)
+            ).order_by('updated_at', 'id')[:501],
+            'async_views.notification_list': Notification.objects.filter(
+                user=user
+            ).order_by('-created_at', '-id')[:20],
+            'NotificationViewSet.unread': Notification.objects.filter(
+                user=user, is_read=False
+            ).order_by('-created_at')[:20],
+        }
+
+    def check_plans(self, user):
+        failures = []
+        for name, queryset in self.get_hot_queries(user).items():
+            plan = queryset.explain()
+            if connection.vendor == 'sqlite' and name in self.SQLITE_UNCHECKED:
+                reason = self.SQLITE_UNCHECKED[name]
+                self.stdout.write(self.style.WARNING(f'{name}: не проверяется на SQLite ({reason})'))
+                continue
+            if self.has_sequential_scan(plan):
+                failures.append(name)
+                self.stdout.write(self.style.ERROR(f'{name}: последовательное сканирование\n{plan}'))
+                continue
+            missing = self.get_missing_indexes(name, plan)
+            if missing:
+                failures.append(name)
+                self.stdout.write(self.style.ERROR(f"{name}: в плане нет индекса {' / '.join(missing)}\n{plan}"))
+            elif self.verbosity > 1:
+                self.stdout.write(f'{name}:\n{plan}')
+        return failures
+
+    def get_missing_indexes(self, name, plan):
+        """Ожидаемые индексы (или наборы вариантов), которых нет в плане"""
+        missing = []
+        for expected in self.EXPECTED_INDEXES[name]:
+            options = expected if isinstance(expected, tuple) else (expected,)
+            names = [self.get_column_index(*option) if isinstance(option, tuple) else option for option in options]
+            if not any(index and re.search(rf'\b{index}\b', plan) for index in names):
+                missing.append(' | '.join(index or str(option) for index, option in zip(names, options)))
+        return missing
+
+    def get_column_index(self, table, column):
+        """Имя индекса по одному столбцу (индексы внешних ключей Django именует с хэшем)"""
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, table)
+        for index_name, info in constraints.items():
+            if info['index'] and not info['primary_key'] and info['columns'] == [column]:
+                return index_name
+        return None
+
+    def has_sequential_scan(self, plan):
+        for line in plan.splitlines():
+            for table in self.checked_tables:
+                if connection.vendor == 'postgresql' and f'Seq Scan on {table}' in line:
+                    return True
+                if connection.vendor == 'sqlite' and f'SCAN {table}' in line and 'USING' not in line:
+                    return True
+        return False
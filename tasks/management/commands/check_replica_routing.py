@@ -0,0 +1,97 @@
+"""
+Management command that verifies read-replica routing on test databases.
+"""
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.test import Client
+from django.test.utils import override_settings, setup_test_environment
+
+from task_manager import db_router
+from tasks.models import Task, TaskList
+
+
+class Command(BaseCommand):
+    """
+    Создаёт отдельные тестовые базы (без зеркалирования) для основной базы и
+    каждой реплики из DB_REPLICAS. Данные записываются только в основную базу,
+    поэтому по результату чтения видно, куда ушёл запрос: с реплики запись не
+    видна, а пользователю, закреплённому за основной базой, — видна.
+    Для локальной проверки достаточно двух баз, например DB_REPLICAS=localhost/task_manager_replica.
+    """
+    help = 'Проверка маршрутизации чтений на реплики и закрепления после записи'
+
+    def handle(self, *args, **options):
+        replicas = db_router.get_replicas()
+        if not replicas:
+            raise CommandError('Реплики не настроены: задайте DB_REPLICAS')
+
+        setup_test_environment()
+        aliases = [DEFAULT_DB_ALIAS, *replicas]
+        old_names = {alias: connections[alias].settings_dict['NAME'] for alias in aliases}
+        local_settings = override_settings(
+            CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+            CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+        )
+        local_settings.enable()
+        try:
+            # Схема нужна и на репликах, поэтому миграции выполняются без роутера
+            with override_settings(DATABASE_ROUTERS=[]):
+                for alias in aliases:
+                    test_settings = connections[alias].settings_dict.setdefault('TEST', {})
+                    test_settings['MIRROR'] = None
+                    # Реплика может указывать на тот же сервер и ту же базу, что и основная;
+                    # тестовые базы SQLite и так создаются в памяти отдельно для каждого алиаса
+                    if alias != DEFAULT_DB_ALIAS and connections[alias].vendor != 'sqlite':
+                        test_settings.setdefault('NAME', f'test_{old_names[alias]}_{alias}')
+                    connections[alias].creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            failures = self.run_checks(replicas)
+        finally:
+            for alias in aliases:
+                connections[alias].creation.destroy_test_db(old_names[alias], verbosity=0)
+            local_settings.disable()
+
+        if failures:
+            raise CommandError(f"Проверки не пройдены: {', '.join(failures)}")
+        self.stdout.write(self.style.SUCCESS('Маршрутизация чтений работает'))
+
+    def run_checks(self, replicas):
+        user = User.objects.create_user('replica_check', password='replica_check')
+        task_list = TaskList.objects.create(name='Проверка', created_by=user)
+        task = Task.objects.create(title='Проверка', task_list=task_list, assigned_to=user, created_by=user)
+        # Запись закрепила пользователя за основной базой; начинаем с чистого состояния
+        cache.clear()
+
+        checks = {}
+        for alias in replicas:
+            with override_settings(DATABASE_REPLICAS=[alias]):
+                with db_router.replica_reads():
+                    checks[f'{alias}: чтение с реплики'] = not Task.objects.filter(pk=task.pk).exists()
+                    with transaction.atomic():
+                        checks[f'{alias}: чтение в транзакции из основной базы'] = (
+                            Task.objects.filter(pk=task.pk).exists()
+                        )
+                    written = TaskList.objects.create(name='Запись', created_by=user)
+                    checks[f'{alias}: запись в основную базу'] = (
+                        TaskList.objects.using(DEFAULT_DB_ALIAS).filter(pk=written.pk).exists()
+                    )
+                with db_router.replica_reads(pinned=True):
+                    checks[f'{alias}: закреплённый пользователь читает основную базу'] = (
+                        Task.objects.filter(pk=task.pk).exists()
+                    )
+        checks['чтение вне отмеченных участков из основной базы'] = Task.objects.filter(pk=task.pk).exists()
+
+        cache.clear()
+        client = Client()
+        client.force_login(user)
+        checks['API: GET до записи читает реплику'] = client.get('/api/tasks/').json()['results'] == []
+        client.patch(f'/api/tasks/{task.pk}/', {'priority': 'high'}, content_type='application/json')
+        checks['API: после записи пользователь закреплён'] = db_router.is_pinned(user.pk)
+        results = client.get('/api/tasks/').json()['results']
+        checks['API: GET после записи читает основную базу'] = [item['id'] for item in results] == [task.pk]
+
+        for name, passed in checks.items():
+            style = self.style.SUCCESS if passed else self.style.ERROR
+            self.stdout.write(style(f"{'OK ' if passed else 'FAIL'} {name}"))
+        return [name for name, passed in checks.items() if not passed]
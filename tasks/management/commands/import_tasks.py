@@ -0,0 +1,49 @@
+"""
+Management command that bulk-imports tasks from a CSV or NDJSON file.
+"""
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks.importer import TaskImporter, IMPORT_BATCH_SIZE, IMPORT_FORMATS, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Массовый импорт задач из CSV или NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл с задачами')
+        parser.add_argument('--user', required=True, help='Имя пользователя-создателя задач')
+        parser.add_argument('--format', dest='import_format', choices=IMPORT_FORMATS, help='Формат файла')
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE, help='Размер пакета')
+        parser.add_argument('--create-missing-lists', action='store_true', help='Создавать отсутствующие списки')
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        import_format = options['import_format'] or path.suffix.lstrip('.').lower()
+        if import_format not in IMPORT_FORMATS:
+            raise CommandError(f"Не удалось определить формат файла, укажите --format ({', '.join(IMPORT_FORMATS)})")
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"Пользователь {options['user']} не найден")
+
+        importer = TaskImporter(
+            user,
+            batch_size=options['batch_size'],
+            create_missing_lists=options['create_missing_lists'],
+            progress=lambda processed, created, failed: self.stdout.write(
+                f'Обработано строк: {processed}, создано задач: {created}, ошибок: {failed}'
+            ),
+        )
+        with path.open('rb') as lines:
+            report = importer.run(read_rows(lines, import_format))
+
+        for error in report['errors']:
+            self.stderr.write(f"Строка {error['row']}: {error['errors']}")
+        if report['failed'] > len(report['errors']):
+            self.stderr.write(f"... и ещё {report['failed'] - len(report['errors'])} ошибок")
+        self.stdout.write(self.style.SUCCESS(
+            f"Импорт завершён: создано задач {report['created']} из {report['processed']}"
+        ))
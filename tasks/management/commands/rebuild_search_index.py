@@ -0,0 +1,35 @@
+"""
+Management command that rebuilds full-text search documents for tasks.
+"""
+from django.core.management.base import BaseCommand
+
+from tasks.models import Task
+from tasks import search
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает поисковые векторы задач (PostgreSQL)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000, help='Размер пакета задач')
+
+    def handle(self, *args, **options):
+        if not search.is_full_text_supported():
+            self.stdout.write('Полнотекстовый индекс поддерживается только на PostgreSQL, пропускаем')
+            return
+
+        batch_size = options['batch_size']
+        last_id = 0
+        total = 0
+        while True:
+            task_ids = list(
+                Task.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not task_ids:
+                break
+            search.update_search_documents(task_ids)
+            total += len(task_ids)
+            last_id = task_ids[-1]
+            self.stdout.write(f'Обработано задач: {total}')
+
+        self.stdout.write(self.style.SUCCESS(f'Поисковый индекс перестроен, задач: {total}'))
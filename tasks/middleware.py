@@ -0,0 +1,44 @@
+"""
+Middleware for task management application.
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from . import events
+
+
+class RealtimeEventsMiddleware:
+    """
+    Собирает события WebSocket за запрос (см. tasks.events) и отправляет их
+    пакетом при закрытии ответа, то есть после того, как он отдан клиенту.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = events.start_batch()
+        try:
+            response = self.get_response(request)
+        finally:
+            batch = events.end_batch(token)
+        return self.schedule_dispatch(response, batch)
+
+    async def __acall__(self, request):
+        # Пакет попадает в поток синхронного представления вместе с контекстом
+        token = events.start_batch()
+        try:
+            response = await self.get_response(request)
+        finally:
+            batch = events.end_batch(token)
+        return self.schedule_dispatch(response, batch)
+
+    def schedule_dispatch(self, response, batch):
+        if batch:
+            response._resource_closers.append(lambda: events.dispatch(batch))
+        return response
@@ -0,0 +1,151 @@
+"""
+ViewSet mixins for task management API.
+"""
+import hashlib
+import time
+
+from django.utils.http import parse_etags
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+from task_manager import db_router
+from . import versions
+from .serializers import SparseFieldsetSerializerMixin
+
+
+class SparseFieldsetMixin:
+    """
+    Поддержка параметров ?fields=a,b и ?expand=c для ViewSet.
+    Queryset подстраивается под выбранную проекцию: связи, которые не
+    попадут в ответ, не присоединяются и не подгружаются.
+    """
+    
+    def _get_list_param(self, name):
+        request = getattr(self, 'request', None)
+        value = request.query_params.get(name) if request is not None else None
+        if not value:
+            return None
+        return {item.strip() for item in value.split(',') if item.strip()}
+    
+    def get_sparse_fields(self):
+        return self._get_list_param('fields')
+    
+    def get_expand(self):
+        return self._get_list_param('expand') or set()
+    
+    def _supports_projection(self):
+        serializer_class = self.get_serializer_class()
+        return (
+            self.request.method in SAFE_METHODS
+            and issubclass(serializer_class, SparseFieldsetSerializerMixin)
+        )
+    
+    def apply_projection(self, queryset):
+        """Добавляет аннотации и select_related/prefetch_related только для выводимых полей"""
+        if not self._supports_projection():
+            return queryset
+        serializer_class = self.get_serializer_class()
+        select_related, prefetch_related = serializer_class.get_related_lookups(
+            fields=self.get_sparse_fields(),
+            expand=self.get_expand(),
+            model=queryset.model,
+        )
+        annotations = serializer_class.get_annotations(fields=self.get_sparse_fields(), model=queryset.model)
+        if annotations:
+            queryset = queryset.annotate(**annotations)
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+        return queryset
+    
+    def get_serializer(self, *args, **kwargs):
+        if self._supports_projection():
+            kwargs.setdefault('fields', self.get_sparse_fields())
+            kwargs.setdefault('expand', self.get_expand())
+        return super().get_serializer(*args, **kwargs)
+
+
+def _strip_weak(etag):
+    """Слабое сравнение ETag выполняется без учёта префикса W/"""
+    return etag[2:] if etag.startswith('W/') else etag
+
+
+def make_etag(scope, user_id, version, variant, time_bucket=None):
+    """Слабый ETag представления variant (путь, формат) данных пользователя"""
+    if time_bucket:
+        variant += f'|{int(time.time() // time_bucket)}'
+    digest = hashlib.md5(variant.encode()).hexdigest()[:16]
+    return f'W/"{scope}-{user_id}-{version}-{digest}"'
+
+
+def etag_matches(etag, if_none_match):
+    client_etags = {_strip_weak(value) for value in parse_etags(if_none_match or '')}
+    return _strip_weak(etag) in client_etags or '*' in client_etags
+
+
+class NotModified(Exception):
+    """Данные не изменились с момента, указанного клиентом в If-None-Match"""
+
+
+class ConditionalGetMixin:
+    """
+    Слабые ETag для чтения на основе маркеров версий пользователя.
+    Если данные не менялись, отвечает 304 до выполнения запроса к базе
+    и сериализации.
+    
+    etag_scopes: действие -> область версий (см. tasks.versions).
+    etag_time_bucket: для данных, зависящих от текущего времени (is_overdue),
+    ETag дополнительно меняется раз в указанное количество секунд.
+    """
+    etag_scopes = {}
+    etag_time_bucket = None
+    
+    def get_etag(self, request):
+        scope = self.etag_scopes.get(self.action)
+        if scope is None or request.method not in ('GET', 'HEAD') or not request.user.is_authenticated:
+            return None
+        version = versions.get_version(scope, request.user.id)
+        # Разные страницы, проекции и форматы ответа получают разные ETag
+        variant = f'{request.get_full_path()}|{request.accepted_media_type}'
+        return make_etag(scope, request.user.id, version, variant, self.etag_time_bucket)
+    
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.etag = self.get_etag(request)
+        if self.etag and etag_matches(self.etag, request.headers.get('If-None-Match')):
+            raise NotModified()
+    
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return Response(status=304)
+        return super().handle_exception(exc)
+    
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        etag = getattr(self, 'etag', None)
+        if etag and response.status_code in (200, 304):
+            response['ETag'] = etag
+            response['Cache-Control'] = 'private, no-cache'
+        return response
+
+
+class ReplicaReadMixin:
+    """
+    Безопасные запросы (GET/HEAD/OPTIONS) читают из реплики, если пользователь
+    не закреплён за основной базой. После запроса на запись пользователь
+    закрепляется за ней на DATABASE_READ_STICKINESS секунд (см. task_manager.db_router).
+    """
+    
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS:
+            user_id = request.user.id if request.user.is_authenticated else None
+            self._replica_token = db_router.start_replica_reads(pinned=db_router.is_pinned(user_id))
+    
+    def finalize_response(self, request, response, *args, **kwargs):
+        db_router.stop_replica_reads(getattr(self, '_replica_token', None))
+        self._replica_token = None
+        if request.method not in SAFE_METHODS and request.user.is_authenticated:
+            db_router.pin_to_primary([request.user.id])
+        return super().finalize_response(request, response, *args, **kwargs)
+
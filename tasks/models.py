@@ -1,9 +1,16 @@
 """
 Models for task management application.
 """
-from django.db import models
+from datetime import datetime, time, timedelta
+
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.db import models, transaction
+from django.db.models import DEFERRED, F
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
 from django.utils import timezone
+from . import versions
 
 
 class TaskList(models.Model):
@@ -13,6 +20,9 @@ class TaskList(models.Model):
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='created_task_lists', verbose_name="Создатель")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
+    # Денормализованные счётчики, поддерживаются при изменении задач
+    task_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="Количество задач")
+    open_task_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="Количество открытых задач")
     
     class Meta:
         verbose_name = "Список задач"
@@ -21,6 +31,49 @@ class TaskList(models.Model):
     
     def __str__(self):
         return self.name
+    
+    @classmethod
+    def adjust_counters(cls, task_list_id, total=0, open_tasks=0, owner_id=None):
+        """
+        Атомарно изменяет денормализованные счётчики списка. owner_id -
+        владелец списка, если он уже известен вызывающему коду
+        """
+        if not task_list_id or not (total or open_tasks):
+            return
+        cls.objects.filter(pk=task_list_id).update(
+            task_count=F('task_count') + total,
+            open_task_count=F('open_task_count') + open_tasks,
+        )
+        if owner_id is None:
+            owner_id = cls.objects.filter(pk=task_list_id).values_list('created_by_id', flat=True).first()
+        versions.bump_version(versions.TASK_LISTS, [owner_id])
+    
+    @classmethod
+    def recalculate_counters(cls, task_list_ids=None):
+        """Пересчитывает счётчики по фактическим данным (после массовых операций)"""
+        queryset = cls.objects.all()
+        if task_list_ids is not None:
+            queryset = queryset.filter(pk__in=task_list_ids)
+        # Один UPDATE с коррелированными подзапросами вместо запроса на каждый список
+        tasks = Task.objects.filter(task_list=models.OuterRef('pk')).order_by().values('task_list')
+        count = models.Count('id')
+        queryset.update(
+            task_count=Coalesce(models.Subquery(tasks.annotate(count=count).values('count')), 0),
+            open_task_count=Coalesce(models.Subquery(
+                tasks.filter(status__in=Task.OPEN_STATUSES).annotate(count=count).values('count')
+            ), 0),
+        )
+        versions.bump_version(versions.TASK_LISTS, queryset.values_list('created_by_id', flat=True))
+    
+    @classmethod
+    def can_view(cls, task_list_id, user_id):
+        """Список видят его создатель и участники — исполнители и создатели его задач"""
+        return cls.objects.filter(pk=task_list_id).filter(
+            models.Q(created_by_id=user_id)
+            | models.Exists(Task.objects.filter(task_list=models.OuterRef('pk')).filter(
+                models.Q(assigned_to_id=user_id) | models.Q(created_by_id=user_id)
+            ))
+        ).exists()
 
 
 class Task(models.Model):
@@ -38,6 +91,13 @@ class Task(models.Model):
         ('cancelled', 'Отменена'),
     ]
     
+    # Статусы, при которых задача считается открытой
+    OPEN_STATUSES = ['pending', 'in_progress']
+    # Статусы завершённых задач, которые со временем переносятся в архив
+    FINISHED_STATUSES = ['completed', 'cancelled']
+    # Поля, исходные значения которых нужны для счётчиков и инвалидации
+    TRACKED_FIELDS = ('task_list_id', 'status', 'assigned_to_id', 'due_date', 'completed_at')
+    
     title = models.CharField(max_length=200, verbose_name="Название")
     description = models.TextField(blank=True, verbose_name="Описание")
     task_list = models.ForeignKey(TaskList, on_delete=models.CASCADE, related_name='tasks', verbose_name="Список задач")
@@ -54,10 +114,88 @@ class Task(models.Model):
         verbose_name = "Задача"
         verbose_name_plural = "Задачи"
         ordering = ['-created_at']
+        indexes = [
+            # my_tasks, список задач в WebSocket и в боте
+            models.Index(fields=['assigned_to', '-created_at', '-id'], name='task_assignee_created_idx'),
+            # Вторая ветка OR в TaskViewSet.get_queryset
+            models.Index(fields=['created_by', '-created_at', '-id'], name='task_creator_created_idx'),
+            # Просроченные задачи исполнителя (overdue_tasks, /overdue в боте)
+            models.Index(fields=['assigned_to', 'status', 'due_date'], name='task_assignee_status_due_idx'),
+            models.Index(fields=['created_by', 'status', 'due_date'], name='task_creator_status_due_idx'),
+            # Инкрементальная синхронизация (?since=)
+            models.Index(fields=['assigned_to', 'updated_at', 'id'], name='task_assignee_updated_idx'),
+            models.Index(fields=['created_by', 'updated_at', 'id'], name='task_creator_updated_idx'),
+            # Частичный индекс открытых задач со сроком (check_overdue_tasks)
+            models.Index(
+                fields=['due_date', 'id'],
+                name='task_open_due_idx',
+                condition=models.Q(status__in=['pending', 'in_progress'], due_date__isnull=False),
+            ),
+            # Выбор задач для переноса в архив (tasks.archive)
+            models.Index(
+                Coalesce('completed_at', 'updated_at'),
+                name='task_finished_idx',
+                condition=models.Q(status__in=['completed', 'cancelled']),
+            ),
+        ]
+    
+    # Задачи из архива представлены моделью ArchivedTask
+    is_archived = False
     
     def __str__(self):
         return self.title
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Запоминаем исходное состояние для поддержки счётчиков списка
+        instance._loaded_state = {name: instance.__dict__.get(name, DEFERRED) for name in cls.TRACKED_FIELDS}
+        return instance
+    
+    def get_tracked_state(self):
+        return {name: getattr(self, name) for name in self.TRACKED_FIELDS}
+    
+    def get_loaded_state(self):
+        """Состояние на момент загрузки из базы, если оно известно полностью"""
+        state = getattr(self, '_loaded_state', None)
+        if state is None or DEFERRED in state.values():
+            return self.get_tracked_state()
+        return state
+    
+    def save(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get('using')):
+            old_state = getattr(self, '_loaded_state', None)
+            if self.pk and (old_state is None or DEFERRED in old_state.values()):
+                old_state = Task.objects.filter(pk=self.pk).values(*self.TRACKED_FIELDS).first()
+            # Предыдущее состояние доступно обработчикам post_save
+            self._previous_state = old_state
+            super().save(*args, **kwargs)
+            self._update_list_counters(old_state)
+            self._loaded_state = self.get_tracked_state()
+    
+    def get_task_list_owner_id(self):
+        """Владелец списка, если список уже загружен вместе с задачей"""
+        if self.task_list_id and Task.task_list.is_cached(self):
+            return self.task_list.created_by_id
+        return None
+    
+    def _update_list_counters(self, old_state):
+        """Обновляет счётчики списков задач с учётом предыдущего состояния"""
+        is_open = self.status in self.OPEN_STATUSES
+        owner_id = self.get_task_list_owner_id()
+        if old_state is None:
+            TaskList.adjust_counters(self.task_list_id, total=1, open_tasks=int(is_open), owner_id=owner_id)
+            return
+        old_list_id, old_status = old_state['task_list_id'], old_state['status']
+        was_open = old_status in self.OPEN_STATUSES
+        if old_list_id != self.task_list_id:
+            TaskList.adjust_counters(old_list_id, total=-1, open_tasks=-int(was_open))
+            TaskList.adjust_counters(self.task_list_id, total=1, open_tasks=int(is_open), owner_id=owner_id)
+        elif was_open != is_open:
+            TaskList.adjust_counters(
+                self.task_list_id, open_tasks=int(is_open) - int(was_open), owner_id=owner_id
+            )
+    
     def is_overdue(self):
         """Проверяет, просрочена ли задача"""
         if self.due_date and self.status != 'completed':
@@ -82,11 +220,129 @@ class TaskComment(models.Model):
         verbose_name = "Комментарий"
         verbose_name_plural = "Комментарии"
         ordering = ['created_at']
+        indexes = [
+            # Страницы комментариев задачи и последние комментарии в её представлении
+            models.Index(fields=['task', '-created_at', '-id'], name='comment_task_created_idx'),
+        ]
     
     def __str__(self):
         return f"Комментарий к задаче {self.task.title} от {self.author.username}"
 
 
+class TaskSearchDocument(models.Model):
+    """Поисковый вектор задачи: название, описание и комментарии (только PostgreSQL)"""
+    # Без каскада на уровне ORM: на других СУБД таблицы нет, документ
+    # удаляется обработчиком post_delete задачи
+    task = models.OneToOneField(
+        Task, on_delete=models.DO_NOTHING, db_constraint=False, primary_key=True,
+        related_name='search_document', verbose_name="Задача"
+    )
+    vector = SearchVectorField(null=True, verbose_name="Поисковый вектор")
+    
+    class Meta:
+        verbose_name = "Поисковый документ задачи"
+        verbose_name_plural = "Поисковые документы задач"
+        required_db_vendor = 'postgresql'
+        indexes = [
+            GinIndex(fields=['vector'], name='task_search_vector_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Поисковый документ задачи {self.task_id}"
+
+
+class ArchivedTask(models.Model):
+    """
+    Завершённая или отменённая задача, перенесённая в архив (см. tasks.archive).
+    Идентификатор совпадает с идентификатором исходной задачи.
+    """
+    id = models.BigIntegerField(primary_key=True, verbose_name="ID")
+    title = models.CharField(max_length=200, verbose_name="Название")
+    description = models.TextField(blank=True, verbose_name="Описание")
+    task_list = models.ForeignKey(TaskList, on_delete=models.CASCADE, related_name='archived_tasks', verbose_name="Список задач")
+    assigned_to = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_assigned_tasks', verbose_name="Исполнитель")
+    created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_created_tasks', verbose_name="Создатель")
+    priority = models.CharField(max_length=10, choices=Task.PRIORITY_CHOICES, verbose_name="Приоритет")
+    status = models.CharField(max_length=15, choices=Task.STATUS_CHOICES, verbose_name="Статус")
+    due_date = models.DateTimeField(null=True, blank=True, verbose_name="Срок выполнения")
+    created_at = models.DateTimeField(verbose_name="Дата создания")
+    updated_at = models.DateTimeField(verbose_name="Дата обновления")
+    completed_at = models.DateTimeField(null=True, blank=True, verbose_name="Дата завершения")
+    archived_at = models.DateTimeField(default=timezone.now, verbose_name="Дата архивации")
+    
+    is_archived = True
+    
+    class Meta:
+        verbose_name = "Архивная задача"
+        verbose_name_plural = "Архивные задачи"
+        ordering = ['-created_at']
+        indexes = [
+            # Выдача архива вместе с задачами или отдельно (?archived=)
+            models.Index(fields=['assigned_to', '-created_at', '-id'], name='archived_assignee_created_idx'),
+            models.Index(fields=['created_by', '-created_at', '-id'], name='archived_creator_created_idx'),
+        ]
+    
+    def __str__(self):
+        return self.title
+    
+    def is_overdue(self):
+        """Проверяет, просрочена ли задача (как Task.is_overdue)"""
+        return Task.is_overdue(self)
+
+
+class ArchivedTaskComment(models.Model):
+    """Комментарий архивной задачи"""
+    id = models.BigIntegerField(primary_key=True, verbose_name="ID")
+    task = models.ForeignKey(ArchivedTask, on_delete=models.CASCADE, related_name='comments', verbose_name="Задача")
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_task_comments', verbose_name="Автор")
+    content = models.TextField(verbose_name="Содержание")
+    created_at = models.DateTimeField(verbose_name="Дата создания")
+    
+    class Meta:
+        verbose_name = "Комментарий архивной задачи"
+        verbose_name_plural = "Комментарии архивных задач"
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['task', '-created_at', '-id'], name='archived_comment_task_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Комментарий к архивной задаче {self.task_id}"
+
+
+class Tombstone(models.Model):
+    """Запись об удалении объекта для инкрементальной синхронизации клиентов"""
+    OBJECT_TYPES = [
+        ('task', 'Задача'),
+        ('notification', 'Уведомление'),
+    ]
+    
+    # Без внешнего ключа: запись должна пережить каскадное удаление пользователя
+    user_id = models.BigIntegerField(verbose_name="Пользователь")
+    object_type = models.CharField(max_length=20, choices=OBJECT_TYPES, verbose_name="Тип объекта")
+    object_id = models.BigIntegerField(verbose_name="ID объекта")
+    deleted_at = models.DateTimeField(default=timezone.now, verbose_name="Дата удаления")
+    
+    class Meta:
+        verbose_name = "Удалённый объект"
+        verbose_name_plural = "Удалённые объекты"
+        indexes = [
+            models.Index(fields=['user_id', 'object_type', 'deleted_at'], name='tombstone_user_type_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.object_type} {self.object_id} для пользователя {self.user_id}"
+    
+    @classmethod
+    def record(cls, object_type, object_id, user_ids):
+        """Отмечает, что объект пропал из выборки указанных пользователей"""
+        now = timezone.now()
+        cls.objects.bulk_create([
+            cls(user_id=user_id, object_type=object_type, object_id=object_id, deleted_at=now)
+            for user_id in {user_id for user_id in user_ids if user_id}
+        ])
+
+
 class UserProfile(models.Model):
     """Расширенный профиль пользователя"""
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile', verbose_name="Пользователь")
@@ -102,3 +358,198 @@ class UserProfile(models.Model):
     
     def __str__(self):
         return f"Профиль {self.user.username}"
+
+
+class UserTaskStats(models.Model):
+    """
+    Счётчики задач, назначенных пользователю: открытые, просроченные,
+    со сроком сегодня и выполненные на этой неделе.
+
+    Сохранение и удаление задачи изменяют счётчики на разницу вклада её
+    старого и нового состояния (apply_task_change), массовые операции
+    пересчитывают затронутых пользователей (recalculate). Просроченные и
+    «на сегодня» зависят от времени, поэтому сканер просроченных задач
+    периодически пересчитывает их для всех (recalculate_due_counters), а
+    ежедневная сверка исправляет накопившиеся расхождения. Просроченные
+    задачи считаются на момент counted_at последнего пересчёта, и вклад
+    изменений считается на тот же момент. Строка относится к дню day и
+    неделе week_start; устаревшая строка пересчитывается при чтении.
+    """
+    COUNTERS = ('open_count', 'overdue_count', 'due_today_count', 'completed_week_count')
+    
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='task_stats', verbose_name="Пользователь")
+    open_count = models.IntegerField(default=0, verbose_name="Открытые задачи")
+    overdue_count = models.IntegerField(default=0, verbose_name="Просроченные задачи")
+    due_today_count = models.IntegerField(default=0, verbose_name="Задачи со сроком сегодня")
+    completed_week_count = models.IntegerField(default=0, verbose_name="Выполнено за неделю")
+    day = models.DateField(verbose_name="День")
+    week_start = models.DateField(verbose_name="Начало недели")
+    counted_at = models.DateTimeField(null=True, verbose_name="Момент расчёта просроченных")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
+    
+    class Meta:
+        verbose_name = "Статистика задач пользователя"
+        verbose_name_plural = "Статистика задач пользователей"
+    
+    def __str__(self):
+        return f"Статистика задач {self.user_id}"
+    
+    @staticmethod
+    def get_period(now=None):
+        """Границы текущего дня и недели в часовом поясе проекта"""
+        now = now or timezone.now()
+        today = timezone.localdate(now)
+        week_start = today - timedelta(days=today.weekday())
+        return {
+            'now': now,
+            'day': today,
+            'week_start': week_start,
+            'day_start': timezone.make_aware(datetime.combine(today, time.min)),
+            'day_end': timezone.make_aware(datetime.combine(today + timedelta(days=1), time.min)),
+            'week_start_at': timezone.make_aware(datetime.combine(week_start, time.min)),
+        }
+    
+    @staticmethod
+    def get_contribution(state, period):
+        """Вклад задачи в состоянии state в счётчики её исполнителя"""
+        if not state:
+            return (0, 0, 0, 0)
+        is_open = state['status'] in Task.OPEN_STATUSES
+        due_date, completed_at = state['due_date'], state['completed_at']
+        return (
+            int(is_open),
+            int(is_open and due_date is not None and due_date < period['now']),
+            int(is_open and due_date is not None and period['day_start'] <= due_date < period['day_end']),
+            int(
+                state['status'] == 'completed'
+                and completed_at is not None and completed_at >= period['week_start_at']
+            ),
+        )
+    
+    @classmethod
+    def apply_task_change(cls, old_state, new_state):
+        """Изменяет счётчики на разницу вклада старого и нового состояния задачи"""
+        period = cls.get_period()
+        states = [(state, sign) for state, sign in ((old_state, -1), (new_state, 1)) if state]
+        user_ids = {state['assigned_to_id'] for state, _ in states}
+        counted_at = dict(cls.objects.filter(
+            user_id__in=user_ids, day=period['day'], week_start=period['week_start'], counted_at__isnull=False
+        ).values_list('user_id', 'counted_at'))
+        
+        stale_user_ids = [user_id for user_id in user_ids if user_id not in counted_at]
+        for user_id, reference in counted_at.items():
+            # Вклад считается на момент расчёта строки, а не на текущий: задача,
+            # просрочившаяся после расчёта, в счётчик просроченных ещё не входит
+            reference_period = cls.get_period(reference)
+            delta = (0, 0, 0, 0)
+            for state, sign in states:
+                if state['assigned_to_id'] == user_id:
+                    contribution = cls.get_contribution(state, reference_period)
+                    delta = tuple(a + sign * b for a, b in zip(delta, contribution))
+            changes = {name: F(name) + value for name, value in zip(cls.COUNTERS, delta) if value}
+            if not changes:
+                continue
+            # Строку пересчитали после чтения counted_at — пересчитываем и мы
+            updated = cls.objects.filter(
+                user_id=user_id, day=period['day'], week_start=period['week_start'], counted_at=reference
+            ).update(**changes)
+            if not updated:
+                stale_user_ids.append(user_id)
+        if stale_user_ids:
+            # Строка за прошлый день пересчитывается; отсутствующая создаётся при чтении
+            cls.recalculate(cls.objects.filter(user_id__in=stale_user_ids).values_list('user_id', flat=True))
+    
+    @classmethod
+    def recalculate(cls, user_ids):
+        """
+        Пересчитывает счётчики пользователей по фактическим данным одним
+        агрегирующим запросом. Возвращает количество исправленных строк.
+        """
+        user_ids = {user_id for user_id in user_ids if user_id}
+        if not user_ids:
+            return 0
+        period = cls.get_period()
+        is_open = models.Q(status__in=Task.OPEN_STATUSES)
+        # Чтения в транзакции выполняются в основной базе; точка сохранения не нужна
+        with transaction.atomic(savepoint=False):
+            rows = Task.objects.filter(assigned_to_id__in=user_ids).order_by().values('assigned_to_id').annotate(
+                open_count=models.Count('id', filter=is_open),
+                overdue_count=models.Count('id', filter=is_open & models.Q(due_date__lt=period['now'])),
+                due_today_count=models.Count('id', filter=is_open & models.Q(
+                    due_date__gte=period['day_start'], due_date__lt=period['day_end']
+                )),
+                completed_week_count=models.Count('id', filter=models.Q(
+                    status='completed', completed_at__gte=period['week_start_at']
+                )),
+            )
+            counts = {row.pop('assigned_to_id'): row for row in rows}
+            current = {
+                row['user_id']: row
+                for row in cls.objects.filter(user_id__in=user_ids).values('user_id', 'day', 'week_start', *cls.COUNTERS)
+            }
+            stats = []
+            corrected = 0
+            for user_id in user_ids:
+                values = {name: counts.get(user_id, {}).get(name, 0) for name in cls.COUNTERS}
+                row = current.get(user_id)
+                if row and row['day'] == period['day'] and row['week_start'] == period['week_start']:
+                    corrected += any(row[name] != values[name] for name in cls.COUNTERS)
+                stats.append(cls(
+                    user_id=user_id, day=period['day'], week_start=period['week_start'],
+                    counted_at=period['now'], **values
+                ))
+            cls.objects.bulk_create(
+                stats,
+                update_conflicts=True,
+                unique_fields=['user'],
+                update_fields=['day', 'week_start', 'counted_at', 'updated_at', *cls.COUNTERS],
+            )
+        return corrected
+    
+    @classmethod
+    def recalculate_due_counters(cls, batch_size=1000):
+        """
+        Пересчитывает просроченные задачи и задачи на сегодня всех пользователей
+        (сканер просроченных задач); строки за прошлую неделю пересчитываются целиком
+        """
+        period = cls.get_period()
+        stale_user_ids = list(cls.objects.exclude(week_start=period['week_start']).values_list('user_id', flat=True))
+        for start in range(0, len(stale_user_ids), batch_size):
+            cls.recalculate(stale_user_ids[start:start + batch_size])
+        
+        # Открытые задачи со сроком до конца дня — по частичному индексу task_open_due_idx
+        rows = Task.objects.filter(
+            status__in=Task.OPEN_STATUSES, due_date__lt=period['day_end']
+        ).order_by().values('assigned_to_id').annotate(
+            overdue_count=models.Count('id', filter=models.Q(due_date__lt=period['now'])),
+            due_today_count=models.Count('id', filter=models.Q(due_date__gte=period['day_start'])),
+        )
+        stats = [
+            cls(user_id=row['assigned_to_id'], overdue_count=row['overdue_count'],
+                due_today_count=row['due_today_count'], day=period['day'], counted_at=period['now'])
+            for row in rows
+        ]
+        with transaction.atomic():
+            # Нулевые строки сегодняшнего дня остаются верными и на прежний момент расчёта
+            cls.objects.exclude(overdue_count=0, due_today_count=0, day=period['day']).update(
+                overdue_count=0, due_today_count=0, day=period['day'], counted_at=period['now']
+            )
+            cls.objects.bulk_update(
+                stats, ['overdue_count', 'due_today_count', 'day', 'counted_at'], batch_size=batch_size
+            )
+        return len(stats)
+    
+    @classmethod
+    def get_for_user(cls, user_id):
+        """Счётчики пользователя; строка за прошлый день или неделю пересчитывается"""
+        period = cls.get_period()
+        stats = cls.objects.filter(user_id=user_id).first()
+        if (
+            stats is None or stats.counted_at is None
+            or stats.day != period['day'] or stats.week_start != period['week_start']
+        ):
+            with transaction.atomic():
+                cls.recalculate([user_id])
+                stats = cls.objects.get(user_id=user_id)
+        return stats
+
@@ -0,0 +1,21 @@
+"""
+Pagination classes for task management API.
+"""
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class TaskCursorPagination(CursorPagination):
+    """
+    Курсорная (keyset) пагинация задач по (created_at, id).
+    Стоимость страницы не зависит от её номера, а добавление новых задач
+    не сдвигает уже выданные страницы.
+    """
+    ordering = ('-created_at', '-id')
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class SearchPagination(PageNumberPagination):
+    """Постраничная выдача результатов поиска, упорядоченных по релевантности"""
+    page_size_query_param = 'page_size'
+    max_page_size = 100
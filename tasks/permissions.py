@@ -11,4 +11,4 @@ class IsOwnerOrAssigned(permissions.BasePermission):
     
     def has_object_permission(self, request, view, obj):
         # Разрешаем доступ создателю или исполнителю задачи
-        return obj.created_by == request.user or obj.assigned_to == request.user
+        return request.user.id in (obj.created_by_id, obj.assigned_to_id)
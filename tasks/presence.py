@@ -0,0 +1,150 @@
+"""
+Presence registry of open WebSocket connections.
+
+Каждое соединение TaskConsumer регистрируется в Redis при подключении и
+продлевает запись при ping, но не чаще, чем раз в HEARTBEAT_REFRESH доли
+TTL (см. heartbeat_due); запись живёт WEBSOCKET_PRESENCE_TTL секунд после
+последнего сигнала, поэтому соединения упавшего узла истекают сами.
+В отсортированных множествах хранится время истечения каждой записи:
+соединения пользователя, соединения узла, узлы и пользователи онлайн.
+Реестр работает только с кэшем на Redis; с другими бэкендами он выключен,
+и все пользователи считаются подключёнными.
+"""
+import logging
+import os
+import socket
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.redis import RedisCache
+
+logger = logging.getLogger(__name__)
+
+NODE_ID = f'{socket.gethostname()}:{os.getpid()}'
+# Доля TTL, после которой ping снова продлевает запись: частые ping не ходят в Redis.
+# Интервал ping клиента должен быть меньше (1 - HEARTBEAT_REFRESH) * TTL
+HEARTBEAT_REFRESH = 0.5
+
+
+def get_ttl():
+    return getattr(settings, 'WEBSOCKET_PRESENCE_TTL', 90)
+
+
+def get_node_id():
+    return getattr(settings, 'WEBSOCKET_NODE_ID', None) or NODE_ID
+
+
+def heartbeat_due(last_heartbeat_at):
+    """Пора ли продлить запись соединения; last_heartbeat_at — по time.monotonic()"""
+    return last_heartbeat_at is None or time.monotonic() - last_heartbeat_at >= get_ttl() * HEARTBEAT_REFRESH
+
+
+def _get_client():
+    """Клиент Redis кэша по умолчанию или None, если кэш не на Redis"""
+    cache = caches['default']
+    if not isinstance(cache, RedisCache):
+        return None
+    return cache._cache.get_client(write=True)
+
+
+def _safe(func):
+    # Недоступный Redis не должен ломать соединения и рассылку событий
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            logger.exception('Presence registry is unavailable')
+    return wrapper
+
+
+def _key(name):
+    return caches['default'].make_key(f'presence:{name}')
+
+
+def _user_key(user_id):
+    return _key(f'user:{user_id}')
+
+
+def _node_key(node_id):
+    return _key(f'node:{node_id}')
+
+
+def heartbeat(user_id, channel_name):
+    """Регистрирует соединение или продлевает его запись"""
+    client = _get_client()
+    if client is None:
+        return
+    ttl = get_ttl()
+    now = time.time()
+    expires_at = now + ttl
+    node_id = get_node_id()
+    pipe = client.pipeline(transaction=False)
+    # Записи соединений упавших узлов удаляются при следующем сигнале пользователя
+    pipe.zremrangebyscore(_user_key(user_id), '-inf', now)
+    pipe.zadd(_user_key(user_id), {channel_name: expires_at})
+    pipe.expire(_user_key(user_id), ttl)
+    pipe.zadd(_node_key(node_id), {channel_name: expires_at})
+    pipe.expire(_node_key(node_id), ttl)
+    pipe.zadd(_key('nodes'), {node_id: expires_at})
+    pipe.zadd(_key('users'), {str(user_id): expires_at})
+    pipe.execute()
+
+
+def disconnect(user_id, channel_name):
+    """Удаляет соединение; пользователь без живых соединений уходит из онлайна"""
+    client = _get_client()
+    if client is None:
+        return
+    now = time.time()
+    pipe = client.pipeline(transaction=False)
+    pipe.zrem(_user_key(user_id), channel_name)
+    pipe.zrem(_node_key(get_node_id()), channel_name)
+    pipe.zcount(_user_key(user_id), now, '+inf')
+    if not pipe.execute()[-1]:
+        client.zrem(_key('users'), str(user_id))
+
+
+aheartbeat = sync_to_async(_safe(heartbeat))
+adisconnect = sync_to_async(_safe(disconnect))
+
+
+@_safe
+def get_online_users(user_ids):
+    """
+    Подмножество user_ids с хотя бы одним живым соединением или None, если
+    реестр выключен или недоступен (тогда все считаются подключёнными).
+    """
+    client = _get_client()
+    if client is None:
+        return None
+    user_ids = list(user_ids)
+    now = time.time()
+    pipe = client.pipeline(transaction=False)
+    for user_id in user_ids:
+        pipe.zcount(_user_key(user_id), now, '+inf')
+    return {user_id for user_id, count in zip(user_ids, pipe.execute()) if count}
+
+
+def get_stats():
+    """Число соединений по узлам и пользователей онлайн; истёкшие записи удаляются"""
+    client = _get_client()
+    if client is None:
+        return {'enabled': False}
+    now = time.time()
+    client.zremrangebyscore(_key('nodes'), '-inf', now)
+    client.zremrangebyscore(_key('users'), '-inf', now)
+    nodes = sorted(node.decode() for node in client.zrange(_key('nodes'), 0, -1))
+    pipe = client.pipeline(transaction=False)
+    for node_id in nodes:
+        pipe.zremrangebyscore(_node_key(node_id), '-inf', now)
+        pipe.zcard(_node_key(node_id))
+    connections = dict(zip(nodes, pipe.execute()[1::2]))
+    return {
+        'enabled': True,
+        'ttl': get_ttl(),
+        'users_online': client.zcard(_key('users')),
+        'connections': sum(connections.values()),
+        'nodes': connections,
+    }
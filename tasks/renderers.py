@@ -0,0 +1,20 @@
+"""
+Renderers for task management API.
+"""
+from rest_framework.renderers import JSONRenderer
+
+from . import fastjson
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer на orjson. Запросы с отступами (?indent / Accept с indent)
+    обрабатываются стандартным рендерером DRF.
+    """
+    
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        return fastjson.dumps(data)
@@ -0,0 +1,100 @@
+"""
+Per-user cache of serialized task responses.
+
+Ключ записи включает маркер версии пользователя (см. tasks.versions),
+поэтому любая запись, затрагивающая пользователя, делает его записи
+недоступными без явного удаления ключей. Устаревшие записи вытесняются
+по TTL.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import versions
+
+STATS_TIMEOUT = None
+
+
+def get_timeout():
+    return getattr(settings, 'TASKS_RESPONSE_CACHE_TIMEOUT', 300)
+
+
+def _incr(name):
+    key = f'response_cache:stats:{name}'
+    if not cache.add(key, 1, STATS_TIMEOUT):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, STATS_TIMEOUT)
+
+
+async def _aincr(name):
+    key = f'response_cache:stats:{name}'
+    if not await cache.aadd(key, 1, STATS_TIMEOUT):
+        try:
+            await cache.aincr(key)
+        except ValueError:
+            await cache.aset(key, 1, STATS_TIMEOUT)
+
+
+def _make_key(scope, user_id, version, variant, time_bucket):
+    if time_bucket:
+        variant = f'{variant}|{int(time.time() // time_bucket)}'
+    digest = hashlib.md5(variant.encode()).hexdigest()
+    return f'response_cache:{scope}:{user_id}:{version}:{digest}'
+
+
+def get_or_set(scope, user_id, variant, producer, time_bucket=None):
+    """
+    Возвращает закэшированные данные для пользователя или вычисляет их.
+    
+    variant различает представления внутри области (URL, страница, проекция);
+    time_bucket — период в секундах для данных, зависящих от текущего времени.
+    """
+    version = versions.get_version(scope, user_id)
+    key = _make_key(scope, user_id, version, variant, time_bucket)
+
+    data = cache.get(key)
+    if data is not None:
+        _incr(f'{scope}:hits')
+        return data
+
+    _incr(f'{scope}:misses')
+    data = producer()
+    cache.set(key, data, get_timeout())
+    return data
+
+
+async def aget_or_set(scope, user_id, variant, producer, time_bucket=None, version=None):
+    """
+    Асинхронный вариант get_or_set: producer — корутинная функция.
+    version можно передать, если маркер уже получен (например, для ETag).
+    """
+    if version is None:
+        version = await versions.aget_version(scope, user_id)
+    key = _make_key(scope, user_id, version, variant, time_bucket)
+
+    data = await cache.aget(key)
+    if data is not None:
+        await _aincr(f'{scope}:hits')
+        return data
+
+    await _aincr(f'{scope}:misses')
+    data = await producer()
+    await cache.aset(key, data, get_timeout())
+    return data
+
+
+def get_stats(scopes=(versions.TASKS,)):
+    """Счётчики попаданий и промахов по областям"""
+    keys = [f'response_cache:stats:{scope}:{kind}' for scope in scopes for kind in ('hits', 'misses')]
+    values = cache.get_many(keys)
+    return {
+        scope: {
+            kind: values.get(f'response_cache:stats:{scope}:{kind}', 0)
+            for kind in ('hits', 'misses')
+        }
+        for scope in scopes
+    }
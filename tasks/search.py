@@ -0,0 +1,97 @@
+"""
+Full-text search over tasks.
+
+На PostgreSQL поисковый вектор задачи (название, описание, комментарии)
+хранится в TaskSearchDocument с GIN-индексом и обновляется при записи
+задач и комментариев. На остальных СУБД используется поиск по подстроке
+с упрощённым ранжированием.
+"""
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, Exists, F, IntegerField, OuterRef, Q, Value, When
+
+from .models import Task, TaskComment, TaskSearchDocument
+
+
+def is_full_text_supported():
+    return connection.vendor == 'postgresql'
+
+
+def get_search_config():
+    return getattr(settings, 'TASKS_SEARCH_CONFIG', 'russian')
+
+
+def update_search_documents(task_ids):
+    """Пересчитывает поисковые векторы указанных задач одним запросом"""
+    task_ids = [task_id for task_id in task_ids if task_id]
+    if not task_ids or not is_full_text_supported():
+        return
+    config = get_search_config()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {TaskSearchDocument._meta.db_table} (task_id, vector)
+            SELECT t.id,
+                setweight(to_tsvector(%s::regconfig, coalesce(t.title, '')), 'A') ||
+                setweight(to_tsvector(%s::regconfig, coalesce(t.description, '')), 'B') ||
+                setweight(to_tsvector(%s::regconfig, coalesce((
+                    SELECT string_agg(c.content, ' ')
+                    FROM {TaskComment._meta.db_table} c
+                    WHERE c.task_id = t.id
+                ), '')), 'C')
+            FROM {Task._meta.db_table} t
+            WHERE t.id = ANY(%s)
+            ON CONFLICT (task_id) DO UPDATE SET vector = EXCLUDED.vector
+            """,
+            [config, config, config, list(task_ids)],
+        )
+
+
+def schedule_search_documents(task_ids):
+    """
+    Пересчитывает поисковые векторы после фиксации транзакции: изменения
+    нескольких комментариев одной транзакции дают один пересчёт
+    """
+    task_ids = {task_id for task_id in task_ids if task_id}
+    if not task_ids or not is_full_text_supported():
+        return
+    db = transaction.get_connection()
+    if not db.in_atomic_block:
+        update_search_documents(task_ids)
+        return
+    # Уже запланированный пересчёт ищется среди ожидающих callbacks: при
+    # откате точки сохранения он удаляется из списка вместе с ними
+    for _, callback, *_ in db.run_on_commit:
+        pending = getattr(callback, 'search_task_ids', None)
+        if pending is not None:
+            pending.update(task_ids)
+            return
+
+    def flush():
+        update_search_documents(flush.search_task_ids)
+
+    flush.search_task_ids = task_ids
+    transaction.on_commit(flush)
+
+
+def search_tasks(queryset, query):
+    """Фильтрует queryset по поисковому запросу и сортирует по релевантности"""
+    if is_full_text_supported():
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+
+        search_query = SearchQuery(query, config=get_search_config(), search_type='websearch')
+        return queryset.filter(search_document__vector=search_query).annotate(
+            rank=SearchRank(F('search_document__vector'), search_query),
+        ).order_by('-rank', '-created_at', '-id')
+
+    has_comment = Exists(TaskComment.objects.filter(task=OuterRef('pk'), content__icontains=query))
+    return queryset.annotate(has_comment=has_comment).filter(
+        Q(title__icontains=query) | Q(description__icontains=query) | Q(has_comment=True)
+    ).annotate(
+        rank=Case(
+            When(title__icontains=query, then=Value(3)),
+            When(description__icontains=query, then=Value(2)),
+            default=Value(1),
+            output_field=IntegerField(),
+        ),
+    ).order_by('-rank', '-created_at', '-id')
@@ -3,8 +3,112 @@ Serializers for task management API.
 """
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from django.db.models import Count, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
 from django.utils import timezone
-from .models import TaskList, Task, TaskComment, UserProfile
+from .models import TaskList, Task, TaskComment, UserProfile, UserTaskStats
+
+# Максимальное количество задач в одной массовой операции
+BULK_BATCH_SIZE = 500
+# Количество последних комментариев в представлении задачи
+LATEST_COMMENTS_COUNT = 3
+
+
+def latest_comments_prefetch(model=Task):
+    """Ограниченная подгрузка: не больше LATEST_COMMENTS_COUNT комментариев на задачу"""
+    comment_model = model._meta.get_field('comments').related_model
+    return Prefetch(
+        'comments',
+        queryset=comment_model.objects.select_related('author').order_by(
+            '-created_at', '-id'
+        )[:LATEST_COMMENTS_COUNT],
+        to_attr='latest_comments',
+    )
+
+
+def comment_count_annotation(model=Task):
+    comment_model = model._meta.get_field('comments').related_model
+    comments = comment_model.objects.filter(task=OuterRef('pk')).order_by().values('task')
+    return {
+        'comment_count': Coalesce(Subquery(comments.annotate(count=Count('id')).values('count')), 0),
+    }
+
+
+class SparseFieldsetSerializerMixin:
+    """
+    Миксин для сокращённых представлений (?fields=) и раскрытия связей (?expand=).
+    
+    Meta.related_fields: поле -> (select_related, prefetch_related), нужные для его вывода.
+    Meta.expandable_fields: поле -> (фабрика сериализатора, select_related, prefetch_related).
+    Meta.annotated_fields: поле -> функция, возвращающая аннотации queryset для него.
+    В prefetch_related вместо строки можно указать функцию, возвращающую Prefetch.
+    Функции получают модель queryset (Task или ArchivedTask).
+    """
+    
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        expand = set(expand or ()) & set(self.get_expandable_fields())
+        for name in expand:
+            self.fields[name] = self.get_expandable_fields()[name][0]()
+        if fields is not None:
+            for name in set(self.fields) - set(fields) - expand:
+                self.fields.pop(name)
+    
+    @classmethod
+    def get_expandable_fields(cls):
+        return getattr(cls.Meta, 'expandable_fields', {})
+    
+    @classmethod
+    def get_related_lookups(cls, fields=None, expand=(), model=None):
+        """Возвращает связи, которые нужно загрузить для выбранной проекции"""
+        model = model or cls.Meta.model
+        expandable = cls.get_expandable_fields()
+        select_related, prefetch_related = set(), set()
+        for name, (select, prefetch) in getattr(cls.Meta, 'related_fields', {}).items():
+            if name not in expand and (fields is None or name in fields):
+                select_related.update(select)
+                prefetch_related.update(prefetch)
+        for name in set(expand) & set(expandable):
+            _, select, prefetch = expandable[name]
+            select_related.update(select)
+            prefetch_related.update(prefetch)
+        prefetch_related = sorted(
+            prefetch_related, key=lambda lookup: lookup if isinstance(lookup, str) else lookup.__name__
+        )
+        return sorted(select_related), [
+            lookup if isinstance(lookup, str) else lookup(model) for lookup in prefetch_related
+        ]
+    
+    @classmethod
+    def get_annotations(cls, fields=None, model=None):
+        """Возвращает аннотации queryset для выбранной проекции"""
+        model = model or cls.Meta.model
+        annotations = {}
+        for name, factory in getattr(cls.Meta, 'annotated_fields', {}).items():
+            if fields is None or name in fields:
+                annotations.update(factory(model))
+        return annotations
+
+
+class BatchedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    При пакетной валидации берёт объекты из context['related_objects'][имя поля],
+    загруженных заранее одним запросом, вместо запроса на каждую строку.
+    """
+    
+    def to_internal_value(self, data):
+        objects = self.context.get('related_objects', {}).get(self.field_name)
+        if objects is None:
+            return super().to_internal_value(data)
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            pk = int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if pk not in objects:
+            self.fail('does_not_exist', pk_value=data)
+        return objects[pk]
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -15,6 +119,14 @@ class UserSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
+class UserCompactSerializer(serializers.ModelSerializer):
+    """Краткое представление пользователя"""
+    class Meta:
+        model = User
+        fields = ['id', 'username']
+        read_only_fields = fields
+
+
 class UserProfileSerializer(serializers.ModelSerializer):
     """Сериализатор для профиля пользователя"""
     user = UserSerializer(read_only=True)
@@ -29,14 +141,31 @@ class TaskListSerializer(serializers.ModelSerializer):
     """Сериализатор для списка задач"""
     created_by = UserSerializer(read_only=True)
     task_count = serializers.SerializerMethodField()
+    open_task_count = serializers.SerializerMethodField()
     
     class Meta:
         model = TaskList
-        fields = ['id', 'name', 'description', 'created_by', 'created_at', 'updated_at', 'task_count']
+        fields = [
+            'id', 'name', 'description', 'created_by', 'created_at', 'updated_at',
+            'task_count', 'open_task_count'
+        ]
         read_only_fields = ['id', 'created_at', 'updated_at']
     
+    # Счётчики берутся из аннотации queryset, а при её отсутствии
+    # (например, во вложенном представлении задачи) — из денормализованных полей
     def get_task_count(self, obj):
-        return obj.tasks.count()
+        return getattr(obj, 'annotated_task_count', obj.task_count)
+    
+    def get_open_task_count(self, obj):
+        return getattr(obj, 'annotated_open_task_count', obj.open_task_count)
+
+
+class TaskListCompactSerializer(serializers.ModelSerializer):
+    """Краткое представление списка задач"""
+    class Meta:
+        model = TaskList
+        fields = ['id', 'name']
+        read_only_fields = fields
 
 
 class TaskCommentSerializer(serializers.ModelSerializer):
@@ -49,12 +178,17 @@ class TaskCommentSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'author', 'created_at']
 
 
-class TaskSerializer(serializers.ModelSerializer):
-    """Сериализатор для задач"""
+class TaskSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
+    """
+    Сериализатор для задач.
+    Вместо всех комментариев выводит их количество и последние
+    LATEST_COMMENTS_COUNT; полный список — в /tasks/{id}/comments/.
+    """
     assigned_to = UserSerializer(read_only=True)
     created_by = UserSerializer(read_only=True)
     task_list = TaskListSerializer(read_only=True)
-    comments = TaskCommentSerializer(many=True, read_only=True)
+    comment_count = serializers.SerializerMethodField()
+    latest_comments = serializers.SerializerMethodField()
     is_overdue = serializers.SerializerMethodField()
     
     class Meta:
@@ -62,9 +196,68 @@ class TaskSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'title', 'description', 'task_list', 'assigned_to', 'created_by',
             'priority', 'status', 'due_date', 'created_at', 'updated_at',
-            'completed_at', 'is_overdue', 'comments'
+            'completed_at', 'is_overdue', 'is_archived', 'comment_count', 'latest_comments'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at', 'completed_at']
+        related_fields = {
+            'task_list': (['task_list__created_by'], []),
+            'assigned_to': (['assigned_to'], []),
+            'created_by': (['created_by'], []),
+            'latest_comments': ([], [latest_comments_prefetch]),
+        }
+        annotated_fields = {
+            'comment_count': comment_count_annotation,
+        }
+    
+    def get_is_overdue(self, obj):
+        return obj.is_overdue()
+    
+    # Значения берутся из аннотации и ограниченной подгрузки queryset, а при
+    # их отсутствии (задача после создания или изменения) — отдельным запросом
+    def get_comment_count(self, obj):
+        count = getattr(obj, 'comment_count', None)
+        return obj.comments.count() if count is None else count
+    
+    def get_latest_comments(self, obj):
+        comments = getattr(obj, 'latest_comments', None)
+        if comments is None:
+            comments = obj.comments.select_related('author').order_by(
+                '-created_at', '-id'
+            )[:LATEST_COMMENTS_COUNT]
+        return TaskCommentSerializer(comments, many=True).data
+
+
+class TaskCompactSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
+    """
+    Компактное представление задачи для списков.
+    Связанные объекты выводятся кратко, полные версии доступны через ?expand=.
+    """
+    assigned_to = UserCompactSerializer(read_only=True)
+    created_by = UserCompactSerializer(read_only=True)
+    task_list = TaskListCompactSerializer(read_only=True)
+    is_overdue = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = Task
+        fields = [
+            'id', 'title', 'description', 'task_list', 'assigned_to', 'created_by',
+            'priority', 'status', 'due_date', 'created_at', 'updated_at',
+            'completed_at', 'is_overdue', 'is_archived'
+        ]
+        read_only_fields = fields
+        related_fields = {
+            'task_list': (['task_list'], []),
+            'assigned_to': (['assigned_to'], []),
+            'created_by': (['created_by'], []),
+        }
+        expandable_fields = {
+            'task_list': (lambda: TaskListSerializer(read_only=True), ['task_list__created_by'], []),
+            'assigned_to': (lambda: UserSerializer(read_only=True), ['assigned_to'], []),
+            'created_by': (lambda: UserSerializer(read_only=True), ['created_by'], []),
+            'latest_comments': (
+                lambda: TaskCommentSerializer(many=True, read_only=True), [], [latest_comments_prefetch]
+            ),
+        }
     
     def get_is_overdue(self, obj):
         return obj.is_overdue()
@@ -72,6 +265,8 @@ class TaskSerializer(serializers.ModelSerializer):
 
 class TaskCreateSerializer(serializers.ModelSerializer):
     """Сериализатор для создания задач"""
+    serializer_related_field = BatchedPrimaryKeyRelatedField
+    
     class Meta:
         model = Task
         fields = ['title', 'description', 'task_list', 'assigned_to', 'priority', 'due_date']
@@ -79,6 +274,21 @@ class TaskCreateSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         validated_data['created_by'] = self.context['request'].user
         return super().create(validated_data)
+    
+    @classmethod
+    def load_related_objects(cls, rows):
+        """Загружает связанные объекты всех строк пакета: по запросу на поле"""
+        related_objects = {}
+        for name, field in cls().fields.items():
+            if not isinstance(field, BatchedPrimaryKeyRelatedField):
+                continue
+            ids = set()
+            for row in rows if isinstance(rows, list) else []:
+                value = row.get(name) if isinstance(row, dict) else None
+                if isinstance(value, (int, str)) and str(value).isdigit():
+                    ids.add(int(value))
+            related_objects[name] = field.get_queryset().in_bulk(ids)
+        return related_objects
 
 
 class TaskUpdateSerializer(serializers.ModelSerializer):
@@ -92,3 +302,23 @@ class TaskUpdateSerializer(serializers.ModelSerializer):
         if validated_data.get('status') == 'completed' and instance.status != 'completed':
             instance.completed_at = timezone.now()
         return super().update(instance, validated_data)
+
+
+class UserTaskStatsSerializer(serializers.ModelSerializer):
+    """Счётчики задач пользователя"""
+    class Meta:
+        model = UserTaskStats
+        fields = [
+            'open_count', 'overdue_count', 'due_today_count', 'completed_week_count', 'day', 'counted_at', 'updated_at',
+        ]
+        read_only_fields = fields
+
+
+class TaskBulkSerializer(serializers.Serializer):
+    """Сериализатор для массового обновления задач"""
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=BULK_BATCH_SIZE,
+    )
+    changes = serializers.DictField(required=False, default=dict)
@@ -0,0 +1,154 @@
+"""
+Signal handlers for task management application.
+"""
+from django.contrib.auth.models import User
+from django.db.models import QuerySet
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from . import versions, search, events
+from .models import Task, TaskList, TaskComment, TaskSearchDocument, Tombstone, UserTaskStats
+
+
+def is_cascade_from(kwargs, *models):
+    """Удаление выполняется каскадом от объекта (или выборки) одной из моделей models"""
+    origin = kwargs.get('origin')
+    if origin is None:
+        return False
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return issubclass(model, models)
+
+
+def get_cascade_task_list_ids(origin):
+    """
+    Списки удаляемого пользователя origin: их задачи удаляются тем же каскадом.
+    Результат запоминается на origin, чтобы не повторять запрос для каждой задачи
+    """
+    task_list_ids = getattr(origin, '_cascade_task_list_ids', None)
+    if task_list_ids is None:
+        owners = origin if isinstance(origin, QuerySet) else [origin.pk]
+        task_list_ids = set(TaskList.objects.filter(created_by__in=owners).values_list('pk', flat=True))
+        origin._cascade_task_list_ids = task_list_ids
+    return task_list_ids
+
+
+@receiver(post_delete, sender=Task)
+def decrement_task_list_counters(sender, instance, **kwargs):
+    """Уменьшает счётчики списка при удалении задачи (в т.ч. каскадном)"""
+    # Список удаляется тем же каскадом - счётчики обновлять незачем
+    if is_cascade_from(kwargs, TaskList):
+        return
+    state = instance.get_loaded_state()
+    if is_cascade_from(kwargs, User) and state['task_list_id'] in get_cascade_task_list_ids(kwargs['origin']):
+        return
+    TaskList.adjust_counters(
+        state['task_list_id'],
+        total=-1,
+        open_tasks=-int(state['status'] in Task.OPEN_STATUSES),
+        owner_id=instance.get_task_list_owner_id(),
+    )
+
+
+def get_task_user_ids(task):
+    """Пользователи, чьи данные затрагивает изменение задачи"""
+    user_ids = {task.assigned_to_id, task.created_by_id}
+    previous_state = getattr(task, '_previous_state', None)
+    if previous_state:
+        # При переназначении затронут и прежний исполнитель
+        user_ids.add(previous_state['assigned_to_id'])
+    return user_ids
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+def bump_task_versions(sender, instance, **kwargs):
+    versions.bump_version(versions.TASKS, get_task_user_ids(instance))
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+def publish_task_list_changes(sender, instance, **kwargs):
+    """Подписчики списка получают изменённую задачу; при переносе — и подписчики прежнего списка"""
+    task_list_ids = {instance.task_list_id}
+    previous_state = getattr(instance, '_previous_state', None)
+    if previous_state:
+        task_list_ids.add(previous_state['task_list_id'])
+    events.publish_list_changes((task_list_id, instance.pk) for task_list_id in task_list_ids)
+
+
+@receiver(post_delete, sender=Task)
+def record_task_tombstone(sender, instance, **kwargs):
+    Tombstone.record('task', instance.pk, get_task_user_ids(instance))
+
+
+@receiver(post_save, sender=Task)
+def record_reassignment_tombstone(sender, instance, created, **kwargs):
+    """Переназначенная задача пропадает из выборки прежнего исполнителя"""
+    previous_state = getattr(instance, '_previous_state', None)
+    if created or not previous_state:
+        return
+    old_assignee_id = previous_state['assigned_to_id']
+    if old_assignee_id not in (instance.assigned_to_id, instance.created_by_id):
+        Tombstone.record('task', instance.pk, [old_assignee_id])
+
+
+@receiver(post_save, sender=Task)
+def update_user_task_stats(sender, instance, created, **kwargs):
+    UserTaskStats.apply_task_change(
+        None if created else getattr(instance, '_previous_state', None),
+        instance.get_tracked_state(),
+    )
+
+
+@receiver(post_delete, sender=Task)
+def decrement_user_task_stats(sender, instance, **kwargs):
+    UserTaskStats.apply_task_change(instance.get_loaded_state(), None)
+
+
+@receiver(post_save, sender=Task)
+def update_task_search_document(sender, instance, **kwargs):
+    search.update_search_documents([instance.pk])
+
+
+@receiver(post_delete, sender=Task)
+def delete_task_search_document(sender, instance, **kwargs):
+    if search.is_full_text_supported():
+        TaskSearchDocument.objects.filter(task_id=instance.pk).delete()
+
+
+@receiver(post_save, sender=TaskComment)
+@receiver(post_delete, sender=TaskComment)
+def update_comment_task_search_document(sender, instance, **kwargs):
+    # Вектор удаляемой задачи удаляется вместе с ней; векторы задач с
+    # комментариями удалённого пользователя обновятся при следующем изменении
+    # задачи или командой rebuild_search_index
+    if is_cascade_from(kwargs, Task, TaskList, User):
+        return
+    search.schedule_search_documents([instance.task_id])
+
+
+@receiver(post_save, sender=TaskComment)
+@receiver(post_delete, sender=TaskComment)
+def bump_comment_task_versions(sender, instance, **kwargs):
+    # При удалении задачи или списка версии тех же пользователей обновляет обработчик задачи
+    if is_cascade_from(kwargs, Task, TaskList):
+        return
+    if TaskComment.task.is_cached(instance):
+        user_ids = [instance.task.assigned_to_id, instance.task.created_by_id]
+    else:
+        user_ids = Task.objects.filter(pk=instance.task_id).values_list('assigned_to_id', 'created_by_id').first()
+    if user_ids:
+        versions.bump_version(versions.TASKS, user_ids)
+
+
+@receiver(post_save, sender=TaskList)
+@receiver(post_delete, sender=TaskList)
+def bump_task_list_versions(sender, instance, created=False, **kwargs):
+    versions.bump_version(versions.TASK_LISTS, [instance.created_by_id])
+    if kwargs['signal'] is post_save and not created:
+        # Название списка выводится вместе с задачами
+        user_ids = set()
+        for assigned_to_id, created_by_id in Task.objects.filter(task_list=instance).values_list(
+            'assigned_to_id', 'created_by_id'
+        ).distinct():
+            user_ids.update((assigned_to_id, created_by_id))
+        versions.bump_version(versions.TASKS, user_ids)
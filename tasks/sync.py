@@ -0,0 +1,86 @@
+"""
+Incremental (delta) synchronization for task and notification clients.
+
+Клиент передаёт курсор из предыдущего ответа в ?since= и получает только
+изменённые с тех пор объекты (upserted) и идентификаторы объектов,
+пропавших из его выборки (deleted). Клиент применяет сначала deleted,
+затем upserted. Первый запрос без ?since= выполняет полную загрузку.
+"""
+import base64
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+from .models import Tombstone
+
+SYNC_BATCH_SIZE = 500
+# Запас на транзакции, зафиксированные позже момента своей записи
+SYNC_OVERLAP = timedelta(seconds=5)
+
+
+class SyncCursorExpired(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = 'Курсор синхронизации устарел, выполните полную загрузку.'
+    default_code = 'sync_cursor_expired'
+
+
+def get_tombstone_retention():
+    return timedelta(days=getattr(settings, 'SYNC_TOMBSTONE_RETENTION_DAYS', 30))
+
+
+def encode_cursor(timestamp, last_id=0):
+    microseconds = int(timestamp.timestamp() * 1_000_000)
+    return base64.urlsafe_b64encode(f'{microseconds}:{last_id}'.encode()).decode()
+
+
+def decode_cursor(value, param='since'):
+    try:
+        microseconds, last_id = base64.urlsafe_b64decode(value.encode()).decode().split(':')
+        timestamp = datetime.fromtimestamp(int(microseconds) / 1_000_000, tz=dt_timezone.utc)
+        return timestamp, int(last_id)
+    except (ValueError, UnicodeError):
+        raise ValidationError({param: ['Некорректный курсор']})
+
+
+def get_changes(queryset, user, object_type, since, serialize):
+    """
+    Возвращает изменения queryset после курсора since.
+    serialize — функция, превращающая список объектов в данные ответа.
+    """
+    started_at = timezone.now()
+    deleted = []
+    if since:
+        timestamp, last_id = decode_cursor(since)
+        if timestamp < started_at - get_tombstone_retention():
+            raise SyncCursorExpired()
+        queryset = queryset.filter(Q(updated_at__gt=timestamp) | Q(updated_at=timestamp, id__gt=last_id))
+        deleted = sorted(set(
+            Tombstone.objects.filter(
+                user_id=user.id, object_type=object_type, deleted_at__gte=timestamp
+            ).values_list('object_id', flat=True)
+        ))
+
+    rows = list(queryset.order_by('updated_at', 'id')[:SYNC_BATCH_SIZE + 1])
+    has_more = len(rows) > SYNC_BATCH_SIZE
+    rows = rows[:SYNC_BATCH_SIZE]
+    if has_more:
+        cursor = encode_cursor(rows[-1].updated_at, rows[-1].id)
+    else:
+        cursor = encode_cursor(started_at - SYNC_OVERLAP)
+
+    return {
+        'cursor': cursor,
+        'has_more': has_more,
+        'upserted': serialize(rows),
+        'deleted': deleted,
+    }
+
+
+def prune_tombstones():
+    """Удаляет записи об удалении старше срока хранения"""
+    deleted, _ = Tombstone.objects.filter(deleted_at__lt=timezone.now() - get_tombstone_retention()).delete()
+    return deleted
@@ -0,0 +1,45 @@
+"""
+Celery tasks for task management application.
+"""
+from celery import shared_task
+import logging
+
+from .models import UserTaskStats
+from . import sync, archive
+
+STATS_RECONCILE_BATCH_SIZE = 1000
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def prune_sync_tombstones():
+    """
+    Удаляет устаревшие записи об удалении объектов
+    """
+    deleted = sync.prune_tombstones()
+    logger.info(f"Pruned {deleted} sync tombstones")
+    return f"Pruned {deleted} sync tombstones"
+
+
+@shared_task
+def archive_finished_tasks():
+    """
+    Переносит в архив давно завершённые и отменённые задачи
+    """
+    archived = archive.archive_tasks()
+    logger.info(f"Archived {archived} finished tasks")
+    return f"Archived {archived} finished tasks"
+
+
+@shared_task
+def reconcile_task_stats():
+    """
+    Сверяет счётчики задач пользователей с фактическими данными
+    """
+    user_ids = list(UserTaskStats.objects.order_by('user_id').values_list('user_id', flat=True))
+    corrected = 0
+    for start in range(0, len(user_ids), STATS_RECONCILE_BATCH_SIZE):
+        corrected += UserTaskStats.recalculate(user_ids[start:start + STATS_RECONCILE_BATCH_SIZE])
+    logger.info(f"Reconciled task stats for {len(user_ids)} users, corrected {corrected}")
+    return f"Reconciled task stats for {len(user_ids)} users, corrected {corrected}"
@@ -0,0 +1,116 @@
+"""
+Tests for the task management application.
+"""
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+
+from .models import Task, TaskComment, TaskList, UserTaskStats
+
+
+class UserTaskStatsTests(TestCase):
+    """Счётчики задач пользователя при изменениях задач"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('user', password='password')
+        self.task_list = TaskList.objects.create(name='Список', created_by=self.user)
+
+    def create_task(self, **fields):
+        return Task.objects.create(
+            title='Задача', task_list=self.task_list, assigned_to=self.user, created_by=self.user, **fields
+        )
+
+    def test_completed_after_due_time(self):
+        """Задача, просрочившаяся после расчёта счётчиков, не уводит их в минус при выполнении"""
+        now = timezone.now()
+        task = self.create_task(due_date=now + timedelta(minutes=30))
+        stats = UserTaskStats.get_for_user(self.user.id)
+        self.assertEqual((stats.open_count, stats.overdue_count), (1, 0))
+
+        later = now + timedelta(hours=1)
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            task = Task.objects.get(pk=task.pk)
+            task.status = 'completed'
+            task.completed_at = later
+            task.save()
+
+        stats = UserTaskStats.objects.get(user=self.user)
+        self.assertEqual((stats.open_count, stats.overdue_count), (0, 0))
+
+    def test_overdue_counted_by_scanner(self):
+        """Сканер просроченных задач учитывает задачи, просрочившиеся после расчёта"""
+        now = timezone.now()
+        task = self.create_task(due_date=now + timedelta(minutes=30))
+        UserTaskStats.get_for_user(self.user.id)
+
+        later = now + timedelta(hours=1)
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            UserTaskStats.recalculate_due_counters()
+            stats = UserTaskStats.objects.get(user=self.user)
+            self.assertEqual(stats.overdue_count, 1)
+
+            task = Task.objects.get(pk=task.pk)
+            task.status = 'completed'
+            task.completed_at = later
+            task.save()
+
+        stats = UserTaskStats.objects.get(user=self.user)
+        self.assertEqual((stats.open_count, stats.overdue_count), (0, 0))
+
+
+class CommentSearchDocumentTests(TestCase):
+    """Пересчёт поисковых векторов при изменении комментариев"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('user', password='password')
+        self.task_list = TaskList.objects.create(name='Список', created_by=self.user)
+        self.task = Task.objects.create(
+            title='Задача', task_list=self.task_list, assigned_to=self.user, created_by=self.user
+        )
+
+    @mock.patch('tasks.search.is_full_text_supported', return_value=True)
+    @mock.patch('tasks.search.update_search_documents')
+    def test_rebuilt_once_per_transaction(self, update_search_documents, is_full_text_supported):
+        """Несколько комментариев одной транзакции пересчитывают вектор задачи один раз"""
+        with self.captureOnCommitCallbacks(execute=True):
+            for text in ('Первый', 'Второй', 'Третий'):
+                TaskComment.objects.create(task=self.task, author=self.user, content=text)
+            TaskComment.objects.filter(task=self.task).first().delete()
+        update_search_documents.assert_called_once_with({self.task.id})
+
+    @mock.patch('tasks.search.schedule_search_documents')
+    def test_task_delete_skips_comments(self, schedule_search_documents):
+        """Каскадное удаление комментариев вместе с задачей не пересчитывает вектор"""
+        TaskComment.objects.create(task=self.task, author=self.user, content='Комментарий')
+        schedule_search_documents.reset_mock()
+        self.task.delete()
+        schedule_search_documents.assert_not_called()
+
+
+class TaskListCountersTests(TestCase):
+    """Денормализованные счётчики списка при каскадном удалении задач"""
+
+    def setUp(self):
+        self.owner = User.objects.create_user('owner', password='password')
+        self.assignee = User.objects.create_user('assignee', password='password')
+        self.task_list = TaskList.objects.create(name='Список', created_by=self.owner)
+        for assigned_to in (self.owner, self.assignee, self.assignee):
+            Task.objects.create(
+                title='Задача', task_list=self.task_list, assigned_to=assigned_to, created_by=self.owner
+            )
+
+    def test_assignee_delete(self):
+        """Удаление исполнителя уменьшает счётчики чужого списка"""
+        self.assignee.delete()
+        self.task_list.refresh_from_db()
+        self.assertEqual((self.task_list.task_count, self.task_list.open_task_count), (1, 1))
+
+    def test_owner_delete_skips_counters(self):
+        """Удаление владельца не обновляет счётчики удаляемого вместе с ним списка"""
+        with mock.patch.object(TaskList, 'adjust_counters') as adjust_counters:
+            self.owner.delete()
+        adjust_counters.assert_not_called()
+        self.assertFalse(TaskList.objects.exists())
@@ -0,0 +1,72 @@
+"""
+Throttling of WebSocket work.
+
+TokenBucket ограничивает входящие сообщения одного соединения: ведро
+вмещает burst жетонов и пополняется со скоростью rate жетонов в секунду,
+сообщение расходует жетоны по своей стоимости. SharedResults объединяет
+одновременные одинаковые запросы процесса (например, get_tasks из
+нескольких вкладок пользователя) в один и недолго переиспользует результат.
+"""
+import asyncio
+import time
+
+
+class TokenBucket:
+    """Ведро жетонов одного соединения"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+
+    def consume(self, cost=1):
+        """
+        Расходует cost жетонов. Возвращает 0, если жетонов хватило, иначе —
+        через сколько секунд их станет достаточно (жетоны не расходуются).
+        """
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0
+        return (cost - self.tokens) / self.rate
+
+
+class SharedResults:
+    """
+    Результаты асинхронных вычислений по ключу: пока вычисление выполняется,
+    остальные вызовы с тем же ключом ждут его; готовый результат
+    переиспользуется ttl секунд. Ключ должен включать всё, от чего зависит
+    результат (например, маркер версии данных).
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.pending = {}
+        self.results = {}
+
+    async def get(self, key, producer):
+        now = time.monotonic()
+        cached = self.results.get(key)
+        if cached is not None and cached[1] > now:
+            return cached[0]
+
+        future = self.pending.get(key)
+        if future is None:
+            future = asyncio.ensure_future(producer())
+            self.pending[key] = future
+            future.add_done_callback(lambda done: self._store(key, done))
+        # Отмена одного ожидающего (закрытое соединение) не отменяет вычисление для остальных
+        return await asyncio.shield(future)
+
+    def _store(self, key, future):
+        self.pending.pop(key, None)
+        if future.cancelled() or future.exception() is not None:
+            return
+        now = time.monotonic()
+        self.results = {
+            cached_key: cached for cached_key, cached in self.results.items() if cached[1] > now
+        }
+        self.results[key] = (future.result(), now + self.ttl)
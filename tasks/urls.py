@@ -3,14 +3,17 @@ URL configuration for tasks app.
 """
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import views, async_views
 
 router = DefaultRouter()
-router.register(r'task-lists', views.TaskListViewSet)
-router.register(r'tasks', views.TaskViewSet)
-router.register(r'users', views.UserViewSet)
-router.register(r'profiles', views.UserProfileViewSet)
+router.register(r'task-lists', views.TaskListViewSet, basename='tasklist')
+router.register(r'tasks', views.TaskViewSet, basename='task')
+router.register(r'users', views.UserViewSet, basename='user')
+router.register(r'profiles', views.UserProfileViewSet, basename='userprofile')
 
 urlpatterns = [
+    # Асинхронные эндпоинты чтения (см. async_views); маршруты роутера ниже
+    path('tasks/my_tasks/', async_views.my_tasks, name='task-my-tasks'),
+    path('tasks/overdue_tasks/', async_views.overdue_tasks, name='task-overdue-tasks'),
     path('', include(router.urls)),
 ]
@@ -0,0 +1,73 @@
+"""
+Per-user version markers for cached and conditional responses.
+
+Каждая область данных пользователя (задачи, списки задач, уведомления)
+имеет маркер версии в кэше. Любая запись, затрагивающая пользователя,
+меняет маркер, поэтому по нему можно дешёво проверить, изменились ли
+данные, не выполняя запросов к базе.
+"""
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from task_manager import db_router
+from . import events
+
+TASKS = 'tasks'
+TASK_LISTS = 'task_lists'
+NOTIFICATIONS = 'notifications'
+
+# Маркеры живут дольше любых производных записей кэша
+VERSION_TIMEOUT = 60 * 60 * 24 * 7
+
+
+def _version_key(scope, user_id):
+    return f'version:{scope}:{user_id}'
+
+
+def get_version(scope, user_id):
+    """Возвращает текущий маркер версии, создавая его при отсутствии"""
+    key = _version_key(scope, user_id)
+    version = cache.get(key)
+    if version is None:
+        # Маркер из времени не повторяет значения, выданные до вытеснения из кэша
+        version = time.time_ns()
+        if not cache.add(key, version, VERSION_TIMEOUT):
+            version = cache.get(key, version)
+    return version
+
+
+async def aget_version(scope, user_id):
+    """Асинхронный вариант get_version"""
+    key = _version_key(scope, user_id)
+    version = await cache.aget(key)
+    if version is None:
+        version = time.time_ns()
+        if not await cache.aadd(key, version, VERSION_TIMEOUT):
+            version = await cache.aget(key, version)
+    return version
+
+
+def _set_versions(scope, user_ids):
+    version = time.time_ns()
+    cache.set_many({_version_key(scope, user_id): version for user_id in user_ids}, VERSION_TIMEOUT)
+    # Ответы для новой версии должны строиться по свежим данным, а не по
+    # отстающей реплике
+    db_router.pin_to_primary(user_ids)
+
+
+def bump_version(scope, user_ids):
+    """
+    Сменяет маркеры версии для указанных пользователей.
+    Внутри транзакции маркер меняется повторно после фиксации, чтобы
+    ответ, построенный по ещё не зафиксированным данным, не пережил запись.
+    """
+    user_ids = {user_id for user_id in user_ids if user_id}
+    if not user_ids:
+        return
+    _set_versions(scope, user_ids)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _set_versions(scope, user_ids))
+    if scope == TASKS:
+        # Открытые WebSocket-соединения досылают изменения (после фиксации)
+        events.publish_changes(user_ids)
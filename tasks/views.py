@@ -4,55 +4,149 @@ Views for task management API.
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from rest_framework.generics import get_object_or_404
 from django.contrib.auth.models import User
 from django.utils import timezone
-from django.db.models import Q
-from .models import TaskList, Task, TaskComment, UserProfile
+from django.db import transaction
+from django.http import Http404, StreamingHttpResponse
+from django.db.models import Q, Count, Case, When, Value, F
+from collections import Counter, defaultdict
+from .models import TaskList, Task, TaskComment, UserProfile, Tombstone, ArchivedTask, UserTaskStats
 from .serializers import (
-    TaskListSerializer, TaskSerializer, TaskCreateSerializer, 
-    TaskUpdateSerializer, TaskCommentSerializer, UserSerializer, UserProfileSerializer
+    TaskListSerializer, TaskSerializer, TaskCompactSerializer, TaskCreateSerializer,
+    TaskUpdateSerializer, TaskCommentSerializer, TaskBulkSerializer, UserSerializer,
+    UserProfileSerializer, UserTaskStatsSerializer, BULK_BATCH_SIZE
 )
 from .permissions import IsOwnerOrAssigned
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
+from .mixins import SparseFieldsetMixin, ConditionalGetMixin, ReplicaReadMixin
+from . import versions, response_cache, sync, search, events, presence
+from .pagination import TaskCursorPagination, SearchPagination
+from .filters import TaskFilterBackend, parse_choice
+from .archive import ARCHIVE_MODES, MergedQuerySet
+from .export import export_response, get_export_format, is_asgi_request
+from .importer import TaskImporter, IMPORT_FORMATS, read_rows
 
 
-class TaskListViewSet(viewsets.ModelViewSet):
+class TaskListViewSet(ReplicaReadMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     """ViewSet для управления списками задач"""
     serializer_class = TaskListSerializer
     permission_classes = [IsAuthenticated]
+    etag_scopes = {
+        'list': versions.TASK_LISTS,
+        'retrieve': versions.TASK_LISTS,
+    }
     
     def get_queryset(self):
         # Пользователь видит только свои списки задач
-        return TaskList.objects.filter(created_by=self.request.user)
+        return TaskList.objects.filter(created_by=self.request.user).select_related('created_by').annotate(
+            annotated_task_count=Count('tasks'),
+            annotated_open_task_count=Count('tasks', filter=Q(tasks__status__in=Task.OPEN_STATUSES)),
+        ).order_by('-created_at', '-id')
     
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
 
 
-class TaskViewSet(viewsets.ModelViewSet):
+class TaskViewSet(ReplicaReadMixin, ConditionalGetMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
     """ViewSet для управления задачами"""
     permission_classes = [IsAuthenticated, IsOwnerOrAssigned]
+    pagination_class = TaskCursorPagination
+    filter_backends = [TaskFilterBackend]
+    etag_scopes = {
+        'list': versions.TASKS,
+        'retrieve': versions.TASKS,
+        'sync': versions.TASKS,
+        'search': versions.TASKS,
+        'facets': versions.TASKS,
+        'comments': versions.TASKS,
+        'stats': versions.TASKS,
+    }
+    # is_overdue и overdue_tasks зависят от текущего времени
+    etag_time_bucket = 60
+    # Отдельная пагинация для действий с другим порядком сортировки
+    action_pagination_classes = {
+        'search': SearchPagination,
+    }
+    
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            pagination_class = self.action_pagination_classes.get(self.action, self.pagination_class)
+            self._paginator = pagination_class() if pagination_class else None
+        return self._paginator
+    
+    # Действия, возвращающие списки задач в компактном представлении
+    list_actions = ['list', 'sync', 'search']
+    # Действия чтения, которым доступен архив: ?archived=include|only
+    archive_actions = ['list', 'retrieve', 'comments']
+    # Колонки потоковой выгрузки
+    export_fields = (
+        'id', 'title', 'description', 'status', 'priority', 'due_date',
+        'task_list_id', 'task_list__name', 'assigned_to_id', 'assigned_to__username',
+        'created_by_id', 'created_by__username', 'created_at', 'updated_at', 'completed_at',
+    )
     
     def get_serializer_class(self):
         if self.action == 'create':
             return TaskCreateSerializer
         elif self.action in ['update', 'partial_update']:
             return TaskUpdateSerializer
+        elif self.action in self.list_actions:
+            return TaskCompactSerializer
+        elif self.action in ['comments', 'add_comment']:
+            return TaskCommentSerializer
         return TaskSerializer
     
-    def get_queryset(self):
+    def get_base_queryset(self):
         user = self.request.user
         # Пользователь видит задачи, где он исполнитель или создатель
-        return Task.objects.filter(
-            Q(assigned_to=user) | Q(created_by=user)
-        ).select_related('assigned_to', 'created_by', 'task_list').prefetch_related('comments__author')
+        return Task.objects.filter(Q(assigned_to=user) | Q(created_by=user))
+    
+    def get_queryset(self):
+        return self.apply_projection(self.get_base_queryset())
+    
+    def get_archive_mode(self):
+        if self.action not in self.archive_actions:
+            return None
+        return parse_choice(self.request, 'archived', ARCHIVE_MODES)
+    
+    def get_archived_queryset(self):
+        user = self.request.user
+        return self.apply_projection(ArchivedTask.objects.filter(Q(assigned_to=user) | Q(created_by=user)))
+    
+    def get_object(self):
+        """При ?archived= задача, не найденная среди текущих, ищется в архиве"""
+        archive_mode = self.get_archive_mode()
+        if archive_mode != 'only':
+            try:
+                return super().get_object()
+            except Http404:
+                if archive_mode is None:
+                    raise
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        task = get_object_or_404(
+            self.filter_queryset(self.get_archived_queryset()),
+            **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        )
+        self.check_object_permissions(self.request, task)
+        return task
+    
+    def list(self, request, *args, **kwargs):
+        """Список задач; с ?archived=include — вместе с архивными, с ?archived=only — только архив"""
+        archive_mode = self.get_archive_mode()
+        if archive_mode is None:
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_archived_queryset())
+        if archive_mode == 'include':
+            queryset = MergedQuerySet([self.filter_queryset(self.get_queryset()), queryset])
+        return self._paginated_response(queryset)
     
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
         # Отправляем уведомление через WebSocket
-        self._send_websocket_notification(serializer.instance, 'task_created')
+        events.publish_task(serializer.instance, 'task_created')
     
     def perform_update(self, serializer):
         old_status = self.get_object().status
@@ -60,7 +154,7 @@ class TaskViewSet(viewsets.ModelViewSet):
         
         # Если статус изменился, отправляем уведомление
         if old_status != instance.status:
-            self._send_websocket_notification(instance, 'task_updated')
+            events.publish_task(instance, 'task_updated')
     
     @action(detail=True, methods=['post'])
     def mark_completed(self, request, pk=None):
@@ -69,92 +163,284 @@ class TaskViewSet(viewsets.ModelViewSet):
         task.mark_completed()
         
         # Отправляем уведомление через WebSocket
-        self._send_websocket_notification(task, 'task_completed')
+        events.publish_task(task, 'task_completed')
         
         return Response({'status': 'Task marked as completed'})
     
+    @action(detail=True, methods=['get'])
+    def comments(self, request, pk=None):
+        """Комментарии задачи постранично, начиная с новых"""
+        task = self.get_object()
+        return self._paginated_response(task.comments.select_related('author'))
+    
     @action(detail=True, methods=['post'])
     def add_comment(self, request, pk=None):
-        """Добавить комментарий к задаче"""
+        """Добавить комментарий к задаче; в ответе — только новый комментарий"""
         task = self.get_object()
-        serializer = TaskCommentSerializer(data=request.data)
+        serializer = self.get_serializer(data=request.data)
         
         if serializer.is_valid():
             serializer.save(task=task, author=request.user)
             
             # Отправляем уведомление через WebSocket
-            self._send_websocket_notification(task, 'comment_added')
+            events.publish_task(task, 'comment_added')
             
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
     @action(detail=False, methods=['get'])
-    def my_tasks(self, request):
-        """Получить задачи, назначенные текущему пользователю"""
-        tasks = self.get_queryset().filter(assigned_to=request.user)
-        serializer = self.get_serializer(tasks, many=True)
-        return Response(serializer.data)
+    def facets(self, request):
+        """Счётчики задач пользователя по статусу, приоритету, просрочке и спискам"""
+        data = response_cache.get_or_set(
+            versions.TASKS,
+            request.user.id,
+            'facets',
+            lambda: self._get_facets(request.user),
+            time_bucket=self.etag_time_bucket,
+        )
+        return Response(data)
     
-    @action(detail=False, methods=['get'])
-    def overdue_tasks(self, request):
-        """Получить просроченные задачи"""
+    def _get_facets(self, user):
+        """Считает все счётчики одним агрегирующим запросом с группировкой по спискам"""
         now = timezone.now()
-        tasks = self.get_queryset().filter(
-            due_date__lt=now,
-            status__in=['pending', 'in_progress']
+        aggregates = {'total': Count('id')}
+        for value, _ in Task.STATUS_CHOICES:
+            aggregates[f'status_{value}'] = Count('id', filter=Q(status=value))
+        for value, _ in Task.PRIORITY_CHOICES:
+            aggregates[f'priority_{value}'] = Count('id', filter=Q(priority=value))
+        aggregates['overdue'] = Count('id', filter=Q(due_date__lt=now, status__in=Task.OPEN_STATUSES))
+        
+        rows = Task.objects.filter(assigned_to=user).order_by().values(
+            'task_list_id', 'task_list__name'
+        ).annotate(**aggregates)
+        
+        facets = {
+            'total': 0,
+            'overdue': 0,
+            'status': {value: 0 for value, _ in Task.STATUS_CHOICES},
+            'priority': {value: 0 for value, _ in Task.PRIORITY_CHOICES},
+            'task_lists': [],
+        }
+        for row in rows:
+            facets['total'] += row['total']
+            facets['overdue'] += row['overdue']
+            for value in facets['status']:
+                facets['status'][value] += row[f'status_{value}']
+            for value in facets['priority']:
+                facets['priority'][value] += row[f'priority_{value}']
+            facets['task_lists'].append({
+                'id': row['task_list_id'],
+                'name': row['task_list__name'],
+                'total': row['total'],
+                'open': sum(row[f'status_{value}'] for value in Task.OPEN_STATUSES),
+                'overdue': row['overdue'],
+            })
+        facets['task_lists'].sort(key=lambda item: (-item['total'], item['id']))
+        return facets
+    
+    @action(detail=False, methods=['get'])
+    def stats(self, request):
+        """Счётчики задач пользователя: открытые, просроченные, на сегодня, выполненные за неделю"""
+        return Response(UserTaskStatsSerializer(UserTaskStats.get_for_user(request.user.id)).data)
+    
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """Полнотекстовый поиск по названию, описанию и комментариям: ?q="""
+        query = request.query_params.get('q', '').strip()
+        if len(query) < 2:
+            return Response(
+                {'q': ['Поисковый запрос должен содержать не менее 2 символов']},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return self._paginated_response(search.search_tasks(self.filter_queryset(self.get_queryset()), query))
+    
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Потоковая выгрузка задач: ?export_format=ndjson|csv и фильтры списка"""
+        export_format = get_export_format(request)
+        queryset = self.filter_queryset(self.get_base_queryset())
+        return export_response(request, queryset, self.export_fields, export_format, 'tasks')
+    
+    @action(detail=False, methods=['get'])
+    def sync(self, request):
+        """Изменения задач пользователя после курсора ?since="""
+        return Response(sync.get_changes(
+            self.get_queryset(),
+            request.user,
+            'task',
+            request.query_params.get('since'),
+            lambda rows: self.get_serializer(rows, many=True).data,
+        ))
+    
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def cache_stats(self, request):
+        """Статистика попаданий в кэш ответов"""
+        return Response(response_cache.get_stats())
+    
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def realtime_stats(self, request):
+        """Задержки WebSocket-событий от постановки в очередь до отправки и до доставки"""
+        return Response(events.get_stats())
+    
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def presence_stats(self, request):
+        """Открытые WebSocket-соединения по узлам и число пользователей онлайн"""
+        return Response(presence.get_stats())
+    
+    @action(detail=False, methods=['post'])
+    def bulk_create(self, request):
+        """Массовое создание задач в одной транзакции"""
+        context = self.get_serializer_context()
+        context['related_objects'] = TaskCreateSerializer.load_related_objects(request.data)
+        serializer = TaskCreateSerializer(
+            data=request.data, many=True, max_length=BULK_BATCH_SIZE, context=context
         )
-        serializer = self.get_serializer(tasks, many=True)
-        return Response(serializer.data)
+        serializer.is_valid(raise_exception=True)
+        
+        with transaction.atomic():
+            tasks = Task.objects.bulk_create([
+                Task(created_by=request.user, **data) for data in serializer.validated_data
+            ])
+            # bulk_create не вызывает Task.save, поэтому счётчики обновляем сами
+            totals, open_totals, owners = Counter(), Counter(), {}
+            for task in tasks:
+                totals[task.task_list_id] += 1
+                open_totals[task.task_list_id] += task.status in Task.OPEN_STATUSES
+                owners[task.task_list_id] = task.get_task_list_owner_id()
+            for task_list_id, total in totals.items():
+                TaskList.adjust_counters(
+                    task_list_id, total=total, open_tasks=open_totals[task_list_id], owner_id=owners[task_list_id]
+                )
+            search.update_search_documents([task.id for task in tasks])
+            UserTaskStats.recalculate({task.assigned_to_id for task in tasks})
+        
+        recipients = defaultdict(set)
+        for task in tasks:
+            recipients[task.assigned_to_id].add(task.id)
+            recipients[task.created_by_id].add(task.id)
+        versions.bump_version(versions.TASKS, recipients)
+        events.publish_tasks(recipients, 'task_created')
+        events.publish_list_changes((task.task_list_id, task.id) for task in tasks)
+        
+        return Response(TaskCompactSerializer(tasks, many=True).data, status=status.HTTP_201_CREATED)
     
-    def _send_websocket_notification(self, task, event_type):
-        """Отправляет уведомление через WebSocket"""
-        channel_layer = get_channel_layer()
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser])
+    def import_tasks(self, request):
+        """
+        Импорт задач из файла CSV/NDJSON (поле file). Ход импорта отдаётся
+        потоком NDJSON по пакетам; WebSocket-уведомления не отправляются.
+        """
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'file': ['Файл не передан']}, status=status.HTTP_400_BAD_REQUEST)
+        import_format = request.query_params.get('import_format') or upload.name.rsplit('.', 1)[-1].lower()
+        if import_format not in IMPORT_FORMATS:
+            return Response(
+                {'import_format': [f"Допустимые значения: {', '.join(IMPORT_FORMATS)}"]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        importer = TaskImporter(
+            request.user,
+            create_missing_lists=request.query_params.get('create_missing_lists') == 'true',
+        )
+        rows = read_rows(upload, import_format)
+        # Под ASGI синхронный итератор был бы собран целиком до отправки первой строки
+        progress = importer.aiter_progress(rows) if is_asgi_request(request) else importer.iter_progress(rows)
+        return StreamingHttpResponse(progress, content_type='application/x-ndjson')
+    
+    @action(detail=False, methods=['post'])
+    def bulk_update(self, request):
+        """Массовое обновление задач: {"ids": [...], "changes": {...}}"""
+        bulk = TaskBulkSerializer(data=request.data)
+        bulk.is_valid(raise_exception=True)
+        changes = TaskUpdateSerializer(data=bulk.validated_data['changes'], partial=True)
+        changes.is_valid(raise_exception=True)
+        if not changes.validated_data:
+            return Response({'changes': ['Не указаны изменения']}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Отправляем уведомление исполнителю задачи
-        if task.assigned_to:
-            async_to_sync(channel_layer.group_send)(
-                f"user_{task.assigned_to.id}",
-                {
-                    'type': 'task_notification',
-                    'event': event_type,
-                    'task_id': task.id,
-                    'task_title': task.title,
-                    'message': self._get_notification_message(task, event_type)
-                }
+        task_ids = self._bulk_update(bulk.validated_data['ids'], changes.validated_data, 'task_updated')
+        return Response({'updated': len(task_ids), 'ids': task_ids})
+    
+    @action(detail=False, methods=['post'])
+    def bulk_complete(self, request):
+        """Массово отметить задачи как выполненные: {"ids": [...]}"""
+        bulk = TaskBulkSerializer(data=request.data)
+        bulk.is_valid(raise_exception=True)
+        
+        task_ids = self._bulk_update(bulk.validated_data['ids'], {'status': 'completed'}, 'task_completed')
+        return Response({'updated': len(task_ids), 'ids': task_ids})
+    
+    def _bulk_update(self, ids, changes, event_type):
+        """
+        Применяет изменения ко всем доступным задачам из ids одним UPDATE
+        и возвращает идентификаторы обновлённых задач
+        """
+        now = timezone.now()
+        updates = dict(changes, updated_at=now)
+        if changes.get('status') == 'completed':
+            # Дата завершения ставится только задачам, которые ещё не были выполнены
+            updates['completed_at'] = Case(
+                When(status='completed', then=F('completed_at')),
+                default=Value(now),
             )
         
-        # Отправляем уведомление создателю задачи (если это не тот же пользователь)
-        if task.created_by != task.assigned_to:
-            async_to_sync(channel_layer.group_send)(
-                f"user_{task.created_by.id}",
-                {
-                    'type': 'task_notification',
-                    'event': event_type,
-                    'task_id': task.id,
-                    'task_title': task.title,
-                    'message': self._get_notification_message(task, event_type)
-                }
+        with transaction.atomic():
+            rows = list(
+                self.get_queryset().filter(pk__in=ids).select_for_update()
+                .values_list('id', 'task_list_id', 'assigned_to_id', 'created_by_id')
             )
+            if not rows:
+                return []
+            task_ids = [row[0] for row in rows]
+            Task.objects.filter(pk__in=task_ids).update(**updates)
+            if 'status' in changes:
+                TaskList.recalculate_counters({row[1] for row in rows})
+            if 'title' in changes or 'description' in changes:
+                search.update_search_documents(task_ids)
+            if changes.keys() & {'status', 'assigned_to', 'due_date'}:
+                assignee_ids = {row[2] for row in rows}
+                if 'assigned_to' in changes:
+                    assignee_ids.add(changes['assigned_to'].id)
+                UserTaskStats.recalculate(assignee_ids)
+            if 'assigned_to' in changes:
+                # Переназначенные задачи пропадают из выборки прежних исполнителей
+                new_assignee_id = changes['assigned_to'].id
+                Tombstone.objects.bulk_create([
+                    Tombstone(user_id=assigned_to_id, object_type='task', object_id=task_id, deleted_at=now)
+                    for task_id, _, assigned_to_id, created_by_id in rows
+                    if assigned_to_id not in (new_assignee_id, created_by_id)
+                ])
+        
+        recipients = defaultdict(set)
+        for task_id, _, assigned_to_id, created_by_id in rows:
+            recipients[assigned_to_id].add(task_id)
+            recipients[created_by_id].add(task_id)
+            if 'assigned_to' in changes:
+                recipients[changes['assigned_to'].id].add(task_id)
+        versions.bump_version(versions.TASKS, recipients)
+        events.publish_tasks(recipients, event_type)
+        events.publish_list_changes((task_list_id, task_id) for task_id, task_list_id, _, _ in rows)
+        
+        return task_ids
     
-    def _get_notification_message(self, task, event_type):
-        """Генерирует сообщение для уведомления"""
-        messages = {
-            'task_created': f'Вам назначена новая задача: {task.title}',
-            'task_updated': f'Задача обновлена: {task.title}',
-            'task_completed': f'Задача выполнена: {task.title}',
-            'comment_added': f'Добавлен комментарий к задаче: {task.title}',
-        }
-        return messages.get(event_type, f'Обновление задачи: {task.title}')
+    def _paginated_response(self, queryset):
+        """Возвращает страницу queryset с курсорной пагинацией"""
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data)
 
 
-class UserViewSet(viewsets.ReadOnlyModelViewSet):
+class UserViewSet(ReplicaReadMixin, viewsets.ReadOnlyModelViewSet):
     """ViewSet для получения информации о пользователях"""
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated]
 
 
-class UserProfileViewSet(viewsets.ModelViewSet):
+class UserProfileViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     """ViewSet для управления профилями пользователей"""
     serializer_class = UserProfileSerializer
     permission_classes = [IsAuthenticated]
@@ -0,0 +1,133 @@
+"""
+Wire formats of the task WebSocket.
+
+По умолчанию сообщения передаются текстовыми кадрами JSON. Клиент может
+запросить подпротокол MSGPACK_PROTOCOL (Sec-WebSocket-Protocol): тогда
+сообщения в обе стороны передаются бинарными кадрами MessagePack, а ключи
+словарей заменяются короткими по таблице SHORT_KEYS (значения не меняются).
+Первый байт кадра — флаг: FRAME_RAW или FRAME_ZLIB, если тело длиннее
+COMPRESSION_THRESHOLD байт и сжато zlib. Сообщения клиента, в том числе
+после распаковки, ограничены MAX_INBOUND_FRAME байт. Без установленного msgpack
+подпротокол не предлагается.
+"""
+import zlib
+
+from rest_framework.utils.encoders import JSONEncoder
+
+from . import fastjson
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+MSGPACK_PROTOCOL = 'taskmanager.msgpack.v1'
+
+FRAME_RAW = 0
+FRAME_ZLIB = 1
+# Меньшие кадры сжимаются плохо, а время тратится на каждом сообщении
+COMPRESSION_THRESHOLD = 1024
+COMPRESSION_LEVEL = 6
+# Предел размера сообщения клиента, в том числе после распаковки: защита от
+# сжатых кадров, разворачивающихся в гигабайты
+MAX_INBOUND_FRAME = 64 * 1024
+
+SHORT_KEYS = {
+    'type': 't',
+    'message': 'm',
+    'event': 'e',
+    'task_id': 'ti',
+    'task_title': 'tt',
+    'task_ids': 'ts',
+    'task_list_id': 'tl',
+    'tasks': 'T',
+    'cursor': 'c',
+    'since': 's',
+    'snapshot': 'sn',
+    'has_more': 'hm',
+    'upserted': 'u',
+    'deleted': 'd',
+    'reload': 'r',
+    'id': 'i',
+    'title': 'n',
+    'description': 'ds',
+    'status': 'st',
+    'priority': 'p',
+    'due_date': 'dd',
+    'created_at': 'ca',
+    'is_overdue': 'o',
+    'task_list': 'l',
+    'created_by': 'cb',
+    'name': 'nm',
+    'username': 'un',
+}
+LONG_KEYS = {short: key for key, short in SHORT_KEYS.items()}
+assert len(LONG_KEYS) == len(SHORT_KEYS), 'Короткие ключи должны быть уникальны'
+
+_encoder = JSONEncoder()
+
+
+class DecodeError(ValueError):
+    """Сообщение клиента не удалось разобрать"""
+
+
+def _rename_keys(data, keys):
+    if isinstance(data, dict):
+        return {keys.get(key, key): _rename_keys(value, keys) for key, value in data.items()}
+    if isinstance(data, (list, tuple)):
+        return [_rename_keys(value, keys) for value in data]
+    return data
+
+
+class JSONCodec:
+    """Текстовые кадры JSON (протокол по умолчанию)"""
+    name = 'JSON'
+    subprotocol = None
+    binary = False
+
+    def encode(self, data):
+        return fastjson.dumps_str(data)
+
+    def decode(self, frame):
+        try:
+            if len(frame) > MAX_INBOUND_FRAME:
+                raise DecodeError('Кадр слишком большой')
+            return fastjson.loads(frame)
+        except (fastjson.JSONDecodeError, TypeError) as exc:
+            raise DecodeError(str(exc))
+
+
+class MsgpackCodec:
+    """Бинарные кадры MessagePack с короткими ключами и сжатием больших кадров"""
+    name = 'MessagePack'
+    subprotocol = MSGPACK_PROTOCOL
+    binary = True
+
+    def encode(self, data):
+        body = msgpack.packb(_rename_keys(data, SHORT_KEYS), default=_encoder.default)
+        if len(body) > COMPRESSION_THRESHOLD:
+            return bytes([FRAME_ZLIB]) + zlib.compress(body, COMPRESSION_LEVEL)
+        return bytes([FRAME_RAW]) + body
+
+    def decode(self, frame):
+        try:
+            if len(frame) > MAX_INBOUND_FRAME:
+                raise DecodeError('Кадр слишком большой')
+            flag, body = frame[0], frame[1:]
+            if flag == FRAME_ZLIB:
+                decompressor = zlib.decompressobj()
+                body = decompressor.decompress(body, MAX_INBOUND_FRAME)
+                if decompressor.unconsumed_tail:
+                    raise DecodeError('Кадр после распаковки слишком большой')
+            elif flag != FRAME_RAW:
+                raise DecodeError(f'Неизвестный флаг кадра: {flag}')
+            return _rename_keys(msgpack.unpackb(body), LONG_KEYS)
+        except (IndexError, TypeError, ValueError, zlib.error, msgpack.UnpackException) as exc:
+            raise DecodeError(str(exc))
+
+
+def get_codec(subprotocols):
+    """Кодек для подпротоколов, запрошенных клиентом; JSON, если ни один не поддерживается"""
+    if msgpack is not None and MSGPACK_PROTOCOL in subprotocols:
+        return MsgpackCodec()
+    return JSONCodec()
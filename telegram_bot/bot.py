@@ -8,7 +8,8 @@ from aiogram.filters import Command
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from django.conf import settings
 from django.contrib.auth.models import User
-from tasks.models import Task, UserProfile
+from tasks.models import Task, UserProfile, UserTaskStats
+from task_manager.db_router import replica_reads, is_pinned
 import requests
 import json
 
@@ -52,6 +53,7 @@ async def start_command(message: types.Message):
             "Я бот для управления задачами. Вот что я умею:\n"
             "/tasks - показать мои задачи\n"
             "/overdue - показать просроченные задачи\n"
+            "/stats - статистика задач\n"
             "/help - помощь"
         )
     except UserProfile.DoesNotExist:
@@ -96,8 +98,10 @@ async def show_tasks(message: types.Message):
         user_profile = UserProfile.objects.get(telegram_chat_id=chat_id)
         user = user_profile.user
 
-        tasks = Task.objects.filter(
-            assigned_to=user).order_by('-created_at')[:10]
+        # Задачи читаем с реплики, если пользователь недавно ничего не менял
+        with replica_reads(pinned=is_pinned(user.id)):
+            tasks = list(Task.objects.filter(
+                assigned_to=user).select_related('created_by').order_by('-created_at')[:10])
 
         if not tasks:
             await message.answer("У вас нет назначенных задач.")
@@ -155,11 +159,12 @@ async def show_overdue_tasks(message: types.Message):
 
         from django.utils import timezone
         now = timezone.now()
-        overdue_tasks = Task.objects.filter(
-            assigned_to=user,
-            due_date__lt=now,
-            status__in=['pending', 'in_progress']
-        ).order_by('due_date')
+        with replica_reads(pinned=is_pinned(user.id)):
+            overdue_tasks = list(Task.objects.filter(
+                assigned_to=user,
+                due_date__lt=now,
+                status__in=['pending', 'in_progress']
+            ).order_by('due_date'))
 
         if not overdue_tasks:
             await message.answer("У вас нет просроченных задач! 🎉")
@@ -180,6 +185,31 @@ async def show_overdue_tasks(message: types.Message):
         await message.answer("Сначала привяжите ваш аккаунт командой /link")
 
 
+@dp.message(Command("stats"))
+async def show_stats(message: types.Message):
+    """Показать статистику задач"""
+    chat_id = message.chat.id
+
+    try:
+        user_profile = UserProfile.objects.get(telegram_chat_id=chat_id)
+        user = user_profile.user
+
+        # Готовые счётчики: один запрос по первичному ключу
+        with replica_reads(pinned=is_pinned(user.id)):
+            stats = UserTaskStats.get_for_user(user.id)
+
+        await message.answer(
+            "📊 Статистика задач:\n\n"
+            f"🔄 Открытые: {stats.open_count}\n"
+            f"🚨 Просроченные: {stats.overdue_count}\n"
+            f"📅 Со сроком сегодня: {stats.due_today_count}\n"
+            f"✅ Выполнено за неделю: {stats.completed_week_count}"
+        )
+
+    except UserProfile.DoesNotExist:
+        await message.answer("Сначала привяжите ваш аккаунт командой /link")
+
+
 @dp.message(Command("help"))
 async def help_command(message: types.Message):
     """Показать справку"""
@@ -190,6 +220,7 @@ async def help_command(message: types.Message):
         "/link - привязать аккаунт\n"
         "/tasks - показать мои задачи\n"
         "/overdue - показать просроченные задачи\n"
+        "/stats - статистика задач\n"
         "/help - эта справка\n\n"
         "Для полного управления задачами используйте веб-приложение."
     )